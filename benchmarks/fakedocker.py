@@ -0,0 +1,491 @@
+"""
+Simulated docker client for benchmarks.
+
+Implements the subset of the docker command line used by dockwrkr against a
+JSON state file instead of a daemon:
+
+    FAKEDOCKER_STATE    path of the state file (required)
+    FAKEDOCKER_LATENCY  seconds to sleep on every invocation (default: 0)
+
+Go templates passed with -f/--format support field paths (`.State.Pid`),
+`.Label "key"`, `index .Config.Labels "key"`, `json .` and `if` blocks on a
+field path; `range` blocks render as empty strings. Container changes are logged as events and
+`docker events` follows the log until it is terminated or `--until` passes.
+
+Containers created with `--health-cmd` report `starting` once started, then
+turn `healthy` after the seconds listed for them in the `healthDelays` map
+of the state (immediately by default), or `unhealthy` when they are listed in
+`unhealthy`. The transition is logged as a `health_status` event at that
+time.
+"""
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import bisect
+import hashlib
+from contextlib import contextmanager
+
+LABEL_DOMAIN = 'ca.turbulent.dockwrkr'
+STARTED_AT = '2020-01-01T00:00:00.000000000Z'
+NEVER = '0001-01-01T00:00:00Z'
+EVENTS_BUFFER = 1024
+EVENTS_POLL = 0.02
+
+
+def nanoseconds():
+    ''' Current time in nanoseconds, as event timestamps are '''
+    return int(time.time() * 10 ** 9)
+
+
+@contextmanager
+def openState(write=False):
+    path = os.environ['FAKEDOCKER_STATE']
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+        try:
+            with open(path) as fh:
+                state = json.load(fh)
+        except (IOError, ValueError):
+            state = {}
+        state.setdefault('containers', {})
+        state.setdefault('networks', {})
+        state.setdefault('images', {})
+        state.setdefault('events', [])
+        yield state
+        if write:
+            with open(path + '.tmp', 'w') as fh:
+                json.dump(state, fh)
+            os.rename(path + '.tmp', path)
+
+
+def recordEvent(state, container, action, delay=0, **attributes):
+    ''' Log a container event `delay` seconds from now, keeping as many events as dockerd buffers '''
+    now = nanoseconds() + int(delay * 10 ** 9)
+    taken = set(e['timeNano'] for e in state['events'])
+    while now in taken:
+        now += 1
+    labels = dict(container['Config']['Labels'])
+    labels.update({'name': container['Name'][1:], 'image': container['Config']['Image']})
+    labels.update(attributes)
+    event = {
+        'status': action, 'id': container['Id'], 'from': container['Config']['Image'],
+        'Type': 'container', 'Action': action, 'scope': 'local',
+        'Actor': {'ID': container['Id'], 'Attributes': labels},
+        'time': now // 10 ** 9, 'timeNano': now,
+    }
+    state['events'].insert(bisect.bisect_right([e['timeNano'] for e in state['events']], now), event)
+    del state['events'][:-EVENTS_BUFFER]
+
+
+def cancelEvents(state, container):
+    ''' Drop the events of a container that have not happened yet '''
+    now = nanoseconds()
+    state['events'] = [e for e in state['events'] if e['id'] != container['Id'] or e['timeNano'] <= now]
+
+
+def startHealthCheck(state, container):
+    name = container['Name'][1:]
+    if not container['Config'].get('Healthcheck'):
+        return
+    delay = state.get('healthDelays', {}).get(name, 0)
+    outcome = 'unhealthy' if name in state.get('unhealthy', []) else 'healthy'
+    container['State']['Health'] = {'Status': 'starting'}
+    container['HealthAt'] = nanoseconds() + int(delay * 10 ** 9)
+    container['HealthNext'] = outcome
+    recordEvent(state, container, 'health_status: %s' % outcome, delay=delay)
+
+
+def refreshHealth(container):
+    ''' Apply the scheduled health transition of a container once its time has come '''
+    health = container.get('State', {}).get('Health')
+    if health and container.get('HealthAt') is not None and nanoseconds() >= container['HealthAt']:
+        health['Status'] = container['HealthNext']
+    return container
+
+
+def writeState(path, state):
+    with open(path, 'w') as fh:
+        json.dump(state, fh)
+
+
+def makeContainer(name, image='busybox', running=True, pid=None, labels=None, ip=None):
+    cid = hashlib.sha256(name.encode()).hexdigest()
+    allLabels = {'%s.name' % LABEL_DOMAIN: name, '%s.managed' % LABEL_DOMAIN: '1'}
+    allLabels.update(labels or {})
+    return {
+        'Id': cid,
+        'Name': '/' + name,
+        'Image': 'sha256:' + hashlib.sha256(image.encode()).hexdigest(),
+        'RestartCount': 0,
+        'Config': {'Image': image, 'Labels': allLabels},
+        'State': {
+            'Status': 'running' if running else 'created',
+            'Running': running,
+            'Pid': (pid or 1000 + int(cid[:6], 16) % 30000) if running else 0,
+            'ExitCode': 0,
+            'Error': '',
+            'StartedAt': STARTED_AT if running else NEVER,
+            'FinishedAt': NEVER,
+        },
+        'NetworkSettings': {'IPAddress': ip or ('172.17.%d.%d' % (int(cid[:2], 16), int(cid[2:4], 16) % 254 + 1)) if running else '',
+                            'Ports': {}},
+    }
+
+
+def lookup(obj, path):
+    for part in path:
+        if isinstance(obj, dict):
+            obj = obj.get(part)
+        else:
+            return None
+    return obj
+
+
+def stringify(value):
+    if value is None:
+        return '<no value>'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def renderAction(action, obj):
+    action = action.strip()
+    if action == 'json .':
+        return json.dumps(obj)
+    m = re.match(r'^\.Label\s+"([^"]+)"$', action)
+    if m:
+        return stringify(lookup(obj, ['Config', 'Labels', m.group(1)]) or '')
+    m = re.match(r'^index\s+((?:\.\w+)+)\s+"([^"]+)"$', action)
+    if m:
+        value = lookup(obj, m.group(1)[1:].split('.'))
+        return stringify((value or {}).get(m.group(2)) or '')
+    m = re.match(r'^json\s+((?:\.\w+)+)$', action)
+    if m:
+        return json.dumps(lookup(obj, m.group(1)[1:].split('.')))
+    m = re.match(r'^((?:\.\w+)+)$', action)
+    if m:
+        return stringify(lookup(obj, m.group(1)[1:].split('.')))
+    return ''
+
+
+def renderCondition(match, obj):
+    return match.group(2) if lookup(obj, match.group(1)[1:].split('.')) else ''
+
+
+def render(template, obj):
+    template = re.sub(r'{{\s*range.*?{{\s*end\s*}}', '', template)
+    template = re.sub(r'{{\s*if\s+((?:\.\w+)+)\s*}}(.*?){{\s*end\s*}}', lambda m: renderCondition(m, obj), template)
+    return re.sub(r'{{(.*?)}}', lambda m: renderAction(m.group(1), obj), template)
+
+
+def parseOptions(args, valued=('-f', '--format', '--filter', '-t', '--time', '--name', '--label', '-l')):
+    options = {}
+    positional = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg.split('=', 1)
+            options.setdefault(key, []).append(value)
+        elif arg in valued:
+            options.setdefault(arg, []).append(args[i + 1] if i + 1 < len(args) else '')
+            i += 1
+        elif arg.startswith('-') and arg != '-':
+            options.setdefault(arg, []).append(True)
+        else:
+            positional.append(arg)
+        i += 1
+    return options, positional
+
+
+def option(options, *names):
+    for name in names:
+        if name in options:
+            return options[name][-1]
+    return None
+
+
+def matchesFilters(container, filters):
+    for f in filters:
+        key, value = f.split('=', 1)
+        if key == 'label':
+            lkey, sep, lval = value.partition('=')
+            labels = container['Config']['Labels']
+            if lkey not in labels or (sep and labels[lkey] != lval):
+                return False
+        elif key == 'name' and value not in container['Name']:
+            return False
+        elif key == 'status' and container['State']['Status'] != value:
+            return False
+    return True
+
+
+def cmdPs(args):
+    options, _ = parseOptions(args)
+    fmt = option(options, '--format', '-f')
+    with openState() as state:
+        containers = [c for c in state['containers'].values()
+                      if ('-a' in options or '--all' in options or c['State']['Running'])
+                      and matchesFilters(c, options.get('--filter', []))]
+    for c in containers:
+        refreshHealth(c)
+        if fmt:
+            print(render(fmt, c))
+        else:
+            print(c['Id'][:12])
+    return 0
+
+
+def cmdInspect(args, kinds=('containers', 'images')):
+    options, names = parseOptions(args)
+    fmt = option(options, '--format', '-f')
+    rc = 0
+    out = []
+    with openState() as state:
+        for name in names:
+            c = next((state[kind][name] for kind in kinds if name in state[kind]), None)
+            if c is None:
+                sys.stderr.write("Error: No such object: %s\n" % name)
+                rc = 1
+                continue
+            refreshHealth(c)
+            out.append(render(fmt, c) if fmt else json.dumps(c))
+    if fmt:
+        if out:
+            print('\n'.join(out))
+    else:
+        print('[%s]' % ','.join(out))
+    return rc
+
+
+def cmdCreate(args):
+    options, positional = parseOptions(args)
+    name = option(options, '--name')
+    labels = {}
+    for label in options.get('--label', []):
+        key, sep, value = label.partition('=')
+        labels[key] = value.strip('"')
+    image = positional[0] if positional else 'busybox'
+    with openState(write=True) as state:
+        if name in state['containers']:
+            sys.stderr.write('Error response from daemon: Conflict. The container name "/%s" is already in use.\n' % name)
+            return 1
+        container = makeContainer(name, image=image, running=False, labels=labels)
+        if option(options, '--health-cmd'):
+            container['Config']['Healthcheck'] = {'Test': ['CMD-SHELL', option(options, '--health-cmd')]}
+        state['containers'][name] = container
+        recordEvent(state, container, 'create')
+        state['images'].setdefault(image, {'Id': container['Image'], 'RepoTags': [image], 'Size': 1024})
+    print(container['Id'])
+    return 0
+
+
+def cmdContainers(action, args):
+    options, names = parseOptions(args, valued=('-t', '--time'))
+    rc = 0
+    with openState(write=True) as state:
+        for name in names:
+            c = state['containers'].get(name)
+            if c is None:
+                sys.stderr.write("Error response from daemon: No such container: %s\n" % name)
+                rc = 1
+                continue
+            if action == 'start':
+                fresh = makeContainer(name, image=c['Config']['Image'], running=True)
+                c['State'] = fresh['State']
+                c['NetworkSettings'] = fresh['NetworkSettings']
+                cancelEvents(state, c)
+                recordEvent(state, c, 'start')
+                startHealthCheck(state, c)
+            elif action == 'stop':
+                cancelEvents(state, c)
+                c.pop('HealthAt', None)
+                if c['State']['Running']:
+                    recordEvent(state, c, 'die', exitCode='0')
+                c['State'].update({'Status': 'exited', 'Running': False, 'Pid': 0, 'ExitCode': 0})
+                c['NetworkSettings']['IPAddress'] = ''
+            elif action == 'rm':
+                if c['State']['Running'] and '-f' not in options:
+                    sys.stderr.write("Error response from daemon: You cannot remove a running container %s.\n" % name)
+                    rc = 1
+                    continue
+                cancelEvents(state, c)
+                if c['State']['Running']:
+                    recordEvent(state, c, 'die', exitCode='137')
+                recordEvent(state, c, 'destroy')
+                del state['containers'][name]
+            print(name)
+    if rc:
+        sys.stderr.write("Error: failed to %s containers\n" % action)
+    return rc
+
+
+def matchesEvent(event, filters):
+    attributes = event['Actor']['Attributes']
+    for f in filters:
+        key, value = f.split('=', 1)
+        if key == 'type' and event['Type'] != value:
+            return False
+        if key == 'label':
+            lkey, sep, lval = value.partition('=')
+            if lkey not in attributes or (sep and attributes[lkey] != lval):
+                return False
+    return True
+
+
+def cmdEvents(args):
+    options, _ = parseOptions(args, valued=('-f', '--format', '--filter', '--since', '--until'))
+    fmt = option(options, '--format', '-f')
+    since = float(option(options, '--since') or time.time())
+    until = option(options, '--until')
+    last = int(since * 10 ** 9) - 1
+    while True:
+        with openState() as state:
+            now = nanoseconds()
+            events = [e for e in state['events'] if last < e['timeNano'] <= now]
+        for event in events:
+            last = event['timeNano']
+            if matchesEvent(event, options.get('--filter', [])):
+                print(render(fmt, event) if fmt else json.dumps(event))
+        sys.stdout.flush()
+        if until is not None and time.time() >= float(until):
+            return 0
+        time.sleep(EVENTS_POLL)
+
+
+def cmdNetwork(args):
+    sub = args[0] if args else ''
+    options, positional = parseOptions(args[1:])
+    if sub == 'ls':
+        fmt = option(options, '--format', '-f')
+        with openState() as state:
+            for name, network in state['networks'].items():
+                if not matchesFilters(network, options.get('--filter', [])):
+                    continue
+                print(render(fmt, network) if fmt else name)
+        return 0
+    if sub == 'create':
+        name = positional[-1]
+        labels = {}
+        for label in options.get('--label', []):
+            key, sep, value = label.partition('=')
+            labels[key] = value.strip('"')
+        with openState(write=True) as state:
+            state['networks'][name] = {'Name': name, 'Config': {'Labels': labels}}
+        print(hashlib.sha256(name.encode()).hexdigest())
+        return 0
+    return 0
+
+
+def cmdImage(args):
+    if args and args[0] == 'inspect':
+        return cmdInspect(args[1:], kinds=('images',))
+    return 0
+
+
+def cmdContainer(args):
+    if args and args[0] == 'inspect':
+        return cmdInspect(args[1:], kinds=('containers',))
+    sys.stderr.write("fakedocker: unsupported command 'container %s'\n" % ' '.join(args[:1]))
+    return 1
+
+
+def cmdPull(args):
+    image = args[-1]
+    registry = image.split('/', 1)[0] if '/' in image else None
+    with openState(write=True) as state:
+        if registry in state.get('private', []) and registry not in state.get('logins', []):
+            sys.stderr.write("Error response from daemon: Get https://%s/v2/: unauthorized: authentication required\n" % registry)
+            return 1
+        state['images'][image] = {'Id': 'sha256:' + hashlib.sha256(image.encode()).hexdigest(), 'RepoTags': [image], 'Size': 1024}
+    print("Status: Downloaded newer image for %s" % image)
+    return 0
+
+
+def cmdStats(args):
+    options, names = parseOptions(args)
+    rc = 0
+    with openState(write=True) as state:
+        tick = state['ticks'] = state.get('ticks', 0) + 1
+        for name in names:
+            c = state['containers'].get(name)
+            if c is None:
+                sys.stderr.write("Error response from daemon: No such container: %s\n" % name)
+                rc = 1
+                continue
+            running = c['State']['Running']
+            load = (int(c['Id'][:4], 16) + tick) % 100 if running else 0
+            print(json.dumps({
+                'Name': name,
+                'CPUPerc': '%.2f%%' % (load / 10.0),
+                'MemUsage': '%.1fMiB / 1.944GiB' % (load + 10 if running else 0),
+                'NetIO': '%dkB / %dB' % (load * tick, tick * 512),
+                'BlockIO': '%.1fMB / 0B' % (load / 4.0),
+                'PIDs': str(load % 7 + 1 if running else 0),
+            }))
+    return rc
+
+
+def cmdLogin(args):
+    with openState(write=True) as state:
+        state.setdefault('logins', []).append(args[-1])
+    return 0
+
+
+def main(argv):
+    latency = float(os.environ.get('FAKEDOCKER_LATENCY', 0))
+    if latency:
+        time.sleep(latency)
+    if not argv:
+        return 0
+    cmd, args = argv[0], argv[1:]
+    if cmd == 'ps':
+        return cmdPs(args)
+    if cmd == 'inspect':
+        return cmdInspect(args)
+    if cmd == 'create':
+        return cmdCreate(args)
+    if cmd in ('start', 'stop', 'rm'):
+        return cmdContainers(cmd, args)
+    if cmd == 'events':
+        return cmdEvents(args)
+    if cmd == 'network':
+        return cmdNetwork(args)
+    if cmd == 'image':
+        return cmdImage(args)
+    if cmd == 'container':
+        return cmdContainer(args)
+    if cmd == 'pull':
+        return cmdPull(args)
+    if cmd == 'version':
+        print('20.10.0')
+        return 0
+    if cmd == 'stats':
+        return cmdStats(args)
+    if cmd == 'login':
+        return cmdLogin(args)
+    if cmd == 'logout':
+        return 0
+    sys.stderr.write("fakedocker: unsupported command '%s'\n" % cmd)
+    return 1
+
+
+def install(directory, root=None):
+    ''' Write an executable `docker` shim running this module into directory and return its path '''
+    root = root or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = os.path.join(directory, 'docker')
+    with open(path, 'w') as fh:
+        fh.write("#!%s\nimport sys\nsys.path.insert(0, %r)\nfrom benchmarks.fakedocker import main\nsys.exit(main(sys.argv[1:]))\n"
+                 % (sys.executable, root))
+    os.chmod(path, 0o755)
+    return path
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
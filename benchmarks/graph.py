@@ -0,0 +1,69 @@
+"""
+Dependency graph benchmark on synthetic configurations.
+
+    python -m benchmarks.graph [--services 10000] [--links 3]
+"""
+import sys
+import random
+import optparse
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+from dockwrkr.core import Core
+from dockwrkr.graph import DependencyGraph
+
+
+def syntheticServices(count, links=3, seed=42):
+    ''' Services named svc00000.. where each links to up to `links` services defined before it '''
+    rnd = random.Random(seed)
+    names = ["svc%05d" % i for i in range(count)]
+    services = OrderedDict()
+    for i, name in enumerate(names):
+        deps = rnd.sample(names[:i], min(i, rnd.randint(0, links)))
+        config = {'image': 'busybox'}
+        if deps:
+            config['link'] = ["%s:%s" % (dep, dep) for dep in deps]
+        services[name] = config
+    # Define dependents before their dependencies to exercise the ordering.
+    return OrderedDict(reversed(list(services.items())))
+
+
+def measure(label, f, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = timer()
+        f()
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("  %-36s %10.2f ms" % (label, best * 1000))
+    return best
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="python -m benchmarks.graph [options]")
+    parser.add_option("--services", dest="services", type="int", default=10000)
+    parser.add_option("--links", dest="links", type="int", default=3)
+    (options, args) = parser.parse_args(argv)
+
+    services = syntheticServices(options.services, options.links)
+    graph = DependencyGraph.fromConfig(services)
+    names = list(services.keys())
+    sample = names[::max(1, len(names) // 100)]
+
+    print("Dependency graph: %d services, up to %d links each" % (options.services, options.links))
+    measure("compile", lambda: DependencyGraph.fromConfig(services))
+    measure("resolve all", lambda: graph.resolve(names))
+    measure("subgraph all", lambda: graph.subgraph(names))
+    measure("transitive deps (100 nodes)", lambda: [graph.getTransitiveDependencies(n) for n in sample])
+    measure("transitive dependents (100 nodes)", lambda: [graph.getTransitiveDependents(n) for n in sample])
+
+    def coreDefinedServices():
+        core = Core()
+        core.setConfig({'services': services})
+        core.getDefinedServices()
+    measure("Core.getDefinedServices (cold)", coreDefinedServices)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Offline benchmark suite running dockwrkr against a simulated docker client.
+
+    python -m benchmarks.suite [--output results.json] [--compare baseline.json]
+
+Every scenario runs against `benchmarks.fakedocker`, installed as `docker` in a
+temporary directory, so no daemon is needed. With --compare, scenarios slower
+than the baseline by more than --threshold are reported as regressions and the
+exit status is 1.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import optparse
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+import yaml
+
+import dockwrkr.docker as docker
+from dockwrkr.core import Core
+from dockwrkr.graph import DependencyGraph
+from benchmarks import fakedocker
+from benchmarks.graph import syntheticServices
+
+
+class Workspace(object):
+    ''' Temporary directory holding the fake docker client, its state and a dockwrkr.yml '''
+
+    def __init__(self, latency=0.0):
+        self.path = tempfile.mkdtemp(prefix='dockwrkr-bench-')
+        self.client = fakedocker.install(self.path)
+        self.statePath = os.path.join(self.path, 'state.json')
+        self.configPath = os.path.join(self.path, 'dockwrkr.yml')
+        self.latency = latency
+
+    def getEnv(self):
+        env = dict(os.environ)
+        env['FAKEDOCKER_STATE'] = self.statePath
+        env['FAKEDOCKER_LATENCY'] = str(self.latency)
+        env['DOCKWRKR_DOCKER_CLIENT'] = self.client
+        env['DOCKWRKR_BACKEND'] = 'cli'
+        env['DOCKWRKR_CACHE_DIR'] = os.path.join(self.path, 'cache')
+        env['DOCKER_CONFIG'] = os.path.join(self.path, 'docker-config')
+        return env
+
+    @contextmanager
+    def activate(self):
+        ''' Point the in-process docker module at the fake client '''
+        previous = (dict(os.environ), docker.DOCKER_CLIENT)
+        os.environ.update(self.getEnv())
+        docker.DOCKER_CLIENT = self.client
+        try:
+            with silenced():
+                yield self
+        finally:
+            os.environ.clear()
+            os.environ.update(previous[0])
+            docker.DOCKER_CLIENT = previous[1]
+
+    def writeConfig(self, services):
+        with open(self.configPath, 'w') as fh:
+            yaml.safe_dump({'containers': dict(services)}, fh, default_flow_style=False)
+
+    def seedRunning(self, names):
+        containers = dict((name, fakedocker.makeContainer(name)) for name in names)
+        fakedocker.writeState(self.statePath, {'containers': containers})
+
+    def reset(self):
+        fakedocker.writeState(self.statePath, {})
+
+    def getCore(self):
+        core = Core()
+        core.configFile = self.configPath
+        core.initialize().getOK()
+        return core
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+@contextmanager
+def silenced():
+    ''' Discard output written to fd 1 by child processes such as `docker create` '''
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+def richServices(count, entries=10):
+    ''' Services using most option kinds, with `entries` env, volume and publish entries each '''
+    services = OrderedDict()
+    for i in range(count):
+        services["svc%05d" % i] = {
+            'image': 'registry.local:5000/app:%d' % i,
+            'hostname': 'svc%05d' % i,
+            'restart': 'always',
+            'memory': '512m',
+            'env': dict(("VAR_%02d" % n, "value %d-%d" % (i, n)) for n in range(entries)),
+            'publish': ['127.0.0.1:%d:%d' % (10000 + i * entries + n, 8000 + n) for n in range(entries)],
+            'volume': ['data%d:/data%d' % (n, n) for n in range(entries // 2)] +
+                      ['/var/log/app%d/%d:/var/log/%d' % (i, n, n) for n in range(entries - entries // 2)],
+            'link': ['svc%05d' % (i - 1)] if i else [],
+            'privileged': 'false',
+            'command': ['app', '--serve'],
+            'extra-flags': ['--interactive'],
+        }
+    return services
+
+
+def sample(f, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = timer()
+        f()
+        samples.append(timer() - start)
+    return samples
+
+
+def benchCliStartup(options, ws):
+    ws.writeConfig(syntheticServices(10))
+    # `help` exits with status 1 by design.
+    cmd = [sys.executable, '-c', 'from dockwrkr.cli import cli; cli()', 'help']
+    return {'samples': sample(lambda: runCli(ws, cmd, check=False), options.repeat)}
+
+
+def benchCliStatus(options, ws, count):
+    services = syntheticServices(count, options.links)
+    ws.writeConfig(services)
+    ws.seedRunning(services.keys())
+    cmd = [sys.executable, '-c', 'from dockwrkr.cli import cli; cli()', 'status']
+    return {'samples': sample(lambda: runCli(ws, cmd), options.repeat), 'containers': count}
+
+
+def runCli(ws, cmd, check=True):
+    code = subprocess.call(cmd, cwd=ws.path, env=ws.getEnv(), stdout=subprocess.DEVNULL)
+    if check and code != 0:
+        raise subprocess.CalledProcessError(code, cmd)
+
+
+def benchStatus(options, ws, count):
+    services = syntheticServices(count, options.links)
+    ws.writeConfig(services)
+    ws.seedRunning(services.keys())
+    with ws.activate():
+        core = ws.getCore()
+        return {'samples': sample(lambda: core.status().getOK(), options.repeat), 'containers': count}
+
+
+def benchStartAll(options, ws, count, jobs):
+    ws.writeConfig(syntheticServices(count, options.links))
+    with ws.activate():
+        core = ws.getCore()
+        return {'samples': sample(lambda: core.start(all=True, jobs=jobs).getOK(), options.repeat, setup=ws.reset),
+                'containers': count, 'jobs': jobs}
+
+
+def benchConfigLoad(options, ws, count, cached=False):
+    ws.writeConfig(richServices(count))
+
+    def load():
+        core = Core()
+        core.configFile = ws.configPath
+        if not cached:
+            core.configCache = None
+        core.initialize().getOK()
+    with ws.activate():
+        load()
+        return {'samples': sample(load, options.repeat), 'services': count}
+
+
+def benchCreateParameters(options, ws, count, cached=False):
+    services = richServices(count)
+
+    def build():
+        for name, config in services.items():
+            docker.compileSpec(name, config, basePath=ws.path).getOK()
+    build()
+    result = {'samples': sample(build, options.repeat, setup=None if cached else docker.clearSpecCache),
+              'services': count}
+    result['ops_per_second'] = count / min(result['samples'])
+    return result
+
+
+def benchGraphCompile(options, ws, count):
+    services = syntheticServices(count, options.links)
+    return {'samples': sample(lambda: DependencyGraph.fromConfig(services), options.repeat), 'services': count}
+
+
+def getScenarios(options):
+    scale = options.scale
+    status = [int(1000 * scale), int(10000 * scale)]
+    start = int(options.startServices * scale)
+    return [
+        ('cli_startup', lambda ws: benchCliStartup(options, ws)),
+        ('cli_status_%d' % status[0], lambda ws: benchCliStatus(options, ws, status[0])),
+        ('status_%d' % status[0], lambda ws: benchStatus(options, ws, status[0])),
+        ('status_%d' % status[1], lambda ws: benchStatus(options, ws, status[1])),
+        ('start_all_%d_jobs1' % start, lambda ws: benchStartAll(options, ws, start, 1)),
+        ('start_all_%d_jobs%d' % (start, options.jobs), lambda ws: benchStartAll(options, ws, start, options.jobs)),
+        ('config_load_%d' % status[0], lambda ws: benchConfigLoad(options, ws, status[0])),
+        ('config_load_cached_%d' % status[0], lambda ws: benchConfigLoad(options, ws, status[0], cached=True)),
+        ('create_parameters_%d' % status[0], lambda ws: benchCreateParameters(options, ws, status[0])),
+        ('create_parameters_cached_%d' % status[0], lambda ws: benchCreateParameters(options, ws, status[0], cached=True)),
+        ('graph_compile_%d' % status[1], lambda ws: benchGraphCompile(options, ws, status[1])),
+    ]
+
+
+def runScenarios(options):
+    results = OrderedDict()
+    for name, scenario in getScenarios(options):
+        if options.only and not any(name.startswith(prefix) for prefix in options.only):
+            continue
+        ws = Workspace(latency=options.latency)
+        try:
+            result = scenario(ws)
+        finally:
+            ws.cleanup()
+        result['seconds'] = min(result['samples'])
+        results[name] = result
+        print("  %-32s %10.2f ms" % (name, result['seconds'] * 1000))
+    return results
+
+
+def compareResults(results, baseline, threshold):
+    ''' Return the names of scenarios slower than the baseline by more than threshold '''
+    regressions = []
+    print("\n  %-32s %12s %12s %8s" % ("scenario", "baseline ms", "current ms", "change"))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['seconds']
+        after = result['seconds']
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("  %-32s %12.2f %12.2f %+7.1f%%%s" % (name, before * 1000, after * 1000, change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="python -m benchmarks.suite [options]")
+    parser.add_option("-o", "--output", dest="output", help="Write results to this JSON file")
+    parser.add_option("-c", "--compare", dest="compare", help="Compare against a baseline JSON file")
+    parser.add_option("--threshold", dest="threshold", type="float", default=0.25,
+                      help="Relative slowdown reported as a regression (default: 0.25)")
+    parser.add_option("--latency", dest="latency", type="float", default=0.0,
+                      help="Seconds added to every fake docker call")
+    parser.add_option("--repeat", dest="repeat", type="int", default=3)
+    parser.add_option("--scale", dest="scale", type="float", default=1.0,
+                      help="Multiply the size of every scenario")
+    parser.add_option("--start-services", dest="startServices", type="int", default=200)
+    parser.add_option("--links", dest="links", type="int", default=3)
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=8)
+    parser.add_option("--only", dest="only", action="append", help="Run scenarios starting with this prefix")
+    (options, args) = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    print("dockwrkr benchmarks (fake docker latency: %.1f ms)" % (options.latency * 1000))
+    results = runScenarios(options)
+
+    report = OrderedDict([
+        ('meta', OrderedDict([
+            ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('latency', options.latency),
+            ('scale', options.scale),
+        ])),
+        ('results', results),
+    ])
+    if options.output:
+        with open(options.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+    if options.compare:
+        with open(options.compare) as fh:
+            baseline = json.load(fh)['results']
+        regressions = compareResults(results, baseline, options.threshold)
+        if regressions:
+            print("\n%d regression(s): %s" % (len(regressions), ', '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
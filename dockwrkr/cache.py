@@ -0,0 +1,99 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+
+from dockwrkr._version import __version__
+from dockwrkr.utils import sha1sum
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = 1
+DAEMON_CACHE_TTL = 3600
+
+
+def getCacheDirectory():
+    if os.environ.get('DOCKWRKR_CACHE_DIR'):
+        return os.environ['DOCKWRKR_CACHE_DIR']
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'dockwrkr')
+
+
+class ConfigCache(object):
+    ''' Pickled configurations and their compiled dependency graph, keyed by config file '''
+
+    def __init__(self, directory=None):
+        self.directory = directory or getCacheDirectory()
+
+    def getEntryPath(self, path, kind='config'):
+        key = hashlib.sha1(os.path.realpath(path).encode()).hexdigest()
+        return os.path.join(self.directory, "%s-%s.pickle" % (kind, key))
+
+    @staticmethod
+    def readFingerprint(path):
+        ''' Identity of a config file; the checksum catches edits that keep mtime and size '''
+        st = os.stat(path)
+        return (os.path.realpath(path), st.st_mtime_ns, st.st_size, sha1sum(path))
+
+    def read(self, path, fingerprint):
+        ''' Return the cached entry for path, or None when it is missing or stale '''
+        entry = self.load(path)
+        if entry is None or entry.get('fingerprint') != fingerprint:
+            return None
+        return entry
+
+    def write(self, path, fingerprint, config, graph=None):
+        return self.store(path, {'fingerprint': fingerprint, 'config': config, 'graph': graph})
+
+    def load(self, path, kind='config'):
+        try:
+            with open(self.getEntryPath(path, kind), 'rb') as fh:
+                entry = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logger.debug("Ignoring unreadable %s cache for %s: %s" % (kind, path, err))
+            return None
+        if not isinstance(entry, dict) or entry.get('format') != (CACHE_FORMAT, __version__):
+            return None
+        return entry
+
+    def store(self, path, entry, kind='config'):
+        ''' Store an entry atomically so concurrent readers and writers only ever see whole files '''
+        import tempfile
+        entry = dict(entry, format=(CACHE_FORMAT, __version__))
+        tmp = None
+        try:
+            os.makedirs(self.directory, 0o700, exist_ok=True)
+            (fd, tmp) = tempfile.mkstemp(prefix='.%s-' % kind, dir=self.directory)
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump(entry, fh, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.getEntryPath(path, kind))
+            return True
+        except Exception as err:
+            logger.debug("Could not write %s cache for %s: %s" % (kind, path, err))
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+
+
+class DaemonCache(ConfigCache):
+    ''' Version and capabilities probed from a docker daemon, keyed by DOCKER_HOST and kept for `ttl` seconds '''
+
+    def __init__(self, directory=None, ttl=DAEMON_CACHE_TTL):
+        super(DaemonCache, self).__init__(directory)
+        self.ttl = ttl
+
+    def getEntryPath(self, host, kind='daemon'):
+        key = hashlib.sha1(host.encode()).hexdigest()
+        return os.path.join(self.directory, "%s-%s.pickle" % (kind, key))
+
+    def read(self, host):
+        entry = self.load(host, kind='daemon')
+        if entry is None or not 0 <= time.time() - entry.get('probed', 0) < self.ttl:
+            return None
+        return entry.get('info')
+
+    def write(self, host, info):
+        return self.store(host, {'probed': time.time(), 'info': info}, kind='daemon')
@@ -30,6 +30,8 @@ class DockwrkrCLI(Program):
         self.addCommand('stats', 'dockwrkr.command.stats')
         self.addCommand('login', 'dockwrkr.command.login')
         self.addCommand('run', 'dockwrkr.command.run')
+        self.addCommand('pids', 'dockwrkr.command.pids')
+        self.addCommand('metrics', 'dockwrkr.command.metrics')
         return self
 
     def getShellOptions(self, optparser):
@@ -39,6 +41,8 @@ class DockwrkrCLI(Program):
             "-d", dest="debug", help="Activate debugging output", default=False, action="store_true")
         optparser.add_option(
             "-y", dest="assumeYes", help="Assume yes when prompted", default=False, action="store_true")
+        optparser.add_option(
+            "--no-cache", dest="noCache", help="Do not use the configuration cache", default=False, action="store_true")
         return optparser
 
     def getUsage(self):
@@ -53,6 +57,9 @@ class DockwrkrCLI(Program):
         if self.getOption('assumeYes'):
             command.assumeYes = True
 
+        if self.getOption('noCache'):
+            core.configCache = None
+
         if self.getOption('configFile') and os.path.isfile(self.getOption('configFile')):
             logger.debug("Configuration file: %s" % self.getOption('configFile'))
             core.configFile = self.getOption('configFile')
@@ -6,6 +6,8 @@ class Create(Command):
     def getShellOptions(self, optparser):
         optparser.add_option("-a", "--all", dest="allc",
                              help="Apply to defined containers", default=False, action="store_true")
+        optparser.add_option("-j", "--jobs", dest="jobs", type="int",
+                             help="Number of containers to process in parallel", default=None)
         return optparser
 
     def getUsage(self):
@@ -18,5 +20,5 @@ class Create(Command):
         containers = self.args
         if not len(self.args) > 0 and not self.options.allc:
             return self.exitWithHelp("Please provide a container or use -a for all containers.")
-        return self.core.create(self.args, all=self.getOption('allc')) \
+        return self.core.create(self.args, all=self.getOption('allc'), jobs=self.getOption('jobs')) \
             .catch(self.exitError)
@@ -0,0 +1,33 @@
+from dockwrkr.monads import *
+from dockwrkr.core import (DOCKWRKR_METRICS_LISTEN, DOCKWRKR_METRICS_INTERVAL)
+from dockwrkr.command.stats import STATS_SOURCES
+from dockwrkr import (Command)
+
+
+class Metrics(Command):
+
+    def getShellOptions(self, optparser):
+        optparser.add_option("-l", "--listen", dest="listen",
+                             help="Address to serve the metrics on, as [HOST]:PORT (default: %s)" % DOCKWRKR_METRICS_LISTEN,
+                             default=DOCKWRKR_METRICS_LISTEN)
+        optparser.add_option("-i", "--interval", dest="interval", type="float",
+                             help="Seconds between resource usage samples, 0 to disable them (default: %s)" % DOCKWRKR_METRICS_INTERVAL,
+                             default=DOCKWRKR_METRICS_INTERVAL)
+        optparser.add_option("--source", dest="source", type="choice", choices=STATS_SOURCES,
+                             help="Read resource usage through docker, or from the cgroups of a local daemon (default: docker)",
+                             default='docker')
+        return optparser
+
+    def getUsage(self):
+        return "dockwrkr metrics [options] CONTAINER..."
+
+    def getHelpTitle(self):
+        return "Serve the container metrics in the Prometheus text format"
+
+    def main(self):
+        try:
+            return self.core.serveMetrics(self.args, listen=self.getOption('listen'),
+                                          interval=self.getOption('interval'), source=self.getOption('source')) \
+                .catch(self.exitError)
+        except KeyboardInterrupt:
+            return OK(None)
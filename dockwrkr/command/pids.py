@@ -0,0 +1,40 @@
+import logging
+from dockwrkr.monads import *
+from dockwrkr import (Command)
+
+logger = logging.getLogger(__name__)
+
+
+class Pids(Command):
+
+    def getShellOptions(self, optparser):
+        optparser.add_option("-s", "--sync", dest="sync",
+                             help="Apply the changes to pids.dir", default=False, action="store_true")
+        return optparser
+
+    def getUsage(self):
+        return "dockwrkr pids [options]"
+
+    def getHelpTitle(self):
+        return "Check the pidfiles against the running containers, or fix them with --sync"
+
+    def main(self):
+        return self.core.syncPids(dryRun=not self.getOption('sync')) \
+            .bind(self.reportChanges) \
+            .catch(self.exitError)
+
+    def reportChanges(self, changes):
+        if not changes:
+            logger.info("All pidfiles are in sync.")
+            return OK(None)
+        done = self.getOption('sync')
+        for (container, action, pid) in changes:
+            if action == 'removed':
+                logger.info("'%s' pidfile %s." % (container, "removed" if done else "is stale"))
+            elif action == 'written':
+                logger.info("'%s' pidfile %s (%s)." % (container, "written" if done else "is missing", pid))
+            else:
+                logger.info("'%s' pidfile %s (%s)." % (container, "fixed" if done else "has the wrong pid", pid))
+        if not done:
+            return self.exitError("Run 'dockwrkr pids --sync' to fix the pidfiles.")
+        return OK(None)
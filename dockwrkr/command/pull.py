@@ -1,11 +1,21 @@
+import logging
+from dockwrkr.monads import *
+from dockwrkr.utils import humanReadableBytes
 from dockwrkr import (Command)
 
+logger = logging.getLogger(__name__)
+
 
 class Pull(Command):
 
     def getShellOptions(self, optparser):
         optparser.add_option("-a", "--all", dest="allc",
                              help="Apply to defined containers", default=False, action="store_true")
+        optparser.add_option("-j", "--jobs", dest="jobs", type="int",
+                             help="Number of images to pull in parallel", default=None)
+        optparser.add_option("-m", "--missing-only", dest="missingOnly",
+                             help="Only pull images that are missing locally or use a floating tag such as 'latest'",
+                             default=False, action="store_true")
         return optparser
 
     def getUsage(self):
@@ -18,5 +28,17 @@ class Pull(Command):
         containers = self.args
         if not len(self.args) > 0 and not self.options.allc:
             return self.exitWithHelp("Please provide a container or use -a for all containers.")
-        return self.core.pull(self.args, all=self.getOption('allc')) \
-            .catch(self.exitError)
+        return self.core.pull(self.args, all=self.getOption('allc'), jobs=self.getOption('jobs'),
+                              missingOnly=self.getOption('missingOnly')) \
+            .bind(self.tabulateSummary) \
+            .catch(self.exitError) \
+            .bind(logger.info)
+
+    def tabulateSummary(self, pulled):
+        import tabulate
+        rows = [[image, humanReadableBytes(size) if size is not None else '-',
+                 "%.1fs" % elapsed if elapsed is not None else "skipped"]
+                for (image, size, elapsed) in pulled]
+        skipped = len([row for row in pulled if row[2] is None])
+        table = tabulate.tabulate(rows, headers=["IMAGE", "SIZE", "TIME"], tablefmt="plain")
+        return OK("%s\n\nFetched %d image(s), skipped %d." % (table, len(pulled) - skipped, skipped))
@@ -10,6 +10,8 @@ class Remove(Command):
                              help="Stop running containers", default=False, action="store_true")
         optparser.add_option("-t", "--time", dest="time",
                              help="Seconds to wait before sending SIGKILL", default=10)
+        optparser.add_option("-j", "--jobs", dest="jobs", type="int",
+                             help="Number of containers to process in parallel", default=None)
         return optparser
 
     def getUsage(self):
@@ -22,5 +24,6 @@ class Remove(Command):
         containers = self.args
         if not len(self.args) > 0 and not self.options.allc:
             return self.exitWithHelp("Please provide a container or use -a for all containers.")
-        return self.core.remove(self.args, all=self.getOption('allc'), force=self.getOption('force'), time=self.getOption('time')) \
+        return self.core.remove(self.args, all=self.getOption('allc'), force=self.getOption('force'),
+                                time=self.getOption('time'), jobs=self.getOption('jobs')) \
             .catch(self.exitError)
@@ -10,6 +10,8 @@ class Reset(Command):
     def getShellOptions(self, optparser):
         optparser.add_option("-t", "--time", dest="time",
                              help="Seconds to wait before sending SIGKILL", default=10)
+        optparser.add_option("-j", "--jobs", dest="jobs", type="int",
+                             help="Number of containers to process in parallel", default=None)
         return optparser
 
     def getUsage(self):
@@ -19,4 +21,4 @@ class Reset(Command):
         return "Reset container managed by dockwrkr (stop/remove)"
 
     def main(self):
-        return self.core.reset(time=self.getOption('time')).catch(self.exitError)
+        return self.core.reset(time=self.getOption('time'), jobs=self.getOption('jobs')).catch(self.exitError)
@@ -8,6 +8,14 @@ class Restart(Command):
                              help="Apply to defined containers", default=False, action="store_true")
         optparser.add_option("-t", "--time", dest="time",
                              help="Seconds to wait before sending SIGKILL", default=10)
+        optparser.add_option("-r", "--rolling", dest="rolling",
+                             help="Restart the containers in batches, waiting for each batch to be back up",
+                             default=False, action="store_true")
+        optparser.add_option("-b", "--batch-size", dest="batchSize", type="int",
+                             help="Number of containers restarted at a time with --rolling (default: 1)", default=None)
+        optparser.add_option("-w", "--wait-healthy", dest="waitHealthy",
+                             help="With --rolling, wait for each batch to pass its health check",
+                             default=False, action="store_true")
         return optparser
 
     def getUsage(self):
@@ -20,5 +28,9 @@ class Restart(Command):
         containers = self.args
         if not len(self.args) > 0 and not self.options.allc:
             return self.exitWithHelp("Please provide a container or use -a for all containers.")
-        return self.core.restart(self.args, all=self.getOption('allc'), time=self.getOption('time')) \
+        if not self.options.rolling and (self.options.batchSize is not None or self.options.waitHealthy):
+            return self.exitError("--batch-size and --wait-healthy only apply to --rolling restarts.")
+        return self.core.restart(self.args, all=self.getOption('allc'), time=self.getOption('time'),
+                                 rolling=self.getOption('rolling'), batchSize=self.getOption('batchSize') or 1,
+                                 waitHealthy=self.getOption('waitHealthy')) \
             .catch(self.exitError)
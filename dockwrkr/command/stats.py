@@ -1,9 +1,31 @@
+import sys
+import logging
+from dockwrkr.monads import *
+from dockwrkr.exceptions import UserInterruptError
+from dockwrkr.stats import (StatsBuffer, STATS_BUFFER_SIZE)
+from dockwrkr.utils import humanReadableBytes
+from dockwrkr.command.status import (writeJSON, writeCSV)
 from dockwrkr import (Command)
 
+logger = logging.getLogger(__name__)
+
+STATS_SUMMARY_FIELDS = ['name', 'metric', 'samples', 'min', 'mean', 'p95']
+STATS_FORMATS = ['table', 'json', 'csv']
+STATS_SOURCES = ['docker', 'cgroup']
+
 
 class Stats(Command):
 
     def getShellOptions(self, optparser):
+        optparser.add_option("-s", "--sample", dest="sample", type="float",
+                             help="Sample every INTERVAL seconds and print min, mean and p95 per container", default=None)
+        optparser.add_option("-n", "--count", dest="count", type="int",
+                             help="Number of samples to take, 0 to sample until interrupted (default: 10)", default=10)
+        optparser.add_option("--source", dest="source", type="choice", choices=STATS_SOURCES,
+                             help="Read samples through docker, or from the cgroups of a local daemon (default: docker)",
+                             default='docker')
+        optparser.add_option("--format", dest="format", type="choice", choices=STATS_FORMATS,
+                             help="Summary format: %s (default: table)" % ', '.join(STATS_FORMATS), default='table')
         return optparser
 
     def getUsage(self):
@@ -13,6 +35,43 @@ class Stats(Command):
         return "Output live stats for the listed containers"
 
     def main(self):
-        containers = self.args
-        return self.core.stats(self.args) \
+        if self.getOption('sample') is None and self.getOption('format') == 'table' and self.getOption('source') == 'docker':
+            return self.core.stats(self.args) \
+                .catch(self.exitError)
+        return self.sampleStats() \
+            .bind(self.writeSummary, fmt=self.getOption('format')) \
             .catch(self.exitError)
+
+    def sampleStats(self):
+        buffer = StatsBuffer(min(self.getOption('count') or STATS_BUFFER_SIZE, STATS_BUFFER_SIZE))
+        try:
+            return self.core.sampleStats(self.args, interval=self.getOption('sample') or 1,
+                                         count=self.getOption('count'), buffer=buffer, source=self.getOption('source')) \
+                .catchError(UserInterruptError, lambda e: OK(buffer))
+        except KeyboardInterrupt:
+            return OK(buffer)
+
+    def writeSummary(self, buffer, fmt='table'):
+        records = buffer.summarize()
+        if fmt == 'json':
+            writeJSON(sys.stdout, iter(records))
+        elif fmt == 'csv':
+            writeCSV(sys.stdout, iter(records), fields=STATS_SUMMARY_FIELDS)
+        else:
+            logger.info(tabulateSummary(records))
+        return OK(None)
+
+
+def formatMetric(metric, value):
+    if metric == 'cpu':
+        return "%.2f%%" % value
+    if metric == 'pids':
+        return "%.1f" % value
+    return humanReadableBytes(value)
+
+
+def tabulateSummary(records):
+    import tabulate
+    rows = [[r['name'], r['metric'], r['samples']] + [formatMetric(r['metric'], r[x]) for x in ('min', 'mean', 'p95')]
+            for r in records]
+    return tabulate.tabulate(rows, headers=["NAME", "METRIC", "SAMPLES", "MIN", "MEAN", "P95"], tablefmt="plain")
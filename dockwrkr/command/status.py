@@ -1,13 +1,25 @@
+import sys
+import json
 import logging
+from collections import OrderedDict
 from dockwrkr.monads import *
 from dockwrkr import (Command)
-import tabulate
 
 logger = logging.getLogger(__name__)
 
+STATUS_FIELDS = ['name', 'cid', 'image', 'pid', 'ip', 'ports', 'startedat', 'running', 'exitcode', 'exiterr', 'health']
+STATUS_FORMATS = ['table', 'json', 'ndjson', 'csv']
+
+
 class Status(Command):
 
     def getShellOptions(self, optparser):
+        optparser.add_option("-w", "--watch", dest="watch",
+                             help="Keep running and update the table as containers change", default=False, action="store_true")
+        optparser.add_option("-i", "--interval", dest="interval", type="float",
+                             help="Seconds between uptime refreshes with --watch (default: 2)", default=2)
+        optparser.add_option("--format", dest="format", type="choice", choices=STATUS_FORMATS,
+                             help="Output format: %s (default: table)" % ', '.join(STATUS_FORMATS), default='table')
         return optparser
 
     def getUsage(self):
@@ -17,12 +29,41 @@ class Status(Command):
         return "Output the container status table"
 
     def main(self):
+        if self.getOption('watch'):
+            return self.watchStatus()
+        if self.getOption('format') != 'table':
+            return self.core.iterStatus(self.args) \
+                .bind(self.writeStatus, fmt=self.getOption('format')) \
+                .catch(self.exitError)
         return self.core.status(self.args) \
             .bind(self.tabulateStatus) \
             .catch(self.exitError) \
             .bind(logger.info)
 
+    def watchStatus(self):
+        view = StatusView(sys.stdout)
+        try:
+            return self.core.watchStatus(self.args, callback=lambda table: view.draw(self.tabulateStatus(table).getOK()),
+                                         interval=self.getOption('interval')) \
+                .catch(self.exitError)
+        except KeyboardInterrupt:
+            return OK(None)
+
+    def writeStatus(self, statuses, fmt='json'):
+        ''' Write the records as they are read; a failure ends the output cleanly and is returned as a Fail '''
+        failed = []
+
+        def readRecords():
+            try:
+                for status in statuses:
+                    yield readStatusRecord(status)
+            except Exception as err:
+                failed.append(err)
+        STATUS_WRITERS[fmt](sys.stdout, readRecords())
+        return Fail(failed[0]) if failed else OK(None)
+
     def tabulateStatus(self, containerStatuses):
+        import tabulate
         logger.debug("STATUSES: %s" %containerStatuses)
 
         headers = ["NAME", "CONTAINER", "PID", "IP", "UPTIME", "EXIT"]
@@ -30,3 +71,72 @@ class Status(Command):
         table = tabulate.tabulate(
             containerStatuses, headers=headers, tablefmt="plain")
         return OK(table)
+
+
+class StatusView(object):
+    '''
+    Status table kept on screen. On a terminal, a redraw only rewrites the
+    lines that differ from the previous table; otherwise changed lines are
+    appended.
+    '''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.tty = stream.isatty()
+        self.lines = []
+
+    def draw(self, table):
+        lines = table.splitlines()
+        if not self.lines:
+            self.stream.write(''.join(line + '\n' for line in lines))
+        elif not self.tty:
+            self.stream.write(''.join(line + '\n' for (i, line) in enumerate(lines)
+                                      if i >= len(self.lines) or line != self.lines[i]))
+        elif len(lines) != len(self.lines):
+            self.stream.write("\x1b[%dA\r\x1b[J" % len(self.lines))
+            self.stream.write(''.join(line + '\n' for line in lines))
+        else:
+            for (i, line) in enumerate(lines):
+                if line != self.lines[i]:
+                    up = len(lines) - i
+                    self.stream.write("\x1b[%dA\r\x1b[2K%s\x1b[%dB\r" % (up, line, up))
+        self.stream.flush()
+        self.lines = lines
+
+
+def readStatusRecord(status):
+    record = OrderedDict((field, getattr(status, field)) for field in STATUS_FIELDS)
+    record['ports'] = (status.ports or '').strip() or None
+    record['exiterr'] = status.exiterr or None
+    return record
+
+
+def writeJSON(stream, records):
+    separator = '[\n'
+    for record in records:
+        stream.write(separator + json.dumps(record))
+        stream.flush()
+        separator = ',\n'
+    stream.write('[]\n' if separator == '[\n' else '\n]\n')
+
+
+def writeNDJSON(stream, records):
+    for record in records:
+        stream.write(json.dumps(record) + '\n')
+        stream.flush()
+
+
+def writeCSV(stream, records, fields=STATUS_FIELDS):
+    import csv
+    writer = csv.writer(stream, lineterminator='\n')
+    writer.writerow(fields)
+    for record in records:
+        writer.writerow(['' if value is None else value for value in record.values()])
+        stream.flush()
+
+
+STATUS_WRITERS = {
+    'json': writeJSON,
+    'ndjson': writeNDJSON,
+    'csv': writeCSV,
+}
@@ -8,6 +8,8 @@ class Stop(Command):
                              help="Apply to defined containers", default=False, action="store_true")
         optparser.add_option("-t", "--time", dest="time",
                              help="Seconds to wait before sending SIGKILL", default=10)
+        optparser.add_option("-j", "--jobs", dest="jobs", type="int",
+                             help="Number of containers to process in parallel", default=None)
         return optparser
 
     def getUsage(self):
@@ -20,5 +22,5 @@ class Stop(Command):
         containers = self.args
         if not len(self.args) > 0 and not self.options.allc:
             return self.exitHelp("Please provide a container or use -a for all containers.")
-        return self.core.stop(self.args, all=self.getOption('allc'), time=self.getOption('time')) \
+        return self.core.stop(self.args, all=self.getOption('allc'), time=self.getOption('time'), jobs=self.getOption('jobs')) \
             .catch(self.exitError)
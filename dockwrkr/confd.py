@@ -0,0 +1,130 @@
+import os
+import logging
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from dockwrkr.graph import readLinks
+from dockwrkr.utils import readYAML
+from dockwrkr.exceptions import InvalidConfigError
+
+logger = logging.getLogger(__name__)
+
+CONFD_DIRECTORY = 'conf.d'
+CONFD_SECTIONS = ('services', 'containers', 'jobs')
+CONFD_EXTENSIONS = ('.yml', '.yaml')
+
+
+class ConfigIndex(object):
+    '''
+    Index of a conf.d directory holding one file per service, as
+    conf.d/<section>/<name>.yml.
+
+    The index records the links and autostart flag of every file so the
+    dependency graph can be built without parsing them. It is persisted in
+    the config cache and a file is only parsed again when its mtime or size
+    changes.
+    '''
+
+    def __init__(self, directory, cache=None):
+        self.directory = directory
+        self.cache = cache
+        self.entries = OrderedDict()
+        self.loaded = {}
+        self.build()
+
+    def build(self):
+        previous = (self.cache.load(self.directory, kind='confd') if self.cache else None) or {}
+        previous = previous.get('entries', {})
+        changed = False
+        for section in CONFD_SECTIONS:
+            path = os.path.join(self.directory, section)
+            if not os.path.isdir(path):
+                continue
+            for filename in sorted(os.listdir(path)):
+                (name, ext) = os.path.splitext(filename)
+                if ext not in CONFD_EXTENSIONS or name.startswith('.'):
+                    continue
+                filePath = os.path.join(path, filename)
+                st = os.stat(filePath)
+                stamp = (st.st_mtime_ns, st.st_size)
+                entry = previous.get(filePath)
+                if not entry or entry['stamp'] != stamp or entry['section'] != section:
+                    config = self.parse(filePath, name)
+                    entry = {'section': section, 'name': name, 'stamp': stamp,
+                             'links': readLinks(config), 'autostart': config.get('autostart', True)}
+                    changed = True
+                if (section, name) in self.entries:
+                    raise InvalidConfigError("'%s' is defined more than once in %s." % (name, path))
+                self.entries[(section, name)] = dict(entry, path=filePath)
+        if self.cache and (changed or len(previous) != len(self.entries)):
+            self.cache.store(self.directory, {'entries': dict((e['path'], e) for e in self.entries.values())}, kind='confd')
+
+    def parse(self, path, name):
+        config = readYAML(path)
+        if config is None:
+            config = OrderedDict()
+        if not isinstance(config, dict):
+            raise InvalidConfigError("[%s] %s must contain a mapping of options." % (name, path))
+        self.loaded[path] = config
+        return config
+
+    def getSections(self):
+        return list(OrderedDict.fromkeys(section for (section, name) in self.entries))
+
+    def getNames(self, section):
+        return [name for (s, name) in self.entries if s == section]
+
+    def getEntry(self, section, name):
+        return self.entries[(section, name)]
+
+    def readConfig(self, section, name):
+        path = self.entries[(section, name)]['path']
+        if path not in self.loaded:
+            logger.debug("Loading %s" % path)
+            self.parse(path, name)
+        return self.loaded[path]
+
+
+class ConfigSection(Mapping):
+    '''
+    Read-only mapping of a config section merging the services defined in
+    dockwrkr.yml with those of conf.d. Service files are parsed on first
+    access.
+    '''
+
+    def __init__(self, index, section, inline=None):
+        self.index = index
+        self.section = section
+        self.inline = inline or {}
+        self.names = list(self.inline.keys())
+        for name in index.getNames(section):
+            if name in self.inline:
+                raise InvalidConfigError("'%s' is defined both in dockwrkr.yml and in %s." % (
+                    name, index.getEntry(section, name)['path']))
+            self.names.append(name)
+
+    def __getitem__(self, name):
+        if name in self.inline:
+            return self.inline[name]
+        if (self.section, name) not in self.index.entries:
+            raise KeyError(name)
+        return self.index.readConfig(self.section, name)
+
+    def __contains__(self, name):
+        return name in self.inline or (self.section, name) in self.index.entries
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def readLinks(self, name):
+        if name in self.inline:
+            return readLinks(self.inline[name])
+        return self.index.getEntry(self.section, name)['links']
+
+    def isAutostart(self, name):
+        if name in self.inline:
+            return self.inline[name].get('autostart', True)
+        return self.index.getEntry(self.section, name)['autostart']
@@ -2,25 +2,24 @@
 
 import sys
 import os
-import re
 import logging
-import pkgutil
 import importlib
-import traceback
 from collections import OrderedDict
-from importlib import import_module
 import optparse
-from getpass import getpass
 from dockwrkr.exceptions import InvalidCommandError
 
 logger = logging.getLogger(__name__)
 
 
 class Parser(optparse.OptionParser):
-    pass
+    ''' Description and epilog may be callables, only evaluated when help is rendered '''
+
+    def get_description(self):
+        return self.description() if callable(self.description) else self.description
 
     def format_epilog(self, formatter):
-        return "\n" + self.epilog if self.epilog else ""
+        epilog = self.epilog() if callable(self.epilog) else self.epilog
+        return "\n" + epilog if epilog else ""
 
 
 class PassThroughParser(Parser):
@@ -70,7 +69,7 @@ class CLI(object):
         usage = self.getUsage()
         parserClass = self.getParserClass()
         parser = parserClass(usage=usage, conflict_handler="resolve", add_help_option=False,
-                             description=self.getHelpTitle(), epilog=self.getHelpDetails())
+                             description=self.getHelpTitle, epilog=self.getHelpDetails)
         self.getShellOptions(parser)
         if interspersed:
             parser.enable_interspersed_args()
@@ -130,9 +129,11 @@ class CLI(object):
         return input(msg + "\n")
 
     def readpwd(self, msg=""):
+        from getpass import getpass
         return getpass(msg)
 
     def readpwdln(self, msg=""):
+        from getpass import getpass
         return getpass(msg + "\n")
 
     def ask(self, msg):
@@ -249,6 +250,7 @@ class Program(CLI):
 
             self.runCommand(self.cmdString)
         except Exception as err:
+            import traceback
             logger.error(traceback.format_exc())
             self.exitError("Error running command %s: %s" %
                            (self.cmdString, err), code=2)
@@ -2,17 +2,40 @@ import os
 import sys
 import logging
 import re
+import threading
+from time import (monotonic, sleep)
+from collections import OrderedDict
 from dockwrkr.monads import *
 from dockwrkr.logs import *
 from dockwrkr.exceptions import *
-from dockwrkr.shell import Shell
-from dockwrkr.utils import (readYAML, mergeDict, ensureList,
-                            dateToAgo, walkUpForFile, writeToFile, expandLocalPath)
+from dockwrkr.executor import (DependencyExecutor, runConcurrently)
+from dockwrkr.graph import DependencyGraph
+from dockwrkr.cache import ConfigCache
+from dockwrkr.state import (StateStore, CommandState)
+from dockwrkr.pids import PidFiles
+from dockwrkr.stats import (StatsBuffer, CgroupStats)
+from dockwrkr.metrics import (MetricsExporter, METRICS_PATH)
+from dockwrkr.confd import (ConfigIndex, ConfigSection, CONFD_DIRECTORY)
+from dockwrkr.utils import (readYAML, mergeDict,
+                            dateToAgo, walkUpForFile, expandLocalPath)
 import dockwrkr.docker as docker
 
 logger = logging.getLogger(__name__)
 
 
+DOCKWRKR_WATCH_INTERVAL = 2
+DOCKWRKR_METRICS_LISTEN = ':9273'
+DOCKWRKR_METRICS_INTERVAL = 15
+
+
+def readUptime(status):
+    if not status.startedat:
+        return "-"
+    if status.health:
+        return "%s (%s)" % (dateToAgo(status.startedat), status.health)
+    return dateToAgo(status.startedat)
+
+
 class Core(object):
 
     def __init__(self):
@@ -20,18 +43,73 @@ class Core(object):
         self.configFile = None
         self.initialized = False
         self.config = {}
+        self.graph = None
+        self.configCache = ConfigCache()
+        self.pendingCache = None
+        self.configIndex = None
+        self.docker = docker.loadBackend()
+        self.state = StateStore(self.docker)
         return
 
     def initialize(self):
         if self.initialized:
             return OK(None)
-        return self.loadConfig().then(defer(self.setInitialized, b=True))
+        return self.loadConfig() \
+            .then(self.compileGraph) \
+            .then(self.writeConfigCache) \
+            .then(defer(self.setInitialized, b=True))
 
     def setInitialized(self, b):
         self.initialized = b
 
     def loadConfig(self):
-        return self.readConfigFile() >> self.setConfig
+        self.pendingCache = None
+        fingerprint = self.readConfigFingerprint()
+        if fingerprint:
+            cached = self.configCache.read(self.configFile, fingerprint)
+            if cached:
+                return self.setConfig(cached['config']) \
+                    .then(defer(self.setGraph, graph=cached['graph'])) \
+                    .then(self.loadConfigDirectory)
+
+        def setLoadedConfig(config):
+            if fingerprint:
+                self.pendingCache = (fingerprint, config)
+            return self.setConfig(config)
+        return (self.readConfigFile() >> setLoadedConfig) \
+            .then(self.loadConfigDirectory)
+
+    def loadConfigDirectory(self):
+        ''' Add the services of the conf.d directory next to the config file '''
+        directory = os.path.join(self.getBasePath(), CONFD_DIRECTORY)
+        if not os.path.isdir(directory):
+            return OK(None)
+        return Try.attempt(ConfigIndex, directory, cache=self.configCache) \
+            .bind(self.setConfigIndex)
+
+    def setConfigIndex(self, index):
+        try:
+            for section in index.getSections():
+                self.config[section] = ConfigSection(index, section, inline=self.config.get(section))
+        except Exception as e:
+            return Fail(e)
+        self.configIndex = index
+        self.graph = None
+        return OK(index)
+
+    def readConfigFingerprint(self):
+        if not self.configCache or self.findConfigFile().isFail():
+            return None
+        return Try.attempt(ConfigCache.readFingerprint, self.configFile).getOrElse(None)
+
+    def writeConfigCache(self):
+        ''' Store the config read by loadConfig along with its compiled graph '''
+        if self.pendingCache:
+            (fingerprint, config) = self.pendingCache
+            self.pendingCache = None
+            # A graph depending on conf.d files is rebuilt from their index instead.
+            graph = None if self.configIndex else self.graph
+            self.configCache.write(self.configFile, fingerprint, config, graph)
 
     def findConfigFile(self):
         if self.configFile:
@@ -48,8 +126,28 @@ class Core(object):
 
     def setConfig(self, config):
         mergeDict(self.config, config)
+        self.graph = None
+        return Try.attempt(docker.loadBackend, self.config.get('backend')) \
+            .bind(self.setBackend)
+
+    def setBackend(self, backend):
+        if backend is not self.docker:
+            self.state.close()
+            self.state = StateStore(backend)
+        self.docker = backend
         return OK(self)
 
+    def compileGraph(self):
+        return Try.attempt(self.getGraph)
+
+    def setGraph(self, graph):
+        self.graph = graph
+
+    def getGraph(self):
+        if self.graph is None:
+            self.graph = DependencyGraph.fromConfig(self.getServicesConfig(), self.config.get('jobs'))
+        return self.graph
+
     def getRegistries(self):
         regs = self.config.get('registries', {})
         return regs
@@ -58,6 +156,9 @@ class Core(object):
         networks = self.config.get('networks', {})
         return networks
 
+    def getServicesConfig(self):
+        return self.config.get('services', self.config.get('containers', {}))
+
     def getDefinedServices(self, func=None, all=False):
         config_name = 'services'
         if not self.config.get(config_name):
@@ -68,41 +169,45 @@ class Core(object):
         return self.getDefinedContainers('jobs')
 
     def getDefinedContainers(self, configName='containers', func=None, all=False):
-        graph = []
         containers = self.config.get(configName, {})
-
-        for (container, container_config) in containers.items():
-            if func == self.__start and all and not container_config.get('autostart', True):
+        isAutostart = getattr(containers, 'isAutostart', lambda name: containers[name].get('autostart', True))
+        roots = []
+        for container in containers:
+            if func == self.__start and all and not isAutostart(container):
                 continue
-
-            node = self.getContainerDependencies(container)
-            graph.append(node)
-
-        def resolveDependencies(node, resolved):
-            for dep in node['deps']:
-                depnode = self.getContainerDependencies(dep)
-                if depnode['name'] not in resolved:
-                    resolveDependencies(depnode, resolved)
-            if node['name'] not in resolved:
-                resolved.append(node['name'])
-        resolved = []
-        for node in graph:
-            resolveDependencies(node, resolved)
-
-        return resolved
+            roots.append(container)
+        return self.getGraph().resolve(roots)
 
     def getContainerDependencies(self, container):
-        node = {}
-        node['name'] = container
-        deps = []
-        config = self.getContainerConfig(container)
-        if not config:
+        graph = self.getGraph()
+        if container not in graph:
             raise InvalidContainerError("Container named '%s' is listed as a dependency but it is never defined." % container)
-        if "link" in config:
-            for link in ensureList(config['link']):
-                deps.append(link.partition(':')[0])
-        node['deps'] = deps
-        return node
+        return {'name': container, 'deps': graph.getDependencies(container)}
+
+    def getConcurrency(self, jobs=None):
+        if jobs:
+            return int(jobs)
+        return int(self.config.get('concurrency', 1))
+
+    def runOrdered(self, containers, task, jobs=None, reverse=False, batched=False, gate=None):
+        '''
+        Run a task over containers in dependency order, or dependents first
+        with `reverse`. A `batched` task receives every container of a
+        dependency wave at once. A `gate` holds back the dependents of a
+        container until it returns (see DependencyExecutor).
+        '''
+        try:
+            graph = self.getGraph()
+            deps = graph.subgraph([x for x in containers if x in graph], reverse=reverse)
+        except Exception as e:
+            return Fail(e)
+        for container in containers:
+            if container not in deps:
+                deps[container] = []
+        executor = DependencyExecutor(deps, jobs=self.getConcurrency(jobs), gate=gate)
+        if batched:
+            return Try.sequence(executor.runBatched(task))
+        return Try.sequence(executor.run(task))
 
     def getBasePath(self):
         return os.path.dirname(self.configFile)
@@ -114,7 +219,7 @@ class Core(object):
         return self.getJobConfig(container)
 
     def getServiceConfig(self, container):
-        return self.config.get('services', self.config.get('containers', {})).get(container)
+        return self.getServicesConfig().get(container)
 
     def getJobConfig(self, container):
         return self.config.get('jobs', {}).get(container)
@@ -127,29 +232,34 @@ class Core(object):
 
     def readOrderedContainers(self, containers=[]):
         try:
-            defined = self.getDefinedServices()
+            defined = set(self.getDefinedServices())
         except Exception as e:
             return Fail(e)
         missing = [x for x in containers if x not in defined]
-        ordered = [x for x in defined if x in containers]
         if missing:
             return Fail(InvalidContainerError("Container '%s' not defined." % ' '.join(missing)))
-        return OK(ordered)
+        return OK(self.getGraph().sort(containers))
 
-    def create(self, containers=[], all=False):
-        return self.__command(self.__create, containers=containers, all=all)
+    def create(self, containers=[], all=False, jobs=None):
+        return self.__command(self.__create, containers=containers, all=all, jobs=jobs)
 
-    def start(self, containers=[], all=False):
-        return self.__command(self.__start, containers=containers, all=all)
+    def start(self, containers=[], all=False, jobs=None):
+        return self.__command(self.__start, containers=containers, all=all, jobs=jobs)
 
-    def stop(self, containers=[], all=False, time=docker.DOCKER_STOP_TIME):
-        return self.__command(self.__stop, containers=containers, all=all, time=time)
+    def stop(self, containers=[], all=False, time=docker.DOCKER_STOP_TIME, jobs=None):
+        return self.__command(self.__stop, containers=containers, all=all, time=time, jobs=jobs)
 
-    def remove(self, containers=[], all=False, time=docker.DOCKER_STOP_TIME, force=False):
-        return self.__command(self.__remove, containers=containers, all=all, time=time, force=force)
+    def remove(self, containers=[], all=False, time=docker.DOCKER_STOP_TIME, force=False, jobs=None):
+        return self.__command(self.__remove, containers=containers, all=all, time=time, force=force, jobs=jobs)
 
-    def restart(self, containers=[], all=False, time=docker.DOCKER_STOP_TIME):
-        return self.__command(self.__restart, containers=containers, all=all, time=time)
+    def restart(self, containers=[], all=False, time=docker.DOCKER_STOP_TIME, rolling=False, batchSize=1,
+                waitHealthy=False):
+        if not rolling:
+            return self.__command(self.__restart, containers=containers, all=all, time=time)
+        if int(batchSize) < 1:
+            return Fail(InvalidOptionError("The batch size must be at least 1."))
+        return self.__command(self.__rollingRestart, containers=containers, all=all, time=time,
+                              batchSize=int(batchSize), healthy=waitHealthy)
 
     def stats(self, containers=[]):
         if not containers:
@@ -159,6 +269,23 @@ class Core(object):
                 return Fail(e)
         return self.__command(self.__stats, containers=containers)
 
+    def sampleStats(self, containers=[], interval=1, count=10, buffer=None, source='docker'):
+        '''
+        Take `count` samples, or sample until interrupted with a count of 0, of
+        the running containers into a StatsBuffer. The `docker` source makes
+        one docker call per tick; the `cgroup` source reads the cgroup
+        filesystem of a local daemon and makes none.
+        '''
+        if not containers:
+            try:
+                containers = self.getDefinedServices()
+            except Exception as e:
+                return Fail(e)
+        buffer = buffer if buffer is not None else StatsBuffer()
+        return self.__readStates(containers) \
+            .bind(self.__sampleStats, containers=containers, interval=interval, count=count, buffer=buffer,
+                  source=source)
+
     def status(self, containers=[]):
         if not containers:
             try:
@@ -168,36 +295,143 @@ class Core(object):
         return self.__readStates(containers) \
             .bind(self.__status, containers=containers)
 
-    def reset(self, time=docker.DOCKER_STOP_TIME):
-        managed = docker.readManagedContainers()
-        if managed.isFail():
-            return managed
-
-        return managed \
-            .bind(docker.filterExistingContainers) \
-            .bind(docker.readContainersStatus) \
-            .bind(self.__remove, containers=managed.getOK(), time=time, force=True)
-
-    def pull(self, containers=[], all=False):
+    def iterStatus(self, containers=[]):
+        ''' Statuses of the containers in order, as an iterator fed by a single streaming inspect '''
+        if not containers:
+            try:
+                containers = self.getDefinedServices()
+            except Exception as e:
+                return Fail(e)
+        return self.readOrderedContainers(containers) \
+            .map(lambda ordered: self.__iterStatus(containers))
+
+    def watchStatus(self, containers=[], callback=None, interval=DOCKWRKR_WATCH_INTERVAL):
+        '''
+        Call `callback` with the status table, then again whenever the daemon
+        reports a change to one of the containers. Uptimes are refreshed every
+        `interval` seconds without asking the daemon.
+        '''
+        if not containers:
+            try:
+                containers = self.getDefinedServices()
+            except Exception as e:
+                return Fail(e)
+        try:
+            return self.state.watch() \
+                .then(defer(self.__watchStatus, containers=containers, callback=callback, interval=interval))
+        finally:
+            self.state.close()
+
+    def serveMetrics(self, containers=[], listen=DOCKWRKR_METRICS_LISTEN, interval=DOCKWRKR_METRICS_INTERVAL,
+                     source='docker', callback=None):
+        '''
+        Serve the Prometheus metrics of the containers until interrupted.
+        Statuses follow the docker events and resource usage is sampled every
+        `interval` seconds in the background; scrapes only read memory.
+        '''
+        if not containers:
+            try:
+                containers = self.getDefinedServices()
+            except Exception as e:
+                return Fail(e)
+        exporter = MetricsExporter(self.state, containers)
+        try:
+            return self.state.watch() \
+                .then(defer(exporter.serve, listen)) \
+                .bind(self.__serveMetrics, exporter, interval=interval, source=source, callback=callback)
+        finally:
+            self.state.close()
+
+    def reset(self, time=docker.DOCKER_STOP_TIME, jobs=None):
+        return self.state.snapshot() \
+            .map(CommandState) \
+            .bind(lambda state: self.__apply(state, self.__remove, containers=list(state), time=time, force=True, jobs=jobs))
+
+    def pull(self, containers=[], all=False, jobs=None, missingOnly=False):
         if all:
             try:
                 containers = self.getDefinedServices()
             except Exception as e:
                 return Fail(e)
 
+        images = OrderedDict()
+        for container in containers:
+            config = self.getContainerConfig(container)
+            if not config:
+                return Fail(InvalidContainerError("Container %s is not defined." % container))
+            images.setdefault(config.get('image'), []).append(container)
+
+        if not missingOnly:
+            return self.__loginRegistries(images) \
+                .then(defer(self.__pullImages, images, jobs=jobs))
+        return self.__readSkippedImages(images) \
+            .bind(lambda skipped: self.__loginRegistries([x for x in images if x not in skipped])
+                  .then(defer(self.__pullImages, images, jobs=jobs, skipped=skipped)))
+
+    def __readSkippedImages(self, images):
+        ''' Images with a pinned tag or digest that are already in the local store '''
+        pinned = [image for image in images if not docker.isFloatingImage(image)]
+        return self.docker.readLocalImages(pinned) \
+            .map(lambda local: [image for image in pinned if image in local])
+
+    def __loginRegistries(self, images):
+        '''
+        Log in once to each configured registry the images come from, unless
+        credentials for it are already stored by the docker client.
+        '''
         registries = self.getRegistries()
-
-        def pullImage(container):
-            image = self.getContainerImage(container)
-            unpacked = docker.unpackImageString(image)
-            registry = unpacked.get('registry')
-            op = OK(None)
-            if registry and registry in registries:
-                op.then(defer(self.login, registry=registry))
-            return op.then(defer(docker.pull, image=image)) \
-                .then(dinfo("'%s' (%s) has been pulled." % (container, image)))
-
-        return Try.sequence(list(map(pullImage, containers)))
+        used = OrderedDict.fromkeys(docker.unpackImageString(image).get('registry') for image in images)
+        for registry in used:
+            if registry in registries and not docker.hasStoredCredentials(registry):
+                result = self.login(registry)
+                if result.isFail():
+                    return result
+        return OK(None)
+
+    def __pullImages(self, images, jobs=None, skipped=[]):
+        '''
+        Pull each image once, up to `jobs` at a time, and return (image, size,
+        seconds) for the pulled images. Skipped images are not pulled and are
+        returned with no time.
+        '''
+        jobs = self.getConcurrency(jobs)
+        logins = {}
+        lock = threading.Lock()
+
+        def relogin(registry):
+            ''' Log in again, once per registry, after a pull was refused because stored credentials are stale '''
+            with lock:
+                if registry not in logins:
+                    logins[registry] = self.login(registry)
+                return logins[registry]
+
+        def pullImage(image):
+            logger.info("Pulling '%s'..." % image)
+            started = monotonic()
+            result = self.docker.pull(image, quiet=jobs > 1)
+            registry = docker.unpackImageString(image).get('registry')
+            if result.isFail() and docker.isAuthError(result.getError()) and registry in self.getRegistries():
+                result = relogin(registry).then(defer(self.docker.pull, image, quiet=jobs > 1))
+            if result.isFail():
+                logger.error("Failed to pull '%s': %s" % (image, result.getError()))
+                return result
+            elapsed = monotonic() - started
+            logger.info("'%s' (%s) has been pulled in %.1fs." % (image, ', '.join(images[image]), elapsed))
+            return OK(elapsed)
+
+        if skipped:
+            logger.info("Skipping %d image(s) already present: %s" % (len(skipped), ', '.join(skipped)))
+        fetched = [image for image in images if image not in skipped]
+        results = dict(zip(fetched, runConcurrently(pullImage, fetched, jobs)))
+        pulled = [(image, results[image].getOK() if image in results else None)
+                  for image in images if image not in results or results[image].isOK()]
+        sizes = self.docker.readImageSizes([image for (image, elapsed) in pulled]) \
+            .catch(lambda e: OK({})) \
+            .getOK()
+        failed = [result for result in results.values() if result.isFail()]
+        if failed:
+            return failed[0]
+        return OK([(image, sizes.get(image), elapsed) for (image, elapsed) in pulled])
 
     def login(self, registry):
         registries = self.getRegistries()
@@ -205,27 +439,31 @@ class Core(object):
         if not config:
             return Fail(InvalidRegistryError("Invalid registry specified for login. It is not configured."))
         logger.info("Logging into registry: %s" % registry)
-        return docker.login(registry, config.get('username'), config.get('password'), config.get('email'))
+        return self.docker.login(registry, config.get('username'), config.get('password'), config.get('email'))
 
-    def recreate(self, containers=[], all=False, time=docker.DOCKER_STOP_TIME):
+    def recreate(self, containers=[], all=False, time=docker.DOCKER_STOP_TIME, jobs=None):
         if all:
             try:
                 containers = self.getDefinedServices()
             except Exception as e:
                 return Fail(e)
+
+        def recreateContainers(state):
+            return self.__remove(state, containers=containers, force=True, time=time, jobs=jobs) \
+                .then(defer(self.__start, state, containers=containers, jobs=jobs))
         return self.__readStates(containers) \
-            .bind(self.__remove, containers=containers, force=True, time=time) \
-            .then(defer(self.__readStates, containers=containers)) \
-            .bind(self.__start, containers=containers)
+            .bind(self.__apply, recreateContainers)
 
     def run(self, container, containerArgs):
-        jobs = self.getDefinedJobs()
         try:
-            if container not in jobs:
+            if container not in set(self.getDefinedJobs()):
                 return Fail(InvalidContainerError("Container %s is not a defined job." % container))
         except Exception as e:
             return Fail(e)
-        return docker.run(container, containerArgs, self.getJobConfig(container), basePath=self.getBasePath(), networks=self.getNetworks())
+        state = CommandState()
+        return self.__reconcileNetworks(state, [container]) \
+            .then(lambda: self.docker.run(container, containerArgs, self.getJobConfig(container), basePath=self.getBasePath(),
+                                          networks=self.getNetworks(), existingNetworks=state.networks))
 
     def excmd(self, container, cmd, tty=False, interactive=False, user=None, detach=None, privileged=None):
         return self.__readStates([container]) \
@@ -233,7 +471,66 @@ class Core(object):
 
     def __stats(self, state, containers=[]):
         existing = [x for x in containers if x in state]
-        return docker.stats(existing)
+        return self.docker.stats(existing)
+
+    def __sampleStats(self, state, containers=[], interval=1, count=10, buffer=None, source='docker'):
+        running = [x for x in containers if x in state and state[x].running]
+        if not running:
+            logger.warn("None of the containers is running.")
+            return OK(buffer)
+        reader = self.__getStatsReader(source)
+        if reader.isFail():
+            return reader
+        readStats = reader.getOK()
+        taken = 0
+        while True:
+            started = monotonic()
+            samples = readStats(OrderedDict((x, state[x]) for x in running))
+            if samples.isFail():
+                return samples
+            buffer.add(samples.getOK())
+            taken += 1
+            if count and taken >= count:
+                return OK(buffer)
+            sleep(max(0, interval - (monotonic() - started)))
+
+    def __getStatsReader(self, source='docker'):
+        ''' Function reading one sample of the given running container statuses '''
+        if source == 'cgroup':
+            cgroups = CgroupStats()
+            if not cgroups.isAvailable():
+                return Fail(InvalidOptionError("The cgroups of the docker daemon cannot be read from this host."))
+            return OK(lambda statuses: OK(cgroups.read(OrderedDict((x, s.pid) for (x, s) in statuses.items()))))
+        return OK(lambda statuses: self.docker.readStats(list(statuses)))
+
+    def __serveMetrics(self, server, exporter, interval=DOCKWRKR_METRICS_INTERVAL, source='docker', callback=None):
+        try:
+            reader = self.__getStatsReader(source)
+            if reader.isFail():
+                return reader
+            readStats = reader.getOK()
+            logger.info("Serving metrics on http://%s:%s%s" % (server.server_address[0] or 'localhost',
+                                                               server.server_address[1], METRICS_PATH))
+            nextSample = monotonic()
+            while True:
+                if callback:
+                    callback(server)
+                if interval and monotonic() >= nextSample:
+                    statuses = self.state.lookup(exporter.containers)
+                    samples = readStats(OrderedDict((x, s) for (x, s) in statuses.items() if s.running))
+                    if samples.isFail():
+                        logger.warn("Failed to sample the resource usage: %s" % samples.getError())
+                    else:
+                        exporter.setSamples(samples.getOK())
+                    nextSample = monotonic() + interval
+                changed = self.state.waitForChanges(max(0, nextSample - monotonic()) if interval else None)
+                if changed.isFail():
+                    return changed
+                if not self.state.isLive():
+                    return Fail(DockerError(message="The docker events stream has ended."))
+        finally:
+            server.shutdown()
+            server.server_close()
 
     def __exec(self, state, container, cmd, tty=False, interactive=False, user=None, detach=False, privileged=False):
         if container not in state:
@@ -241,7 +538,7 @@ class Core(object):
         if not state[container].running:
             return Fail(InvalidContainerError("'%s' is not running. Cannot execute command." % container))
 
-        return docker.execmd(container, cmd, tty, interactive, user, detach, privileged)
+        return self.docker.execmd(container, cmd, tty, interactive, user, detach, privileged)
 
     def __command(self, func, containers=[], all=False, *args, **kwargs):
         if all:
@@ -250,12 +547,49 @@ class Core(object):
             except Exception as e:
                 return Fail(e)
         return self.__readStates(containers) \
-            .bind(func, containers=containers, *args, **kwargs)
+            .bind(self.__apply, func, containers=containers, *args, **kwargs)
+
+    def __apply(self, state, func, *args, **kwargs):
+        ''' Run a command over the container states, then bring the pidfiles in line with its changes '''
+        result = func(state, *args, **kwargs)
+        updated = self.updatePids(state)
+        if result.isFail():
+            return result
+        return updated.then(lambda: result)
 
     def __readStates(self, containers):
         return self.readOrderedContainers(containers) \
-            .bind(docker.filterExistingContainers) \
-            .bind(docker.readContainersStatus)
+            .bind(self.state.read) \
+            .map(CommandState)
+
+    def __iterStatus(self, containers):
+        statuses = self.docker.iterContainersStatus(containers)
+        wanted = set(containers)
+        pending = {}
+        for container in containers:
+            # Containers that do not exist have no inspect line, and a name
+            # matching another container's id prefix inspects that one: drop
+            # what was not asked for and hold later containers until their turn.
+            while not pending:
+                status = next(statuses, None)
+                if status is None:
+                    break
+                if status.name in wanted:
+                    pending[status.name] = status
+            wanted.discard(container)
+            yield pending.pop(container, None) or docker.ContainerStatus(container)
+
+    def __watchStatus(self, containers=[], callback=None, interval=DOCKWRKR_WATCH_INTERVAL):
+        while True:
+            table = self.state.read(containers).bind(self.__status, containers=containers)
+            if table.isFail():
+                return table
+            callback(table.getOK())
+            if not self.state.isLive():
+                return Fail(DockerError(message="The docker events stream has ended."))
+            changed = self.state.waitForChanges(interval)
+            if changed.isFail():
+                return changed
 
     def __status(self, state, containers=[]):
         table = []
@@ -270,75 +604,203 @@ class Core(object):
                 status.getCol('cid'),
                 status.getCol('pid'),
                 status.getCol('ip'),
-                dateToAgo(status.startedat) if status.startedat else "-",
+                readUptime(status),
                 docker.getErrorLabel(status) if not status.running else "-"
             ]
             table.append(row)
         return OK(table)
 
-    def __create(self, state, containers=[]):
-        ops = []
-        for container in containers:
+    def __reconcileNetworks(self, state, containers=[], jobs=None):
+        '''
+        List the networks once per command and create the missing `networks`
+        entries in parallel, before any of the containers is created.
+        '''
+        networks = self.getNetworks()
+        if state.networks is not None or all(x in state for x in containers):
+            return OK(state.networks)
+        if not networks:
+            state.networks = set()
+            return OK(state.networks)
+
+        def createMissing(existing):
+            missing = [x for x in networks if x not in existing]
+            created = runConcurrently(lambda net: self.docker.createNetwork({net: networks[net]}), missing,
+                                      self.getConcurrency(jobs))
+            for net, result in zip(missing, created):
+                if result.isFail():
+                    return result
+                existing.add(net)
+                logger.info("Network '%s' has been created." % net)
+            state.networks = existing
+            return OK(existing)
+        return self.docker.readNetworks().bind(createMissing)
+
+    def __createContainer(self, state, container):
+        return self.docker.create(container, self.getContainerConfig(container), basePath=self.getBasePath(),
+                                  networks=self.getNetworks(), existingNetworks=state.networks)
+
+    def __create(self, state, containers=[], jobs=None):
+        def createContainer(container):
             if container not in state:
-                op = docker.create(container, self.getContainerConfig(container), basePath=self.getBasePath(), networks=self.getNetworks()) \
+                return self.__createContainer(state, container) \
+                    .then(defer(state.recordCreated, container=container)) \
                     .then(dinfo("'%s' has been created." % container))
-                ops.append(op)
             else:
                 logger.warn("'%s' already exists." % container)
-        return Try.sequence(ops)
-
-    def __start(self, state, containers=[]):
-        ops = []
-        for container in containers:
-            if container not in state:
-                op = docker.create(container, self.getContainerConfig(container), basePath=self.getBasePath(),  networks=self.getNetworks()) \
-                    .then(defer(docker.start, container=container)) \
-                    .then(dinfo("'%s' has been created and started." % container))  \
-                    .then(defer(self.writePid, container=container))
-                ops.append(op)
-            else:
-                if not state[container].running:
-                    op = docker.start(container) \
-                        .then(dinfo("'%s' has been started." % container)) \
-                        .then(defer(self.writePid, container=container))
-                    ops.append(op)
+        return self.__reconcileNetworks(state, containers, jobs=jobs) \
+            .then(defer(self.runOrdered, containers, createContainer, jobs=jobs))
+
+    def __start(self, state, containers=[], jobs=None):
+        def createContainer(container):
+            return self.__createContainer(state, container)
+
+        def startBatch(batch):
+            results = OrderedDict()
+            missing = [x for x in batch if x not in state]
+            created = runConcurrently(createContainer, missing, self.getConcurrency(jobs))
+            for container, result in zip(missing, created):
+                if result.isFail():
+                    results[container] = result
                 else:
-                    logger.warn("'%s' is already running." % container)
-        return Try.sequence(ops)
+                    state.recordCreated(container)
 
-    def __stop(self, state, containers=[], time=docker.DOCKER_STOP_TIME):
-        ops = []
-        for container in containers:
-            if container not in state:
-                logger.warn("Container '%s' does not exist." % container)
-            else:
+            startable = []
+            for container in batch:
+                if container in results:
+                    continue
                 if state[container].running:
-                    op = docker.stop(container, time) \
-                        .then(dinfo("'%s' has been stopped." % container)) \
-                        .then(defer(self.clearPid, container=container))
+                    logger.warn("'%s' is already running." % container)
+                else:
+                    startable.append(container)
+
+            for container, result in self.docker.startMany(startable).items():
+                if container not in missing:
+                    message = "'%s' has been started." % container
                 else:
+                    message = "'%s' has been created and started." % container
+                results[container] = result \
+                    .then(defer(state.recordStarted, [container])) \
+                    .then(dinfo(message))
+            return results
+
+        def startContainers(gates):
+            if not gates:
+                return self.runOrdered(containers, startBatch, jobs=jobs, batched=True)
+            try:
+                return self.state.watch() \
+                    .then(defer(self.runOrdered, containers, startBatch, jobs=jobs, batched=True,
+                                gate=defer(self.__waitReady, gates=gates)))
+            finally:
+                self.state.close()
+        return self.__reconcileNetworks(state, containers, jobs=jobs) \
+            .then(defer(self.__readReadyGates, containers)) \
+            .bind(startContainers)
+
+    def __readReadyGates(self, containers):
+        ''' Readiness settings of the containers flagged `ready`, by name '''
+        gates = {}
+        for container in containers:
+            ready = docker.readReadyConfig(container, self.getContainerConfig(container) or {})
+            if ready.isFail():
+                return ready
+            if ready.getOK():
+                gates[container] = ready.getOK()
+        return OK(gates)
+
+    def __waitReady(self, container, gates={}):
+        ''' Block until a gated container reports healthy '''
+        if container not in gates:
+            return None
+        return self.__waitUp(container, gates[container]['timeout'], healthy=True) \
+            .then(dinfo("'%s' is ready." % container))
+
+    def __waitUp(self, container, timeout, healthy=False, starts=0):
+        '''
+        Block until a container is running after at least `starts` start
+        events, and passes its health check when `healthy`. The status follows
+        the docker events, so the wait ends on the event itself.
+        '''
+        seen = False
+
+        def check(status):
+            nonlocal seen
+            if self.state.readStarts().get(container, 0) < starts:
+                return None
+            if status is None or not status.running:
+                if seen or starts:
+                    return Fail(NotReadyError("'%s' stopped before it was up." % container))
+                return None
+            seen = True
+            if not healthy or status.health == 'healthy':
+                return OK(container)
+            if status.health == 'unhealthy':
+                return Fail(NotReadyError("'%s' is unhealthy." % container))
+            if not status.health:
+                return Fail(InvalidConfigError("'%s' has no health check to wait for: set a 'probe' under 'ready' "
+                                               "or add a HEALTHCHECK to its image." % container))
+            return None
+        result = self.state.waitUntil(container, check, timeout)
+        if result is None:
+            expected = "become healthy" if healthy else "come back up"
+            return Fail(NotReadyError("'%s' did not %s within %gs." % (container, expected, timeout)))
+        return result
+
+    def __stop(self, state, containers=[], time=docker.DOCKER_STOP_TIME, jobs=None):
+        def stopBatch(batch):
+            running = []
+            for container in batch:
+                if container not in state:
+                    logger.warn("Container '%s' does not exist." % container)
+                elif not state[container].running:
                     logger.warn("'%s' is not running." % container)
-        return Try.sequence(ops)
+                else:
+                    running.append(container)
+
+            results = OrderedDict()
+            for container, result in self.docker.stopMany(running, time=time).items():
+                results[container] = result \
+                    .then(defer(state.recordStopped, container=container)) \
+                    .then(dinfo("'%s' has been stopped." % container))
+            return results
+        return self.runOrdered(containers, stopBatch, jobs=jobs, reverse=True, batched=True)
 
-    def __remove(self, state, containers=[], force=False, time=docker.DOCKER_STOP_TIME):
+    def __remove(self, state, containers=[], force=False, time=docker.DOCKER_STOP_TIME, jobs=None):
         logger.debug("REMOVE %s" % containers)
-        ops = []
-        for container in containers:
-            if container in state:
+
+        def removeBatch(batch):
+            running = []
+            removable = []
+            for container in batch:
+                if container not in state:
+                    continue
                 if state[container].running:
                     if not force:
                         logger.error(
                             "'%s' is running and 'force' was not specified." % container)
                     else:
-                        op = docker.stop(container, time=time) \
-                            .then(defer(docker.remove, container=container)) \
-                            .then(dinfo("'%s' has been stopped and removed." % container)) \
-                            .then(defer(self.clearPid, container=container))
-                        ops.append(op)
+                        running.append(container)
                 else:
-                    ops.append(docker.remove(container).bind(
-                        dinfo("'%s' has been removed." % container)))
-        return Try.sequence(ops)
+                    removable.append(container)
+
+            results = OrderedDict()
+            for container, result in self.docker.stopMany(running, time=time).items():
+                if result.isFail():
+                    results[container] = result
+                else:
+                    state.recordStopped(container)
+                    removable.append(container)
+
+            for container, result in self.docker.removeMany([x for x in batch if x in removable]).items():
+                if result.isOK():
+                    state.recordRemoved(container)
+                if container in running:
+                    results[container] = result \
+                        .then(dinfo("'%s' has been stopped and removed." % container))
+                else:
+                    results[container] = result.bind(
+                        dinfo("'%s' has been removed." % container))
+            return results
+        return self.runOrdered(containers, removeBatch, jobs=jobs, reverse=True, batched=True)
 
     def __restart(self, state, containers=[], time=docker.DOCKER_STOP_TIME):
         ops = []
@@ -347,18 +809,75 @@ class Core(object):
                 logger.error("'%s' does not exist." % container)
             else:
                 if state[container].running:
-                    op = docker.stop(container, time=time) \
-                        .then(defer(docker.start, container=container)) \
-                        .then(dinfo("'%s' has been restarted." % container)) \
-                        .then(defer(self.writePid, container=container))
-                    ops.append(op)
+                    op = self.docker.stop(container, time=time) \
+                        .then(defer(state.recordStopped, container=container)) \
+                        .then(defer(self.docker.start, container=container)) \
+                        .then(defer(state.recordStarted, [container])) \
+                        .then(dinfo("'%s' has been restarted." % container))
                 else:
-                    ops.append(docker.start(container)
-                        .then(dinfo("'%s' has been started." % container))) \
-                        .then(defer(self.writePid, container=container))
+                    op = self.docker.start(container) \
+                        .then(defer(state.recordStarted, [container])) \
+                        .then(dinfo("'%s' has been started." % container))
+                ops.append(op)
 
         return Try.sequence(ops)
 
+    def __rollingRestart(self, state, containers=[], time=docker.DOCKER_STOP_TIME, batchSize=1, healthy=False):
+        '''
+        Restart `batchSize` containers at a time, moving to the next batch once
+        every container of the current one is running again, or healthy with
+        `healthy`. A batch that does not come back stops the rollout and leaves
+        the remaining containers untouched.
+        '''
+        existing = []
+        for container in containers:
+            if container not in state:
+                logger.error("'%s' does not exist." % container)
+            else:
+                existing.append(container)
+        batches = [existing[i:i + batchSize] for i in range(0, len(existing), batchSize)]
+        try:
+            return self.__readReadyGates(existing) \
+                .bind(lambda gates: self.state.watch().map(lambda store: gates)) \
+                .bind(self.__restartBatches, state, batches, time=time, healthy=healthy)
+        finally:
+            self.state.close()
+
+    def __restartBatches(self, gates, state, batches, time=docker.DOCKER_STOP_TIME, healthy=False):
+        restarted = []
+        for number, batch in enumerate(batches, 1):
+            synced = self.state.sync()
+            if synced.isFail():
+                return synced
+            starts = self.state.readStarts()
+            running = [x for x in batch if state[x].running]
+            failures = []
+            for container, result in self.docker.stopMany(running, time=time).items():
+                if result.isFail():
+                    failures.append(result)
+                else:
+                    state.recordStopped(container)
+            if failures:
+                return failures[0]
+            for container, result in self.docker.startMany(batch).items():
+                if result.isFail():
+                    failures.append(result)
+                else:
+                    state.recordStarted([container])
+            if failures:
+                return failures[0]
+
+            def waitUp(container):
+                timeout = gates[container]['timeout'] if container in gates else docker.DOCKWRKR_READY_TIMEOUT
+                return self.__waitUp(container, timeout, healthy=healthy, starts=starts.get(container, 0) + 1)
+            waits = runConcurrently(waitUp, batch, len(batch))
+            for result in waits:
+                if result.isFail():
+                    return result
+            restarted.extend(batch)
+            logger.info("Batch %d/%d has been restarted: %s." % (number, len(batches), ', '.join(batch)))
+        return OK(restarted)
+
     def getPidsConf(self):
         return self.config.get('pids', {})
 
@@ -369,25 +888,31 @@ class Core(object):
     def arePidsEnabled(self):
         return self.getPidsConf().get('enabled', False)
 
-    def writePid(self, container):
-        if not self.arePidsEnabled():
-            return OK(None)
-
-        dir = self.getPidsDir()
-        pidfile = os.path.join(dir, "%s.pid" % (container))
+    def getPidFiles(self):
+        return PidFiles(self.getPidsDir())
 
-        return Shell.makeDirectory(dir) \
-            .then(defer(docker.readContainerPid, container=container)) \
-            .bind(defer(Try.attempt, writeToFile, filename=pidfile))
-
-    def clearPid(self, container):
-        if not self.arePidsEnabled():
-            return OK(None)
-
-        dir = self.getPidsDir()
-        pidfile = os.path.join(dir, "%s.pid" % (container))
-
-        if os.path.isfile(pidfile):
-            return Try.attempt(os.remove, pidfile)
-        else:
+    def updatePids(self, state):
+        '''
+        Write the pidfiles of the containers a command started and remove those
+        of the containers it stopped. Pids the command does not know yet are
+        read in one snapshot.
+        '''
+        if not self.arePidsEnabled() or not (state.started or state.stopped):
             return OK(None)
+        unknown = [x for x in state.started if x in state and not state[x].pid]
+        pids = self.getPidFiles()
+
+        def writePids():
+            pids.removeMany(state.stopped)
+            pids.writeMany(dict((x, state[x].pid) for x in state.started
+                                if x in state and state[x].running and state[x].pid))
+        return (self.docker.readStateSnapshot(unknown) if unknown else OK({})) \
+            .map(lambda statuses: state.recordStarted(unknown, statuses)) \
+            .then(defer(Try.attempt, writePids))
+
+    def syncPids(self, dryRun=False):
+        ''' Reconcile the pids directory with the running managed containers '''
+        if not self.arePidsEnabled():
+            return Fail(InvalidConfigError("Pidfiles are not enabled. Set 'pids.enabled' in the configuration."))
+        return self.state.snapshot() \
+            .bind(lambda states: Try.attempt(self.getPidFiles().sync, states, dryRun=dryRun))
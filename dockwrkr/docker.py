@@ -1,13 +1,18 @@
 import logging
 import os
-import arrow
+import re
+import json
+import importlib
+import calendar
 import subprocess
-import semver
 
+from collections import OrderedDict
 from dockwrkr.monads import *
 from dockwrkr.shell import Shell
 from dockwrkr.utils import (ensureList, expandLocalPath, safeQuote)
-from dockwrkr.exceptions import ShellCommandError, DockerError, InvalidConfigError
+from dockwrkr.cache import DaemonCache
+from dockwrkr.stats import parseStatsRecord
+from dockwrkr.exceptions import ShellCommandError, DockerError, InvalidConfigError, UserInterruptError
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +20,18 @@ DOCKWRKR_LABEL_DOMAIN = 'ca.turbulent.dockwrkr'
 DOCKWRKR_LABEL_DOMAIN_NETWORK = 'ca.turbulent.dockwrkr-network'
 
 DOCKER_STOP_TIME = 10
-DOCKER_CLIENT = "docker"
+DOCKER_CLIENT = os.environ.get("DOCKWRKR_DOCKER_CLIENT", "docker")
+DOCKER_DEFAULT_HOST = "unix:///var/run/docker.sock"
+DOCKER_DEFAULT_REGISTRY = "https://index.docker.io/v1/"
+FLOATING_TAGS = frozenset(['latest'])
+
+DOCKER_BACKENDS = {
+    'cli': 'dockwrkr.docker',
+    'api': 'dockwrkr.engine',
+}
+
+ARG_POINTER_SIZE = 8
+ARG_MAX_HEADROOM = 4096
 
 DOCKER_LIST_OPTIONS = [
     'add-host',
@@ -65,13 +81,18 @@ DOCKER_SINGLE_OPTIONS = [
     'cpuset-cpus',
     'cpuset-mems',
     'entrypoint',
+    'health-cmd',
+    'health-interval',
+    'health-retries',
+    'health-start-period',
+    'health-timeout',
     'hostname',
     'ip',
     'ipc',
     'kernel-memory',
     'log-driver',
     'mac-address',
-    'memory-reservation'
+    'memory-reservation',
     'memory-swap',
     'memory-swapiness',
     'memory',
@@ -119,6 +140,24 @@ DOCKER_NETWORK_BOOL_OPTIONS = [
     "ipv6",
 ]
 
+
+def loadBackend(name=None):
+    '''
+    Return the module implementing the docker operations. The backend is
+    taken from the DOCKWRKR_BACKEND environment variable, then from `name`
+    (the `backend` configuration key). The docker client ('cli') is used by
+    default and whenever the engine API socket is not reachable.
+    '''
+    name = os.environ.get('DOCKWRKR_BACKEND') or name or 'cli'
+    if name not in DOCKER_BACKENDS:
+        raise InvalidConfigError("Unknown docker backend '%s'. Use one of: %s." % (name, ', '.join(sorted(DOCKER_BACKENDS))))
+    backend = importlib.import_module(DOCKER_BACKENDS[name])
+    if hasattr(backend, 'isAvailable') and not backend.isAvailable():
+        logger.debug("Docker backend '%s' is not available, using the docker client." % name)
+        return importlib.import_module(DOCKER_BACKENDS['cli'])
+    return backend
+
+
 def dockerReadCommand(cmd, params="", shell=False, stream=False, cwd=None):
     return Shell.command("%s %s %s" % (DOCKER_CLIENT, cmd, params), shell=False) \
       .catch(onDockerError)
@@ -128,6 +167,81 @@ def dockerCallCommand(cmd, params=""):
     return Shell.call("%s %s %s" % (DOCKER_CLIENT, cmd, params))
 
 
+def dockerBatchCommand(cmd, containers, params=[]):
+    '''
+    Run a docker command that accepts many container names with as few
+    invocations as the argument size limit allows. Returns an OrderedDict
+    mapping every container to the Try of its own outcome.
+    '''
+    results = OrderedDict()
+    base = [DOCKER_CLIENT] + cmd.split() + list(params)
+    for chunk in chunkArguments(containers, base):
+        result = Shell.procCommand(base + chunk)
+        results.update(parseBatchResult(chunk, result))
+    return results
+
+
+def argumentLimit():
+    ''' Bytes available for command line arguments once the environment is accounted for '''
+    try:
+        limit = os.sysconf('SC_ARG_MAX')
+    except (AttributeError, ValueError, OSError):
+        limit = 131072
+    if limit <= 0:
+        limit = 131072
+    environment = sum(len(k) + len(v) + 2 + ARG_POINTER_SIZE for k, v in os.environ.items())
+    return max(4096, limit - environment - ARG_MAX_HEADROOM)
+
+
+def chunkArguments(args, base=[], limit=None):
+    ''' Split arguments in chunks that fit, along with the base command, within the argument size limit '''
+    if limit is None:
+        limit = argumentLimit()
+    fixed = sum(len(x.encode()) + 1 + ARG_POINTER_SIZE for x in base)
+    chunks = []
+    chunk = []
+    size = fixed
+    for arg in args:
+        cost = len(arg.encode()) + 1 + ARG_POINTER_SIZE
+        if chunk and size + cost > limit:
+            chunks.append(chunk)
+            chunk = []
+            size = fixed
+        chunk.append(arg)
+        size += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def parseBatchResult(containers, result):
+    ''' Map the outcome of a multi-container docker command back to each container '''
+    if result.isOK():
+        return OrderedDict((c, OK({'code': 0, 'stdout': c, 'stderr': ''})) for c in containers)
+
+    err = result.getError()
+    if not isinstance(err, ShellCommandError) or isinstance(err, UserInterruptError):
+        return OrderedDict((c, Fail(err)) for c in containers)
+
+    done = set(line.strip() for line in (err.stdout or '').splitlines())
+    errors = (err.stderr or '').strip().splitlines()
+    results = OrderedDict()
+    for container in containers:
+        if container in done:
+            results[container] = OK({'code': 0, 'stdout': container, 'stderr': ''})
+            continue
+        pattern = re.compile(r'(?<![\w.-])%s(?![\w.-])' % re.escape(container))
+        lines = [line for line in errors if pattern.search(line)]
+        message = '\n'.join(lines) if lines else (err.stderr or '').strip()
+        results[container] = Fail(DockerError(
+            message=message,
+            code=err.code,
+            stdout=err.stdout,
+            stderr=message,
+            cmd=err.cmd))
+    return results
+
+
 def onDockerError(err):
     return Fail(DockerError(
         message=err.stderr,
@@ -147,12 +261,62 @@ def readManagedContainers():
 
 
 def filterExistingContainers(containers):
+    wanted = set(containers)
     return readManagedContainers() \
-        .map(lambda l: [x for x in l if x in containers])
+        .map(lambda l: [x for x in l if x in wanted])
 
 def readServerVersion():
+    return readCapabilities().map(lambda c: c['version'])
+
+
+def readCapabilities():
+    '''
+    Version of the daemon and the version-gated features it supports. The
+    probe is cached per DOCKER_HOST, so most commands skip `docker version`.
+    '''
+    cache = DaemonCache()
+    host = os.environ.get('DOCKER_HOST') or DOCKER_DEFAULT_HOST
+    cached = cache.read(host)
+    if cached:
+        return OK(cached)
+
+    def store(capabilities):
+        cache.write(host, capabilities)
+        return OK(capabilities)
+    return probeCapabilities().bind(store)
+
+
+def probeCapabilities():
+    def parseVersion(version):
+        import semver
+        try:
+            email = semver.match(version, "<17.0.6")
+        except ValueError:
+            email = False
+        return {'version': version, 'loginEmail': email}
     return dockerReadCommand("version", "--format '{{.Server.Version}}'") \
-        .bind(lambda c: OK(c.get('stdout')))
+        .map(lambda c: parseVersion(c.get('stdout')))
+
+
+def readStoredAuths():
+    ''' Registry entries saved by `docker login` in the client configuration '''
+    path = os.path.join(os.environ.get('DOCKER_CONFIG', os.path.expanduser('~/.docker')), 'config.json')
+    try:
+        with open(path) as fh:
+            return json.load(fh).get('auths') or {}
+    except (IOError, ValueError):
+        return {}
+
+
+def hasStoredCredentials(registry):
+    ''' Whether `docker login` already saved credentials, inline or in a credentials store, for a registry '''
+    return (registry or DOCKER_DEFAULT_REGISTRY) in readStoredAuths()
+
+
+def isAuthError(err):
+    message = "%s %s" % (getattr(err, 'stderr', None) or '', getattr(err, 'message', None) or err)
+    return bool(AUTH_ERROR_PATTERN.search(message))
+
 
 def readContainerExists(container):
     filter = "-q -a --filter \"label=%s.name=%s\" --format '{{.Label \"%s.name\"}}'" % (
@@ -172,6 +336,28 @@ def readNetworkExists(network):
         return OK(network)
 
 
+def readNetworks():
+    ''' Names of every network known to the daemon, in a single call '''
+    return dockerReadCommand("network ls", "--format '{{.Name}}'") \
+        .bind(parseContainerList) \
+        .map(set)
+
+
+def ensureNetwork(net, networks, existing=None):
+    '''
+    Create the configured network a container joins when it is missing. With
+    `existing`, the set of networks reconciled for the command, the daemon is
+    not queried again.
+    '''
+    if not networks or net not in networks:
+        return OK(None)
+    if existing is None:
+        return readNetworkExists({net: networks[net]}).bind(createNetwork).catch(lambda e: OK(None))
+    if net in existing:
+        return OK(None)
+    return createNetwork({net: networks[net]}).then(defer(existing.add, net))
+
+
 def readContainerRunning(container):
     inspect = "--format=\"{{.State.Running}}\" %s 2> /dev/null" % (
         safeQuote(container))
@@ -191,28 +377,155 @@ def readContainerGhosted(container):
         .bind(ghosted)
 
 
+STATUS_INSPECT_FORMAT = "{{.Name}}|{{.Id}}|{{.Config.Image}}|{{.NetworkSettings.IPAddress}}|{{range $p, $conf := .NetworkSettings.Ports}}{{if $conf}}{{$p}}->{{(index $conf 0).HostPort}}{{end}} {{end}}|{{.State.Pid}}|{{.State.StartedAt}}|{{.State.Running}}|{{.State.ExitCode}}|{{if .State.Health}}{{.State.Health.Status}}{{end}}|{{.State.Error}}"  # noqa
+
+
 def readContainersStatus(containers=[]):
 
     if not containers:
         return OK({})
 
-    inspect = "-f '{{.Name}}|{{.Id}}|{{.Config.Image}}|{{.NetworkSettings.IPAddress}}|{{range $p, $conf := .NetworkSettings.Ports}}{{if $conf}}{{$p}}->{{(index $conf 0).HostPort}}{{end}} {{end}}|{{.State.Pid}}|{{.State.StartedAt}}|{{.State.Running}}|{{.State.ExitCode}}|{{.State.Error}}' %s" % (' '.join(containers))  # noqa
+    inspect = "-f '%s' %s" % (STATUS_INSPECT_FORMAT, ' '.join(containers))
     return dockerReadCommand("inspect", inspect) \
         .bind(parseContainerStatus)
 
 
+MANAGED_INSPECT_FORMAT = '{{index .Config.Labels "%s.managed"}}|%s' % (DOCKWRKR_LABEL_DOMAIN, STATUS_INSPECT_FORMAT)
+AUTH_ERROR_PATTERN = re.compile(r'unauthorized|authentication required|access denied|denied: |no basic auth credentials', re.I)
+MISSING_OBJECT_PATTERN = re.compile(r'No such (object|container|image): *(\S+)')
+
+
+def readStateSnapshot(containers=None):
+    '''
+    Statuses of the managed containers among `containers`, keyed by name, from
+    a single `docker container inspect`. Names that do not exist or that dockwrkr does
+    not manage are left out. Without `containers`, every managed container is
+    listed first.
+    '''
+    if containers is None:
+        return readManagedContainers().bind(readStateSnapshot)
+    statuses = {}
+    base = [DOCKER_CLIENT, 'container', 'inspect', '-f', MANAGED_INSPECT_FORMAT]
+    for chunk in chunkArguments(containers, base):
+        result = Shell.procCommand(base + chunk)
+        if result.isOK():
+            output = result.getOK()['stdout']
+        else:
+            err = result.getError()
+            if not isinstance(err, ShellCommandError) or isinstance(err, UserInterruptError):
+                return result
+            if not isMissingObjectsError(err.stderr):
+                return onDockerError(err)
+            output = err.stdout
+        statuses.update(parseManagedStatus(output))
+    return OK(statuses)
+
+
+def isMissingObjectsError(stderr):
+    ''' Whether a failed inspect only complained about names that do not exist '''
+    lines = [line for line in (stderr or '').splitlines() if line.strip()]
+    return all(MISSING_OBJECT_PATTERN.search(line) for line in lines)
+
+
+def parseManagedStatus(output):
+    statuses = {}
+    for line in output.splitlines():
+        (managed, sep, line) = line.partition('|')
+        if managed == '1':
+            status = ContainerStatus.fromStatusLine(line)
+            statuses[status.name] = status
+    return statuses
+
+
+def iterContainersStatus(containers=[]):
+    '''
+    Generator over the statuses of the managed containers among `containers`,
+    each parsed as soon as `docker inspect` prints its line.
+    '''
+    import tempfile
+    base = [DOCKER_CLIENT, 'container', 'inspect', '-f', MANAGED_INSPECT_FORMAT]
+    for chunk in chunkArguments(containers, base):
+        logger.debug("COMMAND: %s", subprocess.list2cmdline(base + chunk))
+        with tempfile.TemporaryFile(mode='w+') as stderr:
+            proc = subprocess.Popen(base + chunk, stdout=subprocess.PIPE, stderr=stderr, universal_newlines=True)
+            try:
+                for line in proc.stdout:
+                    (managed, sep, line) = line.rstrip('\n').partition('|')
+                    if managed == '1':
+                        yield ContainerStatus.fromStatusLine(line)
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                proc.stdout.close()
+                proc.wait()
+            stderr.seek(0)
+            errors = stderr.read()
+            if proc.returncode and not isMissingObjectsError(errors):
+                raise DockerError(message=errors.strip(), code=proc.returncode, stderr=errors,
+                                  cmd=subprocess.list2cmdline(base + chunk))
+
+
 def readContainerPid(container):
     inspect = "--format '{{.State.Pid}}' %s" % (safeQuote(container))
     return dockerReadCommand("inspect", inspect) \
         .bind(lambda r: OK(r['stdout'].strip()))
 
 
-def create(container, config, basePath=None, networks=None):
-    params = readCreateParameters(
-        container, config, basePath=basePath, networks=networks)
-    if params.isFail():
-        return params
-    return dockerCallCommand("create", params.getOK())
+def readEvents(since=None):
+    ''' Open the stream of events of managed containers, replayed from `since` (epoch seconds) when given '''
+    cmd = [DOCKER_CLIENT, 'events', '--format', '{{json .}}',
+           '--filter', 'type=container', '--filter', 'label=%s.managed=1' % DOCKWRKR_LABEL_DOMAIN]
+    if since is not None:
+        cmd += ['--since', str(int(since))]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError as err:
+        return Fail(DockerError(message="Could not read docker events: %s" % err, cmd=' '.join(cmd)))
+
+    def close():
+        proc.terminate()
+        proc.wait()
+    return OK(EventStream(proc.stdout, close))
+
+
+class EventStream(object):
+    '''
+    Iterator over the decoded messages of a `docker events` stream. Iterating
+    blocks until the next event; close() ends the stream from any thread.
+    '''
+
+    def __init__(self, lines, closer):
+        self.lines = lines
+        self.closer = closer
+        self.closed = False
+
+    def __iter__(self):
+        for line in self.lines:
+            if self.closed:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.debug("Ignoring malformed docker event: %r" % line)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.closer()
+
+
+def create(container, config, basePath=None, networks=None, existingNetworks=None):
+    spec = compileSpec(container, config, basePath=basePath)
+    if spec.isFail():
+        return spec
+    spec = spec.getOK()
+    joined = ensureNetwork(spec.net, networks, existingNetworks)
+    if joined.isFail():
+        return joined
+    return Shell.call([DOCKER_CLIENT, "create"] + list(spec.argv), shell=False)
 
 
 def createNetwork(network):
@@ -238,17 +551,57 @@ def remove(container, force=False):
     return dockerReadCommand("rm", params)
 
 
-def pull(image):
-    return dockerCallCommand("pull", image) \
-        .catchError(ShellCommandError, defer(_pullLoginChain, image=image))
+def startMany(containers):
+    return dockerBatchCommand("start", containers)
+
+
+def stopMany(containers, time=10):
+    return dockerBatchCommand("stop", containers, ["-t", str(time)])
 
 
-def _pullLoginChain(err, image):
-    parts = unpackImageString(image)
-    if parts.get('registry'):
-        return login(parts.get('registry')).then(defer(pull, image=image))
+def removeMany(containers, force=False):
+    return dockerBatchCommand("rm", containers, ["-f"] if force else [])
+
+
+def pull(image, quiet=False):
+    ''' Pull an image. A `quiet` pull captures the client output instead of drawing progress bars '''
+    if quiet:
+        op = Shell.procCommand([DOCKER_CLIENT, "pull", image]).catch(onDockerError)
     else:
-        return Fail(err)
+        op = dockerCallCommand("pull", image)
+    return op
+
+
+def readLocalImages(images):
+    ''' The images already in the local store, checked with a single inspect '''
+    if not images:
+        return OK(set())
+    result = Shell.procCommand([DOCKER_CLIENT, "image", "inspect", "-f", "{{.Id}}"] + list(images))
+    if result.isOK():
+        return OK(set(images))
+    err = result.getError()
+    if not err.stderr or not isMissingObjectsError(err.stderr):
+        return onDockerError(err)
+    missing = set(m.group(2) for m in MISSING_OBJECT_PATTERN.finditer(err.stderr))
+    return OK(set(images) - missing)
+
+
+def isFloatingImage(image):
+    ''' Whether an image reference can move on the registry: no tag or a floating tag, and no digest '''
+    if '@' in image:
+        return False
+    (name, sep, tag) = image.rpartition(':')
+    return not sep or '/' in tag or tag in FLOATING_TAGS
+
+
+def readImageSizes(images):
+    ''' Size in bytes of local images, with one inspect for all of them '''
+    if not images:
+        return OK({})
+    return Shell.procCommand([DOCKER_CLIENT, "image", "inspect", "-f", "{{.Size}}"] + list(images)) \
+        .catch(onDockerError) \
+        .bind(parseContainerList) \
+        .map(lambda sizes: dict(zip(images, [int(x) for x in sizes])))
 
 
 def unpackImageString(imageStr):
@@ -263,13 +616,16 @@ def unpackImageString(imageStr):
     return unpack
 
 
-def run(container, containerArgs, config, basePath=None, networks=None):
-    params = readCreateParameters(
-        container, config, basePath=basePath, networks=networks, asList=True)
-    if params.isFail():
-        return params
+def run(container, containerArgs, config, basePath=None, networks=None, existingNetworks=None):
+    spec = compileSpec(container, config, basePath=basePath)
+    if spec.isFail():
+        return spec
+    spec = spec.getOK()
+    joined = ensureNetwork(spec.net, networks, existingNetworks)
+    if joined.isFail():
+        return joined
     try:
-        cmd = [DOCKER_CLIENT, "run", "--rm", "--interactive", "--tty"] + params.getOK() + containerArgs
+        cmd = [DOCKER_CLIENT, "run", "--rm", "--interactive", "--tty"] + list(spec.argv) + containerArgs
         logger.debug("EXECVP - %s" % subprocess.list2cmdline(cmd))
         os.execvp(DOCKER_CLIENT, cmd)
     except Exception as ex:
@@ -307,21 +663,39 @@ def stats(containers=[]):
     return dockerCallCommand("stats", ' '.join(parts))
 
 
+def readStats(containers):
+    ''' One `--no-stream` sample of each running container, in a single call '''
+    if not containers:
+        return OK({})
+    result = Shell.procCommand([DOCKER_CLIENT, "stats", "--no-stream", "--format", "{{json .}}"] + list(containers))
+    if result.isFail() and not isMissingObjectsError(result.getError().stderr):
+        return onDockerError(result.getError())
+    output = result.getOK()['stdout'] if result.isOK() else result.getError().stdout
+    return Try.attempt(parseStatsOutput, output or '')
+
+
+def parseStatsOutput(output):
+    samples = OrderedDict()
+    for line in output.splitlines():
+        if line.strip():
+            record = json.loads(line)
+            samples[record.get('Name')] = parseStatsRecord(record)
+    return samples
+
+
 def login(registry, username=None, password=None, email=None):
     opts = []
 
-    vers = readServerVersion()
-    if vers.isFail():
-        return vers
-    else:
-        vers = vers.getOK()
-
     if username:
         opts.append("-u %s" % username)
     if password:
         opts.append("-p %s" % password)
-    if email and semver.match(vers, "<17.0.6"):
-        opts.append("-e %s" % email)
+    if email:
+        capabilities = readCapabilities()
+        if capabilities.isFail():
+            return capabilities
+        if capabilities.getOK()['loginEmail']:
+            opts.append("-e %s" % email)
 
     opts.append(registry)
     return dockerCallCommand("login", ' '.join(opts))
@@ -388,108 +762,215 @@ def readCreateNetworkParameters(network):
 
 
 def readCreateParameters(container, config, basePath=None, networks=None, asList=False):
+    '''
+    Arguments of `docker create` for a container: the argv list with
+    `asList`, otherwise a shell-quoted command line.
+    '''
+    spec = compileSpec(container, config, basePath=basePath)
+    if spec.isFail() or asList:
+        return spec.map(lambda x: list(x.argv))
+    return spec.map(lambda x: x.getCommandLine())
+
+
+# ---- Container specs
+
+# Keys only used by dockwrkr, never passed to docker.
+DOCKWRKR_OPTIONS = frozenset(['autostart', 'ready'])
+
+# Seconds a container flagged `ready` is given to report healthy.
+DOCKWRKR_READY_TIMEOUT = 60
+READY_KEYS = frozenset(['probe', 'interval', 'timeout'])
+
+OPTION_KINDS = {}
+OPTION_KINDS.update((key, 'list') for key in DOCKER_LIST_OPTIONS)
+OPTION_KINDS.update((key, 'single') for key in DOCKER_SINGLE_OPTIONS)
+OPTION_KINDS.update((key, 'bool') for key in DOCKER_BOOL_OPTIONS)
+OPTION_KINDS['volume'] = 'volume'
+
+MAP_SEPARATORS = dict([(key, ':') for key in DOCKER_MAP_OPTIONS] + [(key, '=') for key in DOCKER_MAPEQUAL_OPTIONS])
+
+TRUE_VALUES = frozenset(['true', 'yes', '1'])
+FALSE_VALUES = frozenset(['false', 'no', '0'])
+
+_specs = {}
+
+
+class ContainerSpec(object):
+    '''
+    Immutable compiled form of a container config. `options` lists the
+    (key, value) pairs of the docker options in argv order and `argv` holds
+    the complete `docker create` arguments, image and command included.
+    '''
+
+    __slots__ = ('name', 'image', 'options', 'extraFlags', 'command', 'net', 'argv', 'digest')
+
+    def __init__(self, name, image, options, extraFlags, command, digest):
+        labels = ("--label", "%s.name=%s" % (DOCKWRKR_LABEL_DOMAIN, name),
+                  "--label", "%s.managed=1" % DOCKWRKR_LABEL_DOMAIN)
+        fields = {
+            'name': name,
+            'image': image,
+            'options': tuple(options),
+            'extraFlags': tuple(extraFlags),
+            'command': tuple(command),
+            'net': dict(options).get('net'),
+            'digest': digest,
+        }
+        fields['argv'] = tuple("--%s=%s" % option for option in fields['options']) \
+            + fields['extraFlags'] + labels + (image,) + fields['command']
+        for key, value in fields.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("ContainerSpec is immutable")
+
+    def __eq__(self, other):
+        return isinstance(other, ContainerSpec) and self.argv == other.argv
+
+    def __hash__(self):
+        return hash(self.argv)
 
-    cconf = config.copy()
+    def __repr__(self):
+        return "ContainerSpec(%r)" % (self.argv,)
+
+    def getCommandLine(self):
+        return ' '.join(safeQuote(x) for x in self.argv)
+
+
+def readReadyConfig(container, config):
+    '''
+    Readiness gate of a container: None when it is not gated, otherwise a dict
+    with the `probe` command run as its health check (None to rely on the
+    HEALTHCHECK of the image), the probe `interval` and the `timeout` in
+    seconds. `ready: true` gates on the image health check alone.
+    '''
+    ready = config.get('ready')
+    if ready is None or ready is False:
+        return OK(None)
+    if ready is True:
+        ready = {}
+    if not isinstance(ready, dict) or set(ready) - READY_KEYS:
+        return Fail(InvalidConfigError("[%s] Malformed option 'ready': Should be true or a mapping of %s."
+                                       % (container, ', '.join(sorted(READY_KEYS)))))
+    try:
+        timeout = float(ready.get('timeout', DOCKWRKR_READY_TIMEOUT))
+        interval = float(ready['interval']) if ready.get('interval') is not None else None
+    except (TypeError, ValueError):
+        return Fail(InvalidConfigError("[%s] Invalid value for option 'ready': timeout and interval are seconds." % container))
+    if timeout <= 0 or (interval is not None and interval <= 0):
+        return Fail(InvalidConfigError("[%s] Invalid value for option 'ready': timeout and interval must be positive." % container))
+    probe = ready.get('probe')
+    return OK({'probe': str(probe) if probe else None, 'interval': interval, 'timeout': timeout})
 
-    # Autostart is only used by dockwrkr, we do not want to pass it to docker
-    if 'autostart' in cconf:
-        del cconf['autostart']
 
-    if 'net' in cconf:
-        if networks and cconf['net'] in networks:
-            readNetworkExists({cconf['net']: networks[cconf['net']]}) \
-                .bind(createNetwork)
+def readConfigDigest(config):
+    import hashlib
+    data = json.dumps(config, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(data.encode()).hexdigest()
 
-    cconf['name'] = container
 
-    if 'image' not in cconf:
-        return Fail(InvalidConfigError("[%s] Container has no 'image' defined." % (container)))
-    image = cconf['image']
-    del cconf['image']
+def compileSpec(container, config, basePath=None):
+    ''' Compile a container config into a ContainerSpec, memoized per config digest '''
+    try:
+        digest = readConfigDigest(config)
+    except (TypeError, ValueError) as err:
+        return Fail(InvalidConfigError("[%s] Invalid configuration: %s" % (container, err)))
+    key = (container, basePath, digest)
+    spec = _specs.get(key)
+    if spec is None:
+        result = buildSpec(container, config, basePath, digest)
+        if result.isFail():
+            return result
+        spec = _specs[key] = result.getOK()
+    return OK(spec)
 
-    command = []
-    if 'command' in cconf:
-        command = ensureList(cconf['command'])
-        del cconf['command']
 
-    extra_flags = []
-    if 'extra-flags' in cconf:
-        extra_flags = ensureList(cconf['extra-flags'])
-        del cconf['extra-flags']
+def clearSpecCache():
+    _specs.clear()
 
-    cmd = []
-    cmd_opt = []
-    cmd_list = []
-    cmd_map = []
 
-    for confkey, confval in cconf.items():
-        if confkey in DOCKER_MAP_OPTIONS or confkey in DOCKER_MAPEQUAL_OPTIONS:
-            if isinstance(confval, dict):
-                for ck, cv in confval.items():
-                    if confkey in DOCKER_MAPEQUAL_OPTIONS:
-                        cmd_map.append("--%s=%s=%s" %
-                                       (confkey, ck, safeQuote(cv)))
-                    else:
-                        cmd_map.append("--%s=%s:%s" %
-                                       (confkey, ck, safeQuote(cv)))
-                continue
-        if confkey == "volume":
-            for ck in ensureList(confval):
-                if ck.find(':'):
-                    (path, sep, path_map) = ck.partition(':')
-                    path = expandLocalPath(path, basePath=basePath)
-                    cmd_map.append("--%s=%s:%s" %
-                                   (confkey, safeQuote(path), safeQuote(path_map)))
+def buildSpec(container, config, basePath, digest):
+    if 'image' not in config:
+        return Fail(InvalidConfigError("[%s] Container has no 'image' defined." % (container)))
+
+    (single, lists, maps) = ([], [], [])
+    for confkey, confval in config.items():
+        if confkey in DOCKWRKR_OPTIONS or confkey in ('image', 'command', 'extra-flags', 'name'):
             continue
-        if confkey in DOCKER_SINGLE_OPTIONS:
-            cmd_opt.append("--%s=%s" % (confkey, safeQuote(confval)))
-        elif confkey in DOCKER_BOOL_OPTIONS:
-            if confval is not None and (confval is True or confval.lower() in ["true", "yes"] or confval == 1):
-                cmd_opt.append("--%s=%s" % (confkey, "true"))
-            elif confval is not None and (confval is False or confval.lower() in ["false", "no"] or confval == 0):
-                cmd_opt.append("--%s=%s" % (confkey, "false"))
+        kind = OPTION_KINDS.get(confkey)
+        if confkey in MAP_SEPARATORS and isinstance(confval, dict):
+            sep = MAP_SEPARATORS[confkey]
+            maps.extend((confkey, "%s%s%s" % (ck, sep, cv)) for ck, cv in confval.items())
+        elif kind == 'volume':
+            for ck in ensureList(confval):
+                (path, sep, path_map) = str(ck).partition(':')
+                path = expandLocalPath(path, basePath=basePath)
+                maps.append((confkey, "%s:%s" % (path, path_map) if sep else path))
+        elif kind == 'single':
+            single.append((confkey, str(confval)))
+        elif kind == 'bool':
+            value = str(confval).lower() if confval is not None else None
+            if value in TRUE_VALUES:
+                single.append((confkey, 'true'))
+            elif value in FALSE_VALUES:
+                single.append((confkey, 'false'))
             else:
                 return Fail(InvalidConfigError("[%s] Invalid value for option '%s' : Must be true or false." % (container, confkey)))
-        elif confkey in DOCKER_LIST_OPTIONS:
-            if not isinstance(confval, (str, list, tuple)):
+        elif kind == 'list':
+            if not isinstance(confval, (str, int, float, list, tuple)):
                 return Fail(InvalidConfigError("[%s] Malformed option '%s': Should be string, number or list." % (container, confkey)))
-            confval = ensureList(confval)
-            for i, lv in enumerate(confval):
-                cmd_list.append("--%s=%s" % (confkey, safeQuote(lv)))
+            lists.extend((confkey, str(lv)) for lv in ensureList(confval))
         else:
             return Fail(InvalidConfigError("[%s] Unknown option '%s'." % (container, confkey)))
+    ready = readReadyConfig(container, config)
+    if ready.isFail():
+        return ready
+    ready = ready.getOK()
+    if ready and ready['probe']:
+        single.append(('health-cmd', ready['probe']))
+    if ready and ready['interval']:
+        single.append(('health-interval', "%gs" % ready['interval']))
+    single.append(('name', container))
 
-    for part in cmd_opt:
-        cmd.append(part)
-    for part in cmd_list:
-        cmd.append(part)
-    for part in cmd_map:
-        cmd.append(part)
-    for extra in extra_flags:
-        cmd.append(extra)
+    try:
+        command = config.get('command')
+        command = splitArguments(command) if isinstance(command, str) else [str(x) for x in ensureList(command)]
+        extraFlags = [x for part in ensureList(config.get('extra-flags')) for x in splitArguments(part)]
+    except ValueError as err:
+        return Fail(InvalidConfigError("[%s] Malformed command or extra-flags: %s" % (container, err)))
+    return OK(ContainerSpec(container, str(config['image']), single + lists + maps, extraFlags, command, digest))
 
-    cmd.append("--label")
-    cmd.append("%s.name=\"%s\"" % (DOCKWRKR_LABEL_DOMAIN, container))
-    cmd.append("--label")
-    cmd.append("%s.managed=1" % DOCKWRKR_LABEL_DOMAIN)
-    cmd.append(image)
 
-    for part in command:
-        cmd.append(part)
+SHELL_SPECIAL_PATTERN = re.compile(r'[\'"\\#]')
 
-    if asList:
-        return OK(cmd)
 
-    cmdline = ""
-    for i, part in enumerate(cmd):
-        if i > 0:
-            cmdline += " "
-        cmdline += part
+def splitArguments(value):
+    if not isinstance(value, str):
+        return [str(value)]
+    if not SHELL_SPECIAL_PATTERN.search(value):
+        return value.split()
+    import shlex
+    return shlex.split(value)
 
-    return OK(cmdline)
 
 # ---- Parse command output
 
+RFC3339_PATTERN = re.compile(r'^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.\d+)?(?:Z|([+-])(\d\d):(\d\d))$')
+
+
+def parseTimestamp(value):
+    ''' Epoch seconds of a docker RFC 3339 timestamp, other formats go through arrow '''
+    match = RFC3339_PATTERN.match(value)
+    if not match:
+        import arrow
+        return int(arrow.get(value).float_timestamp)
+    parts = match.groups()
+    seconds = calendar.timegm([int(x) for x in parts[0:6]])
+    if parts[6]:
+        offset = int(parts[7]) * 3600 + int(parts[8]) * 60
+        seconds -= offset if parts[6] == '+' else -offset
+    return seconds
+
 
 def parseContainerList(containers):
     return OK(containers['stdout'].strip().splitlines())
@@ -507,11 +988,12 @@ class ContainerStatus(object):
         self.running = None
         self.exitcode = None
         self.exiterr = None
+        self.health = None
 
     @staticmethod
     def fromStatusLine(line):
-        parts = line.split('|')
-        parts += [None] * (10 - len(parts))
+        parts = line.split('|', 10)
+        parts += [None] * (11 - len(parts))
 
         name = parts[0]
         cid = parts[1]
@@ -522,19 +1004,44 @@ class ContainerStatus(object):
         startedat = parts[6]
         running = parts[7]
         exitcode = parts[8]
-        exiterr = parts[9]
+        health = parts[9]
+        exiterr = parts[10]
 
         name = name[1:]
         status = ContainerStatus(name)
         status.cid = cid[0:12] if cid else None
         status.image = image
         status.ip = ip if ip else None
+        status.ports = (ports or '').strip() or None
         status.pid = int(pid) if pid and pid != "0" else None
         status.running = True if running == 'true' else False
-        status.startedat = arrow.get(
-            startedat).timestamp if startedat and status.running else None
+        status.startedat = parseTimestamp(startedat) if startedat and status.running else None
         status.exitcode = int(float(exitcode)) if exitcode else None
         status.exiterr = exiterr
+        status.health = health or None
+        return status
+
+    @staticmethod
+    def fromInspect(data):
+        ''' Build a status from a container inspect document of the engine API '''
+        state = data.get('State') or {}
+        network = data.get('NetworkSettings') or {}
+        ports = []
+        for port, bindings in (network.get('Ports') or {}).items():
+            if bindings:
+                ports.append("%s->%s" % (port, bindings[0].get('HostPort')))
+
+        status = ContainerStatus(data.get('Name', '')[1:])
+        status.cid = data.get('Id', '')[0:12] or None
+        status.image = (data.get('Config') or {}).get('Image')
+        status.ip = network.get('IPAddress') or None
+        status.ports = ' '.join(ports)
+        status.pid = state.get('Pid') or None
+        status.running = bool(state.get('Running'))
+        status.startedat = parseTimestamp(state['StartedAt']) if state.get('StartedAt') and status.running else None
+        status.exitcode = state.get('ExitCode')
+        status.exiterr = state.get('Error')
+        status.health = (state.get('Health') or {}).get('Status')
         return status
 
     def getCol(self, field):
@@ -0,0 +1,775 @@
+"""
+Docker Engine API backend.
+
+Talks HTTP to the docker daemon unix socket over a small pool of keep-alive
+connections instead of forking the docker client for every operation. The
+functions that are not implemented here (run, execmd, stats, login, ...)
+fall back to the docker client through dockwrkr.docker.
+"""
+import os
+import re
+import json
+import base64
+import socket
+import logging
+import threading
+import http.client
+from collections import OrderedDict
+from urllib.parse import (quote, urlencode)
+
+from dockwrkr.docker import *
+from dockwrkr.docker import (DOCKWRKR_LABEL_DOMAIN, DOCKWRKR_LABEL_DOMAIN_NETWORK, DOCKER_DEFAULT_REGISTRY, ContainerStatus,
+                             EventStream, compileSpec, readCreateNetworkParameters, readStoredAuths,
+                             unpackImageString)
+import dockwrkr.docker as cli
+from dockwrkr.executor import runConcurrently
+from dockwrkr.monads import *
+from dockwrkr.utils import ensureList
+from dockwrkr.exceptions import (DockerError, InvalidConfigError)
+
+logger = logging.getLogger(__name__)
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+DOCKER_API_VERSION = "v1.25"
+DOCKER_API_POOL_SIZE = 8
+DOCKER_API_TIMEOUT = 60
+
+
+def getSocketPath():
+    host = os.environ.get('DOCKER_HOST')
+    if host:
+        if not host.startswith('unix://'):
+            return None
+        return host[len('unix://'):]
+    return DOCKER_SOCKET
+
+
+def isAvailable():
+    path = getSocketPath()
+    return bool(path) and os.path.exists(path)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout=DOCKER_API_TIMEOUT):
+        super(UnixHTTPConnection, self).__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+
+class ConnectionPool(object):
+    '''
+    Keep up to `size` persistent connections to the daemon socket. Callers
+    block while all connections are in use.
+    '''
+
+    def __init__(self, path, size=DOCKER_API_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        self.slots.acquire()
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return UnixHTTPConnection(self.path)
+
+    def release(self, conn, reuse=True):
+        if reuse:
+            with self.lock:
+                self.idle.append(conn)
+        else:
+            conn.close()
+        self.slots.release()
+
+    def request(self, method, path, body=None, headers={}, timeout=None, stream=None):
+        '''
+        Perform a request and return (status, data) where data is the decoded
+        JSON body, or the list of decoded JSON messages when `stream` is set.
+        A request failing on a connection the daemon closed is retried once.
+        '''
+        payload = json.dumps(body).encode() if body is not None else None
+        hdrs = {'Content-Type': 'application/json'}
+        hdrs.update(headers)
+        for attempt in (0, 1):
+            conn = self.acquire()
+            reused = conn.sock is not None
+            try:
+                conn.timeout = timeout or DOCKER_API_TIMEOUT
+                if conn.sock is not None:
+                    conn.sock.settimeout(conn.timeout)
+                conn.request(method, "/%s%s" % (DOCKER_API_VERSION, path), body=payload, headers=hdrs)
+                response = conn.getresponse()
+                if stream:
+                    data = readJSONStream(response, stream)
+                else:
+                    data = decodeJSON(response.read())
+                self.release(conn, reuse=not response.will_close)
+                return (response.status, data)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.release(conn, reuse=False)
+                if attempt or not reused:
+                    raise
+            except Exception:
+                self.release(conn, reuse=False)
+                raise
+
+
+def decodeJSON(data):
+    if not data:
+        return None
+    try:
+        return json.loads(data.decode())
+    except ValueError:
+        return data.decode()
+
+
+def readJSONStream(response, callback):
+    messages = []
+    for line in response:
+        line = line.strip()
+        if not line:
+            continue
+        message = decodeJSON(line)
+        messages.append(message)
+        callback(message)
+    # Iterating stops at Content-Length without releasing the connection.
+    response.read()
+    return messages
+
+
+_pool = None
+_poolLock = threading.Lock()
+
+
+def getPool():
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            _pool = ConnectionPool(getSocketPath())
+        return _pool
+
+
+def apiRequest(method, path, query=None, body=None, expect=(200,), headers={}, timeout=None, stream=None):
+    if query:
+        path = "%s?%s" % (path, urlencode(query))
+    try:
+        (status, data) = getPool().request(method, path, body=body, headers=headers, timeout=timeout, stream=stream)
+    except Exception as err:
+        return Fail(DockerError(message="Docker API request failed: %s" % err, cmd="%s %s" % (method, path)))
+    if status not in expect:
+        message = data.get('message') if isinstance(data, dict) else data
+        return Fail(DockerError(message=message, code=status, stderr=message, cmd="%s %s" % (method, path)))
+    return OK(data)
+
+
+def containerPath(container, action=''):
+    return "/containers/%s%s" % (quote(container, safe=''), action)
+
+
+def managedFilter(*labels):
+    filters = ["%s.managed=1" % DOCKWRKR_LABEL_DOMAIN] + list(labels)
+    return json.dumps({'label': filters})
+
+# -- API
+
+
+def readManagedContainers():
+    return apiRequest('GET', '/containers/json', query={'all': 1, 'filters': managedFilter()}) \
+        .map(lambda l: [c.get('Labels', {}).get("%s.name" % DOCKWRKR_LABEL_DOMAIN) for c in l])
+
+
+def filterExistingContainers(containers):
+    wanted = set(containers)
+    return readManagedContainers() \
+        .map(lambda l: [x for x in l if x in wanted])
+
+
+def readNetworkExists(network):
+    name = list(network.keys())[0]
+    exists = apiRequest('GET', '/networks', query={'filters': json.dumps({'name': [name]})}) \
+        .map(lambda l: any(n.get('Name') == name for n in l))
+    if exists.isFail():
+        return exists
+    if exists.getOK():
+        return Fail("Network Exists")
+    return OK(network)
+
+
+def readNetworks():
+    return apiRequest('GET', '/networks') \
+        .map(lambda l: set(n.get('Name') for n in l))
+
+
+def ensureNetwork(net, networks, existing=None):
+    if not networks or net not in networks:
+        return OK(None)
+    if existing is None:
+        return readNetworkExists({net: networks[net]}).bind(createNetwork).catch(lambda e: OK(None))
+    if net in existing:
+        return OK(None)
+    return createNetwork({net: networks[net]}).then(defer(existing.add, net))
+
+
+def readContainersStatus(containers=[]):
+    if not containers:
+        return OK({})
+    statuses = {}
+    results = runConcurrently(readContainerInspect, containers, DOCKER_API_POOL_SIZE)
+    for container, result in zip(containers, results):
+        if result.isFail():
+            return result
+        status = ContainerStatus.fromInspect(result.getOK())
+        statuses[status.name] = status
+    return OK(statuses)
+
+
+def readStateSnapshot(containers=None):
+    '''
+    Statuses of the managed containers among `containers`, keyed by name,
+    inspected concurrently over the pool. Without `containers`, every managed
+    container is listed first.
+    '''
+    if containers is None:
+        return readManagedContainers().bind(readStateSnapshot)
+    statuses = {}
+    for result in runConcurrently(readManagedInspect, containers, DOCKER_API_POOL_SIZE):
+        if result.isFail():
+            return result
+        if result.getOK():
+            status = ContainerStatus.fromInspect(result.getOK())
+            statuses[status.name] = status
+    return OK(statuses)
+
+
+def readManagedInspect(container):
+    ''' Inspect document of a managed container, or None when it does not exist or is not managed '''
+    result = readContainerInspect(container)
+    if result.isFail():
+        return OK(None) if getattr(result.getError(), 'code', None) == 404 else result
+    labels = (result.getOK().get('Config') or {}).get('Labels') or {}
+    return OK(result.getOK() if labels.get("%s.managed" % DOCKWRKR_LABEL_DOMAIN) == '1' else None)
+
+
+def iterContainersStatus(containers=[]):
+    '''
+    Generator over the statuses of the managed containers among `containers`,
+    inspected concurrently a window at a time and yielded in order.
+    '''
+    window = DOCKER_API_POOL_SIZE * 4
+    for start in range(0, len(containers), window):
+        chunk = containers[start:start + window]
+        for result in runConcurrently(readManagedInspect, chunk, DOCKER_API_POOL_SIZE):
+            if result.isFail():
+                raise result.getError()
+            if result.getOK():
+                yield ContainerStatus.fromInspect(result.getOK())
+
+
+def readContainerInspect(container):
+    return apiRequest('GET', containerPath(container, '/json'))
+
+
+def readEvents(since=None):
+    ''' Open the stream of events of managed containers on a connection of its own, outside the pool '''
+    query = {'filters': json.dumps({'type': ['container'], 'label': ["%s.managed=1" % DOCKWRKR_LABEL_DOMAIN]})}
+    if since is not None:
+        query['since'] = int(since)
+    path = "/%s/events?%s" % (DOCKER_API_VERSION, urlencode(query))
+    conn = UnixHTTPConnection(getSocketPath(), timeout=None)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+    except Exception as err:
+        conn.close()
+        return Fail(DockerError(message="Docker API request failed: %s" % err, cmd="GET %s" % path))
+    if response.status != 200:
+        message = decodeJSON(response.read())
+        conn.close()
+        message = message.get('message') if isinstance(message, dict) else message
+        return Fail(DockerError(message=message, code=response.status, stderr=message, cmd="GET %s" % path))
+
+    def close():
+        try:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+        conn.close()
+    return OK(EventStream(response, close))
+
+
+def readContainerPid(container):
+    return readContainerInspect(container) \
+        .map(lambda c: str(c.get('State', {}).get('Pid', 0)))
+
+
+def create(container, config, basePath=None, networks=None, existingNetworks=None):
+    spec = compileSpec(container, config, basePath=basePath)
+    if spec.isFail():
+        return spec
+    spec = spec.getOK()
+    joined = ensureNetwork(spec.net, networks, existingNetworks)
+    if joined.isFail():
+        return joined
+    payload = readCreatePayload(container, spec.argv)
+    if payload.isFail():
+        return payload
+    (name, body) = payload.getOK()
+    path = '/containers/create'
+    result = apiRequest('POST', path, query={'name': name}, body=body, expect=(201,))
+    if result.isFail() and result.getError().code == 404:
+        result = pull(body['Image']) \
+            .then(defer(apiRequest, 'POST', path, query={'name': name}, body=body, expect=(201,)))
+    return result
+
+
+def createNetwork(network):
+    params = readCreateNetworkParameters(network)
+    if params.isFail():
+        return params
+    return apiRequest('POST', '/networks/create', body=readCreateNetworkPayload(network), expect=(201,))
+
+
+def start(container):
+    return apiRequest('POST', containerPath(container, '/start'), expect=(204, 304))
+
+
+def stop(container, time=10):
+    return apiRequest('POST', containerPath(container, '/stop'), query={'t': time}, expect=(204, 304),
+                      timeout=DOCKER_API_TIMEOUT + int(time))
+
+
+def remove(container, force=False):
+    return apiRequest('DELETE', containerPath(container), query={'force': 1 if force else 0}, expect=(204,))
+
+
+def startMany(containers):
+    return _many(start, containers)
+
+
+def stopMany(containers, time=10):
+    return _many(lambda c: stop(c, time=time), containers)
+
+
+def removeMany(containers, force=False):
+    return _many(lambda c: remove(c, force=force), containers)
+
+
+def _many(operation, containers):
+    results = runConcurrently(operation, containers, DOCKER_API_POOL_SIZE)
+    return OrderedDict(zip(containers, results))
+
+
+def pull(image, quiet=False):
+    (repository, tag) = splitImageTag(image)
+    headers = {}
+    auth = readRegistryAuth(unpackImageString(image).get('registry'))
+    if auth:
+        headers['X-Registry-Auth'] = auth
+
+    def progress(message):
+        if isinstance(message, dict) and message.get('status') and not message.get('progressDetail'):
+            logger.debug("%s: %s" % (image, message.get('status')))
+
+    query = {'fromImage': repository}
+    if tag:
+        query['tag'] = tag
+    result = apiRequest('POST', '/images/create', query=query, headers=headers, timeout=3600, stream=progress)
+    if result.isOK():
+        errors = [m.get('error') for m in result.getOK() if isinstance(m, dict) and m.get('error')]
+        if errors:
+            result = Fail(DockerError(message=errors[-1], stderr=errors[-1], cmd="pull %s" % image))
+    if result.isFail():
+        logger.debug("API pull of %s failed, falling back to the docker client: %s" % (image, result.getError()))
+        return cli.pull(image, quiet=quiet)
+    return result
+
+
+def readStats(containers):
+    results = runConcurrently(lambda c: apiRequest('GET', containerPath(c, '/stats'), query={'stream': 0}),
+                              containers, DOCKER_API_POOL_SIZE)
+    samples = OrderedDict()
+    for (container, result) in zip(containers, results):
+        if result.isFail():
+            if result.getError().code == 404:
+                continue
+            return result
+        samples[container] = parseStatsPayload(result.getOK())
+    return OK(samples)
+
+
+def readLocalImages(images):
+    def inspect(image):
+        result = apiRequest('GET', '/images/%s/json' % quote(image, safe=''))
+        if result.isFail() and result.getError().code == 404:
+            return OK(False)
+        return result.map(lambda data: True)
+    results = runConcurrently(inspect, images, DOCKER_API_POOL_SIZE)
+    return Try.sequence(results) \
+        .map(lambda l: set(image for (image, present) in zip(images, l) if present))
+
+
+def readImageSizes(images):
+    results = runConcurrently(lambda image: apiRequest('GET', '/images/%s/json' % quote(image, safe='')), images,
+                              DOCKER_API_POOL_SIZE)
+    return Try.sequence(results) \
+        .map(lambda l: dict((image, data.get('Size')) for (image, data) in zip(images, l)))
+
+
+def splitImageTag(image):
+    if '@' in image:
+        return (image, None)
+    (name, sep, tag) = image.rpartition(':')
+    if not sep or '/' in tag:
+        return (image, 'latest')
+    return (name, tag)
+
+
+def readRegistryAuth(registry):
+    ''' Registry credentials stored by `docker login`, encoded for the X-Registry-Auth header '''
+    entry = readStoredAuths().get(registry or DOCKER_DEFAULT_REGISTRY)
+    if not entry or not entry.get('auth'):
+        return None
+    (username, sep, password) = base64.b64decode(entry['auth']).decode().partition(':')
+    credentials = {'username': username, 'password': password, 'serveraddress': registry or DOCKER_DEFAULT_REGISTRY}
+    return base64.urlsafe_b64encode(json.dumps(credentials).encode()).decode()
+
+
+def parseStatsPayload(data):
+    ''' Sample from a one-shot stats response, with the figures `docker stats` derives from it '''
+    cpu = data.get('cpu_stats') or {}
+    precpu = data.get('precpu_stats') or {}
+    cpuDelta = (cpu.get('cpu_usage') or {}).get('total_usage', 0) - (precpu.get('cpu_usage') or {}).get('total_usage', 0)
+    systemDelta = cpu.get('system_cpu_usage', 0) - precpu.get('system_cpu_usage', 0)
+    cpus = cpu.get('online_cpus') or len((cpu.get('cpu_usage') or {}).get('percpu_usage') or []) or 1
+    memory = data.get('memory_stats') or {}
+    details = memory.get('stats') or {}
+    networks = (data.get('networks') or {}).values()
+    blkio = (data.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []
+    return OrderedDict([
+        ('cpu', 100.0 * cpuDelta / systemDelta * cpus if systemDelta > 0 and cpuDelta > 0 else 0.0),
+        ('mem', memory.get('usage', 0) - details.get('total_inactive_file', details.get('inactive_file', 0))
+         if 'usage' in memory else None),
+        ('memlimit', memory.get('limit')),
+        ('netrx', sum(n.get('rx_bytes', 0) for n in networks)),
+        ('nettx', sum(n.get('tx_bytes', 0) for n in networks)),
+        ('blockread', sum(e.get('value', 0) for e in blkio if (e.get('op') or '').lower() == 'read')),
+        ('blockwrite', sum(e.get('value', 0) for e in blkio if (e.get('op') or '').lower() == 'write')),
+        ('pids', (data.get('pids_stats') or {}).get('current')),
+    ])
+
+# ---- Translate docker client parameters into API payloads
+
+
+def parseBytes(value):
+    units = {'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+    value = str(value).strip().lower()
+    if value.endswith('b') and len(value) > 1 and value[-2] in units:
+        value = value[:-1]
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def parseDuration(value):
+    ''' Nanoseconds in a docker duration such as `30s`, `1m30s` or `500ms` '''
+    units = {'ns': 1, 'us': 10 ** 3, 'ms': 10 ** 6, 's': 10 ** 9, 'm': 60 * 10 ** 9, 'h': 3600 * 10 ** 9}
+    parts = re.findall(r'([0-9.]+)(ns|us|ms|s|m|h)', str(value).strip())
+    if not parts or ''.join(n + u for (n, u) in parts) != str(value).strip():
+        raise ValueError("invalid duration '%s'" % value)
+    return int(sum(float(n) * units[u] for (n, u) in parts))
+
+
+def parseBool(value):
+    return value is None or str(value).lower() in ('true', '1', 'yes')
+
+
+def parsePublish(value):
+    ''' [ip:][hostPort:]containerPort[/protocol] '''
+    (ports, sep, proto) = value.partition('/')
+    port = "%s/%s" % (ports.rsplit(':', 1)[-1], proto or 'tcp')
+    parts = ports.split(':')
+    binding = {'HostIp': '', 'HostPort': ''}
+    if len(parts) == 3:
+        binding = {'HostIp': parts[0], 'HostPort': parts[1]}
+    elif len(parts) == 2:
+        binding = {'HostIp': '', 'HostPort': parts[0]}
+    return (port, binding)
+
+
+def parseUlimit(value):
+    (name, sep, limits) = value.partition('=')
+    (soft, sep, hard) = limits.partition(':')
+    return {'Name': name, 'Soft': int(soft), 'Hard': int(hard or soft)}
+
+
+def parseRestart(value):
+    (name, sep, count) = value.partition(':')
+    policy = {'Name': name}
+    if count:
+        policy['MaximumRetryCount'] = int(count)
+    return policy
+
+
+def readEnvFile(filename):
+    env = []
+    with open(filename) as fh:
+        for line in fh:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                env.append(line if '=' in line else "%s=%s" % (line, os.environ.get(line, '')))
+    return env
+
+
+def _set(section, key, convert=None):
+    def setter(payload, value):
+        payload[section][key] = convert(value) if convert else value
+    return setter
+
+
+def _append(section, key, convert=None):
+    def setter(payload, value):
+        payload[section].setdefault(key, []).append(convert(value) if convert else value)
+    return setter
+
+
+def _healthcheck(key, convert):
+    def setter(payload, value):
+        payload['Config'].setdefault('Healthcheck', {})[key] = convert(value)
+    return setter
+
+
+def _label(payload, value):
+    (key, sep, val) = value.partition('=')
+    payload['Config'].setdefault('Labels', {})[key] = val
+
+
+def _publish(payload, value):
+    (port, binding) = parsePublish(value)
+    payload['Config'].setdefault('ExposedPorts', {})[port] = {}
+    payload['HostConfig'].setdefault('PortBindings', {}).setdefault(port, []).append(binding)
+
+
+def _expose(payload, value):
+    port = value if '/' in value else "%s/tcp" % value
+    payload['Config'].setdefault('ExposedPorts', {})[port] = {}
+
+
+def _volume(payload, value):
+    if ':' in value:
+        payload['HostConfig'].setdefault('Binds', []).append(value)
+    else:
+        payload['Config'].setdefault('Volumes', {})[value] = {}
+
+
+def _device(payload, value):
+    parts = value.split(':')
+    device = {'PathOnHost': parts[0], 'PathInContainer': parts[1] if len(parts) > 1 else parts[0],
+              'CgroupPermissions': parts[2] if len(parts) > 2 else 'rwm'}
+    payload['HostConfig'].setdefault('Devices', []).append(device)
+
+
+def _logOpt(payload, value):
+    (key, sep, val) = value.partition('=')
+    payload['HostConfig'].setdefault('LogConfig', {}).setdefault('Config', {})[key] = val
+
+
+def _logDriver(payload, value):
+    payload['HostConfig'].setdefault('LogConfig', {})['Type'] = value
+
+
+def _sysctl(payload, value):
+    (key, sep, val) = value.partition('=')
+    payload['HostConfig'].setdefault('Sysctls', {})[key] = val
+
+
+def _envFile(payload, value):
+    payload['Config'].setdefault('Env', []).extend(readEnvFile(value))
+
+
+def _labelFile(payload, value):
+    for line in readEnvFile(value):
+        _label(payload, line)
+
+
+def _ip(payload, value):
+    payload['IPv4Address'] = value
+
+
+def _entrypoint(payload, value):
+    payload['Config']['Entrypoint'] = [value] if value else []
+
+
+API_VALUE_OPTIONS = {
+    'add-host': _append('HostConfig', 'ExtraHosts'),
+    'blkio-weight': _set('HostConfig', 'BlkioWeight', int),
+    'cap-add': _append('HostConfig', 'CapAdd'),
+    'cap-drop': _append('HostConfig', 'CapDrop'),
+    'cgroup-parent': _set('HostConfig', 'CgroupParent'),
+    'cpu-period': _set('HostConfig', 'CpuPeriod', int),
+    'cpu-quota': _set('HostConfig', 'CpuQuota', int),
+    'cpu-shares': _set('HostConfig', 'CpuShares', int),
+    'cpuset-cpus': _set('HostConfig', 'CpusetCpus'),
+    'cpuset-mems': _set('HostConfig', 'CpusetMems'),
+    'device': _device,
+    'dns': _append('HostConfig', 'Dns'),
+    'dns-opt': _append('HostConfig', 'DnsOptions'),
+    'dns-search': _append('HostConfig', 'DnsSearch'),
+    'entrypoint': _entrypoint,
+    'env': _append('Config', 'Env'),
+    'env-file': _envFile,
+    'expose': _expose,
+    'group-add': _append('HostConfig', 'GroupAdd'),
+    'health-cmd': _healthcheck('Test', lambda v: ['CMD-SHELL', v]),
+    'health-interval': _healthcheck('Interval', parseDuration),
+    'health-retries': _healthcheck('Retries', int),
+    'health-start-period': _healthcheck('StartPeriod', parseDuration),
+    'health-timeout': _healthcheck('Timeout', parseDuration),
+    'hostname': _set('Config', 'Hostname'),
+    'ip': _ip,
+    'ipc': _set('HostConfig', 'IpcMode'),
+    'kernel-memory': _set('HostConfig', 'KernelMemory', parseBytes),
+    'label': _label,
+    'label-file': _labelFile,
+    'link': _append('HostConfig', 'Links'),
+    'log-driver': _logDriver,
+    'log-opt': _logOpt,
+    'mac-address': _set('Config', 'MacAddress'),
+    'memory': _set('HostConfig', 'Memory', parseBytes),
+    'memory-reservation': _set('HostConfig', 'MemoryReservation', parseBytes),
+    'memory-swap': _set('HostConfig', 'MemorySwap', lambda v: -1 if str(v) == '-1' else parseBytes(v)),
+    'memory-swappiness': _set('HostConfig', 'MemorySwappiness', int),
+    'memory-swapiness': _set('HostConfig', 'MemorySwappiness', int),
+    'name': _set('Name', 'Name'),
+    'net': _set('HostConfig', 'NetworkMode'),
+    'network': _set('HostConfig', 'NetworkMode'),
+    'pid': _set('HostConfig', 'PidMode'),
+    'publish': _publish,
+    'restart': _set('HostConfig', 'RestartPolicy', parseRestart),
+    'security-opt': _append('HostConfig', 'SecurityOpt'),
+    'shm-size': _set('HostConfig', 'ShmSize', parseBytes),
+    'stop-signal': _set('Config', 'StopSignal'),
+    'sysctl': _sysctl,
+    'ulimit': _append('HostConfig', 'Ulimits', parseUlimit),
+    'user': _set('Config', 'User'),
+    'uts': _set('HostConfig', 'UTSMode'),
+    'volume': _volume,
+    'volumes-from': _append('HostConfig', 'VolumesFrom'),
+    'workdir': _set('Config', 'WorkingDir'),
+}
+
+API_BOOL_OPTIONS = {
+    'disable-content-trust': None,
+    'init': _set('HostConfig', 'Init'),
+    'interactive': _set('Config', 'OpenStdin'),
+    'oom-kill-disable': _set('HostConfig', 'OomKillDisable'),
+    'privileged': _set('HostConfig', 'Privileged'),
+    'publish-all': _set('HostConfig', 'PublishAllPorts'),
+    'read-only': _set('HostConfig', 'ReadonlyRootfs'),
+    'rm': _set('HostConfig', 'AutoRemove'),
+    'sig-proxy': None,
+    'tty': _set('Config', 'Tty'),
+}
+
+API_SHORT_OPTIONS = {
+    'e': 'env',
+    'h': 'hostname',
+    'i': 'interactive',
+    'l': 'label',
+    'm': 'memory',
+    'p': 'publish',
+    't': 'tty',
+    'u': 'user',
+    'v': 'volume',
+    'w': 'workdir',
+}
+
+
+def readCreatePayload(container, params):
+    '''
+    Translate the `docker create` arguments of a ContainerSpec into the
+    (name, body) of a /containers/create API request.
+    '''
+    args = list(params)
+    payload = {'Name': {'Name': container}, 'Config': {}, 'HostConfig': {}, 'IPv4Address': None}
+    i = 0
+    while i < len(args) and args[i].startswith('-'):
+        arg = args[i]
+        i += 1
+        if arg.startswith('--'):
+            (key, sep, value) = arg[2:].partition('=')
+            hasValue = bool(sep)
+        else:
+            key = API_SHORT_OPTIONS.get(arg[1:2], arg[1:])
+            value = arg[2:]
+            hasValue = bool(value)
+        if key in API_BOOL_OPTIONS:
+            setter = API_BOOL_OPTIONS[key]
+            if setter:
+                setter(payload, parseBool(value if hasValue else None))
+            continue
+        if key not in API_VALUE_OPTIONS:
+            return Fail(InvalidConfigError("[%s] Option '%s' is not supported by the api backend." % (container, key)))
+        if not hasValue:
+            if i >= len(args):
+                return Fail(InvalidConfigError("[%s] Option '%s' requires a value." % (container, key)))
+            value = args[i]
+            i += 1
+        try:
+            API_VALUE_OPTIONS[key](payload, value)
+        except (ValueError, IOError) as err:
+            return Fail(InvalidConfigError("[%s] Invalid value for option '%s': %s" % (container, key, err)))
+
+    if i >= len(args):
+        return Fail(InvalidConfigError("[%s] Container has no 'image' defined." % (container)))
+
+    body = payload['Config']
+    body['Image'] = args[i]
+    if args[i + 1:]:
+        body['Cmd'] = args[i + 1:]
+    body['HostConfig'] = payload['HostConfig']
+    network = body['HostConfig'].get('NetworkMode')
+    if payload['IPv4Address'] and network:
+        body['NetworkingConfig'] = {'EndpointsConfig': {network: {'IPAMConfig': {'IPv4Address': payload['IPv4Address']}}}}
+    return OK((payload['Name']['Name'], body))
+
+
+def readCreateNetworkPayload(network):
+    name = list(network.keys())[0]
+    params = network[name]
+    ipam = []
+    for i, subnet in enumerate(ensureList(params.get('subnet'))):
+        config = {'Subnet': subnet}
+        gateways = ensureList(params.get('gateway'))
+        ranges = ensureList(params.get('ip-range'))
+        if i < len(gateways):
+            config['Gateway'] = gateways[i]
+        if i < len(ranges):
+            config['IPRange'] = ranges[i]
+        ipam.append(config)
+    labels = {"%s.name" % DOCKWRKR_LABEL_DOMAIN_NETWORK: name, "%s.managed" % DOCKWRKR_LABEL_DOMAIN: "1"}
+    for label in ensureList(params.get('label')):
+        (key, sep, val) = label.partition('=')
+        labels[key] = val
+    return {
+        'Name': name,
+        'CheckDuplicate': True,
+        'Driver': params.get('driver', 'bridge'),
+        'Internal': parseBool(params['internal']) if 'internal' in params else False,
+        'EnableIPv6': parseBool(params['ipv6']) if 'ipv6' in params else False,
+        'IPAM': {
+            'Driver': params.get('ipam-driver', 'default'),
+            'Config': ipam,
+            'Options': dict((str(k), str(v)) for k, v in (params.get('ipam-opt') or {}).items()),
+        },
+        'Options': dict((str(k), str(v)) for k, v in (params.get('opt') or {}).items()),
+        'Labels': labels,
+    }
@@ -61,10 +61,22 @@ class InvalidContainerError(DockwrkrError):
     ''' Invalid container was specified '''
 
 
+class DependencyCycleError(InvalidConfigError):
+    ''' Container links form a cycle '''
+
+
 class InvalidRegistryError(DockwrkrError):
     ''' Invalid registry was specified '''
 
 
+class DependencyError(DockwrkrError):
+    ''' A container could not be processed because one of its dependencies failed '''
+
+
+class NotReadyError(DockwrkrError):
+    ''' A container did not become healthy in time '''
+
+
 class DockerError(ShellCommandError):
     '''
     Raised when a docker error is encountered
@@ -0,0 +1,229 @@
+import logging
+from collections import OrderedDict
+from concurrent.futures import (ThreadPoolExecutor, wait, FIRST_COMPLETED)
+
+from dockwrkr.monads import *
+from dockwrkr.exceptions import (DependencyError, UserInterruptError)
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyExecutor(object):
+    '''
+    Run a task for every node of a dependency graph, launching each node as
+    soon as all of its dependencies have completed successfully.
+
+    `dependencies` maps every node to schedule to the nodes it depends on.
+    Dependencies outside of the scheduled nodes are ignored. The task receives a node name and returns a Try, or None when
+    there was nothing to do for that node.
+
+    A `gate` receives a node whose task succeeded and blocks until its
+    dependents may be launched, returning a Fail to fail the node instead or
+    None when the node is not gated. Gates wait in their own threads, so
+    they never hold one of the `jobs` slots and each node is released as
+    soon as its own gate opens.
+    '''
+
+    def __init__(self, dependencies, jobs=1, gate=None):
+        self.dependencies = OrderedDict()
+        self.dependents = dict((node, []) for node in dependencies)
+        for node, deps in dependencies.items():
+            deps = [d for d in deps if d in self.dependents and d != node]
+            self.dependencies[node] = deps
+            for dep in deps:
+                self.dependents[dep].append(node)
+        self.order = self.sortNodes()
+        self.position = dict((node, i) for i, node in enumerate(self.order))
+        self.jobs = max(1, int(jobs or 1))
+        self.gate = gate
+
+    def sortNodes(self):
+        ''' Order the nodes so that every node comes after its dependencies, keeping the given order otherwise. '''
+        order = []
+        visited = set()
+        for root in self.dependencies:
+            if root in visited:
+                continue
+            stack = [(root, iter(self.dependencies[root]))]
+            visited.add(root)
+            while stack:
+                node, deps = stack[-1]
+                for dep in deps:
+                    if dep not in visited:
+                        visited.add(dep)
+                        stack.append((dep, iter(self.dependencies[dep])))
+                        break
+                else:
+                    stack.pop()
+                    order.append(node)
+        return order
+
+    def run(self, task):
+        ''' Returns the list of Try results, in schedule order. Nodes for which the task returned None are omitted. '''
+        if self.gate is None and (self.jobs == 1 or len(self.order) < 2):
+            results = self.runSequential(task)
+        else:
+            results = self.runParallel(self.attempt, task)
+        return self.collect(results)
+
+    def runBatched(self, task):
+        '''
+        Like run(), but the task receives every node that became ready at the
+        same time as a single batch and returns a dict mapping those nodes to
+        their Try result (or None). With one job, batches are the successive
+        dependency waves.
+        '''
+        if self.jobs == 1 and self.gate is None:
+            results = self.runWaves(task)
+        else:
+            results = self.runParallel(self.attemptBatch, task, batched=True)
+        return self.collect(results)
+
+    def collect(self, results):
+        return [results[node] for node in self.order if results.get(node) is not None]
+
+    def runSequential(self, task):
+        results = {}
+        for node in self.order:
+            failed = self.failedDependency(node, results)
+            if failed:
+                results[node] = self.dependencyFailure(node, failed)
+                continue
+            try:
+                results[node] = self.attempt(task, node)
+            except KeyboardInterrupt:
+                logger.info("CTRL-C Received...Exiting.")
+                return self.interrupt(results)
+        return results
+
+    def runWaves(self, task):
+        results = {}
+        waiting = dict((node, set(deps)) for node, deps in self.dependencies.items())
+        ready = [node for node in self.order if not waiting[node]]
+        try:
+            while ready:
+                batch = ready
+                results.update(self.attemptBatch(task, batch))
+                ready = []
+                for node in batch:
+                    ready.extend(self.release(node, results, waiting))
+                ready.sort(key=self.position.__getitem__)
+        except KeyboardInterrupt:
+            logger.info("CTRL-C Received...Exiting.")
+            return self.interrupt(results)
+        return results
+
+    def runParallel(self, attempt, task, batched=False):
+        results = {}
+        waiting = dict((node, set(deps)) for node, deps in self.dependencies.items())
+        ready = [node for node in self.order if not waiting[node]]
+        running = {}
+        pool = ThreadPoolExecutor(max_workers=self.jobs)
+        gates = ThreadPoolExecutor(max_workers=len(self.order)) if self.gate else None
+        try:
+            while ready or running:
+                units = [ready] if batched else [[node] for node in ready]
+                for unit in units:
+                    running[pool.submit(attempt, task, unit if batched else unit[0])] = (unit, False)
+                ready = []
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    (unit, gated) = running.pop(future)
+                    outcome = future.result()
+                    for node in unit:
+                        result = outcome.get(node) if batched and not gated else outcome
+                        if gates and not gated and (result is None or result.isOK()):
+                            running[gates.submit(self.attemptGate, self.gate, node, result)] = ([node], True)
+                            continue
+                        results[node] = result
+                        ready.extend(self.release(node, results, waiting))
+                ready.sort(key=self.position.__getitem__)
+        except KeyboardInterrupt:
+            logger.info("CTRL-C Received...Exiting.")
+            for future in running:
+                future.cancel()
+            if gates:
+                gates.shutdown(wait=False)
+            pool.shutdown(wait=True)
+            for future, (unit, gated) in running.items():
+                if not gated and not future.cancelled() and future.done():
+                    outcome = future.result()
+                    for node in unit:
+                        results[node] = outcome.get(node) if batched else outcome
+            return self.interrupt(results)
+        pool.shutdown(wait=True)
+        if gates:
+            gates.shutdown(wait=True)
+        return results
+
+    def release(self, node, results, waiting):
+        ''' Mark a node as done and return the dependents that can now be launched. '''
+        ready = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for dependent in self.dependents[current]:
+                if dependent in results:
+                    continue
+                waiting[dependent].discard(current)
+                if waiting[dependent]:
+                    continue
+                failed = self.failedDependency(dependent, results)
+                if failed:
+                    results[dependent] = self.dependencyFailure(dependent, failed)
+                    stack.append(dependent)
+                else:
+                    ready.append(dependent)
+        return ready
+
+    def failedDependency(self, node, results):
+        for dep in self.dependencies[node]:
+            if dep in results and results[dep] is not None and results[dep].isFail():
+                return dep
+        return None
+
+    def dependencyFailure(self, node, dep):
+        return Fail(DependencyError("'%s' was skipped because its dependency '%s' failed." % (node, dep)))
+
+    def interrupt(self, results):
+        for node in self.order:
+            if node not in results:
+                results[node] = Fail(UserInterruptError(message="User interrupted."))
+        return results
+
+    @staticmethod
+    def attempt(task, node):
+        try:
+            return task(node)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            return Fail(e)
+
+    @staticmethod
+    def attemptGate(gate, node, result):
+        try:
+            gated = gate(node)
+        except Exception as e:
+            return Fail(e)
+        if gated is not None and gated.isFail():
+            return gated
+        return result
+
+    @staticmethod
+    def attemptBatch(task, nodes):
+        try:
+            return task(list(nodes)) or {}
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            return dict((node, Fail(e)) for node in nodes)
+
+
+def runConcurrently(task, items, jobs=1):
+    ''' Apply a task to independent items with up to `jobs` threads and return the results in order '''
+    items = list(items)
+    if jobs <= 1 or len(items) < 2:
+        return [DependencyExecutor.attempt(task, item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+        return list(pool.map(lambda item: DependencyExecutor.attempt(task, item), items))
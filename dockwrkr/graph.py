@@ -0,0 +1,145 @@
+from collections import OrderedDict, deque
+
+from dockwrkr.utils import ensureList
+from dockwrkr.exceptions import (InvalidContainerError, DependencyCycleError)
+
+
+def readLinks(config):
+    ''' Container names referenced by the `link` option of a container config '''
+    if not config or 'link' not in config:
+        return []
+    return [link.partition(':')[0] for link in ensureList(config['link'])]
+
+
+class DependencyGraph(object):
+    '''
+    Compiled `link` dependency graph of the services and jobs defined in the
+    configuration.
+
+    Nodes keep their definition order. `order` lists every node after all of
+    its dependencies; building the graph fails with an InvalidContainerError
+    when a link targets an undefined container and with a
+    DependencyCycleError when links form a cycle.
+    '''
+
+    def __init__(self, nodes):
+        self.adjacency = OrderedDict()
+        self.reverse = OrderedDict()
+        for name, deps in nodes.items():
+            unique = []
+            for dep in deps:
+                if dep not in unique:
+                    unique.append(dep)
+            self.adjacency[name] = tuple(unique)
+            self.reverse[name] = []
+        for name, deps in self.adjacency.items():
+            for dep in deps:
+                if dep not in self.reverse:
+                    raise InvalidContainerError("Container named '%s' is listed as a dependency but it is never defined." % dep)
+                self.reverse[dep].append(name)
+        self.order = self.sortNodes()
+        self.position = dict((name, i) for i, name in enumerate(self.order))
+
+    @staticmethod
+    def fromConfig(*sections):
+        nodes = OrderedDict()
+        for section in sections:
+            # Lazy sections know the links of their services without loading them.
+            links = getattr(section, 'readLinks', None)
+            for name in (section or {}):
+                if name not in nodes:
+                    nodes[name] = links(name) if links else readLinks(section[name])
+        return DependencyGraph(nodes)
+
+    def sortNodes(self):
+        ''' Depth-first post-order over the nodes in definition order '''
+        order = []
+        state = {}
+        for root in self.adjacency:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(self.adjacency[root]))]
+            while stack:
+                node, deps = stack[-1]
+                for dep in deps:
+                    seen = state.get(dep)
+                    if seen is None:
+                        state[dep] = 1
+                        stack.append((dep, iter(self.adjacency[dep])))
+                        break
+                    elif seen == 1:
+                        path = [n for n, _ in stack]
+                        cycle = path[path.index(dep):] + [dep]
+                        raise DependencyCycleError("Dependency cycle detected: %s" % ' -> '.join(cycle))
+                else:
+                    stack.pop()
+                    state[node] = 2
+                    order.append(node)
+        return order
+
+    def __contains__(self, name):
+        return name in self.adjacency
+
+    def __len__(self):
+        return len(self.adjacency)
+
+    def getDependencies(self, name):
+        ''' Direct dependencies of a node '''
+        return list(self.adjacency[name])
+
+    def getDependents(self, name):
+        ''' Nodes that directly depend on a node '''
+        return list(self.reverse[name])
+
+    def getTransitiveDependencies(self, name):
+        return self.sort(self.walk([name], self.adjacency) - set([name]))
+
+    def getTransitiveDependents(self, name):
+        return self.sort(self.walk([name], self.reverse) - set([name]))
+
+    def resolve(self, names):
+        ''' The given nodes and all of their transitive dependencies, in dependency order '''
+        return self.sort(self.walk(names, self.adjacency))
+
+    def sort(self, names):
+        ''' Order a collection of nodes so that dependencies come first '''
+        position = self.position
+        names = set(names)
+        for name in names:
+            if name not in position:
+                raise InvalidContainerError("Container '%s' not defined." % name)
+        return sorted(names, key=position.__getitem__)
+
+    def subgraph(self, names, reverse=False):
+        '''
+        Map each of the given nodes, in dependency order, to its direct
+        dependencies among them. With `reverse`, nodes are listed dependents
+        first and mapped to their direct dependents instead.
+        '''
+        selected = set(names)
+        ordered = self.sort(selected)
+        edges = self.adjacency
+        if reverse:
+            ordered.reverse()
+            edges = self.reverse
+        nodes = OrderedDict()
+        for name in ordered:
+            nodes[name] = [other for other in edges[name] if other in selected]
+        return nodes
+
+    def walk(self, names, edges):
+        seen = set()
+        queue = deque()
+        for name in names:
+            if name not in self.adjacency:
+                raise InvalidContainerError("Container '%s' not defined." % name)
+            if name not in seen:
+                seen.add(name)
+                queue.append(name)
+        while queue:
+            for nxt in edges[queue.popleft()]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    queue.append(nxt)
+        return seen
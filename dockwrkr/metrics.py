@@ -0,0 +1,134 @@
+"""
+Prometheus metrics of the managed containers.
+"""
+import time
+import logging
+import threading
+
+from dockwrkr.monads import *
+from dockwrkr.exceptions import InvalidOptionError
+
+logger = logging.getLogger(__name__)
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS_PATH = '/metrics'
+
+# Container status metrics: (name, type, help, value of a status)
+STATUS_METRICS = [
+    ('dockwrkr_container_up', 'gauge', "Whether the container exists and is running.",
+     lambda status, starts, now: 1 if status is not None and status.running else 0),
+    ('dockwrkr_container_restarts_total', 'counter', "Starts of the container seen since the exporter started.",
+     lambda status, starts, now: starts),
+    ('dockwrkr_container_exit_code', 'gauge', "Exit code of the last run of the container.",
+     lambda status, starts, now: status.exitcode if status is not None else None),
+    ('dockwrkr_container_uptime_seconds', 'gauge', "Seconds since the container was started.",
+     lambda status, starts, now: max(0, now - status.startedat) if status is not None and status.startedat else None),
+    ('dockwrkr_container_healthy', 'gauge', "Whether the health check of the container passes.",
+     lambda status, starts, now: (1 if status.health == 'healthy' else 0) if status is not None and status.health else None),
+]
+
+# Resource usage metrics: (name, type, help, sample key)
+USAGE_METRICS = [
+    ('dockwrkr_container_cpu_percent', 'gauge', "CPU usage, in percent of one CPU.", 'cpu'),
+    ('dockwrkr_container_memory_bytes', 'gauge', "Memory used, without the inactive page cache.", 'mem'),
+    ('dockwrkr_container_memory_limit_bytes', 'gauge', "Memory limit.", 'memlimit'),
+    ('dockwrkr_container_network_receive_bytes_total', 'counter', "Bytes received.", 'netrx'),
+    ('dockwrkr_container_network_transmit_bytes_total', 'counter', "Bytes sent.", 'nettx'),
+    ('dockwrkr_container_block_read_bytes_total', 'counter', "Bytes read from block devices.", 'blockread'),
+    ('dockwrkr_container_block_write_bytes_total', 'counter', "Bytes written to block devices.", 'blockwrite'),
+    ('dockwrkr_container_pids', 'gauge', "Processes in the container.", 'pids'),
+]
+
+
+def parseListenAddress(listen):
+    ''' (host, port) from `:9100`, `9100` or `127.0.0.1:9100` '''
+    (host, sep, port) = str(listen).rpartition(':')
+    try:
+        return (host.strip('[]'), int(port))
+    except ValueError:
+        raise InvalidOptionError("Invalid listen address '%s', expected [HOST]:PORT." % listen)
+
+
+def formatValue(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class MetricsExporter(object):
+    '''
+    Render the metrics of the containers from what is already in memory: the
+    statuses of a watched StateStore and the last resource usage samples of
+    the running containers. A scrape never reaches the daemon, so its cost
+    does not depend on how often scrapes come in.
+    '''
+
+    def __init__(self, store, containers):
+        self.store = store
+        self.containers = list(containers)
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def setSamples(self, samples):
+        with self.lock:
+            self.samples = dict(samples)
+
+    def render(self, now=None):
+        now = now if now is not None else time.time()
+        statuses = self.store.lookup(self.containers)
+        starts = self.store.readStarts()
+        with self.lock:
+            samples = self.samples
+        lines = []
+        for (name, kind, description, read) in STATUS_METRICS:
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for container in self.containers:
+                value = read(statuses.get(container), starts.get(container, 0), now)
+                if value is not None:
+                    lines.append('%s{name="%s"} %s' % (name, container, formatValue(value)))
+        for (name, kind, description, key) in USAGE_METRICS:
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for container in self.containers:
+                status = statuses.get(container)
+                value = (samples.get(container) or {}).get(key) if status is not None and status.running else None
+                if value is not None:
+                    lines.append('%s{name="%s"} %s' % (name, container, formatValue(value)))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, listen):
+        ''' Start serving the metrics from a background thread and return the server '''
+        from socketserver import ThreadingMixIn
+        from http.server import (BaseHTTPRequestHandler, HTTPServer)
+        exporter = self
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in (METRICS_PATH, '/'):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                logger.debug("metrics: " + fmt % args)
+
+        try:
+            server = Server(parseListenAddress(listen), Handler)
+        except Exception as err:
+            return Fail(err)
+        thread = threading.Thread(target=server.serve_forever, name='dockwrkr-metrics')
+        thread.daemon = True
+        thread.start()
+        return OK(server)
@@ -0,0 +1,99 @@
+"""
+Pidfiles of the managed containers.
+"""
+import os
+import logging
+import tempfile
+
+from dockwrkr.exceptions import FileSystemError
+
+logger = logging.getLogger(__name__)
+
+PIDFILE_EXTENSION = '.pid'
+PIDFILE_MODE = 0o644
+
+
+class PidFiles(object):
+    '''
+    Directory of `<container>.pid` files. Files are replaced atomically, with
+    a temporary file renamed over the pidfile, so readers never see a partly
+    written pid.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def getPath(self, container):
+        return os.path.join(self.directory, "%s%s" % (container, PIDFILE_EXTENSION))
+
+    def read(self, container):
+        ''' Pid recorded for a container, or None when there is no valid pidfile '''
+        try:
+            with open(self.getPath(container)) as fh:
+                return int(fh.read().strip())
+        except (IOError, ValueError):
+            return None
+
+    def readAll(self):
+        ''' Pids recorded in the directory, keyed by container '''
+        try:
+            filenames = os.listdir(self.directory)
+        except FileNotFoundError:
+            return {}
+        return dict((name[:-len(PIDFILE_EXTENSION)], self.read(name[:-len(PIDFILE_EXTENSION)]))
+                    for name in filenames if name.endswith(PIDFILE_EXTENSION) and not name.startswith('.'))
+
+    def write(self, container, pid):
+        tmp = None
+        try:
+            os.makedirs(self.directory, 0o750, exist_ok=True)
+            (fd, tmp) = tempfile.mkstemp(prefix='.%s.' % container, dir=self.directory)
+            with os.fdopen(fd, 'w') as fh:
+                fh.write("%s" % pid)
+            os.chmod(tmp, PIDFILE_MODE)
+            os.replace(tmp, self.getPath(container))
+        except Exception as err:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            raise FileSystemError("Failed to write the pidfile of %s in %s : %s" % (container, self.directory, err))
+
+    def writeMany(self, pids):
+        for (container, pid) in pids.items():
+            self.write(container, pid)
+
+    def remove(self, container):
+        try:
+            os.remove(self.getPath(container))
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            raise FileSystemError("Failed to remove the pidfile of %s in %s : %s" % (container, self.directory, err))
+
+    def removeMany(self, containers):
+        for container in containers:
+            self.remove(container)
+
+    def sync(self, states, dryRun=False):
+        '''
+        Reconcile the directory with the statuses of the managed containers in
+        one pass: running containers get their pidfile, wrong pids are fixed and
+        the pidfiles of other containers are removed. Returns the changes as
+        (container, action, pid) tuples.
+        '''
+        recorded = self.readAll()
+        running = dict((name, status.pid) for (name, status) in states.items() if status.running and status.pid)
+        changes = []
+        for container in sorted(set(recorded) | set(running)):
+            if container not in running:
+                changes.append((container, 'removed', recorded[container]))
+            elif container not in recorded:
+                changes.append((container, 'written', running[container]))
+            elif recorded[container] != running[container]:
+                changes.append((container, 'fixed', running[container]))
+        if not dryRun:
+            for (container, action, pid) in changes:
+                if action == 'removed':
+                    self.remove(container)
+                else:
+                    self.write(container, pid)
+        return changes
@@ -59,8 +59,13 @@ class Shell(object):
     @staticmethod
     def procCommand(cmd, cwd=None, shell=False):
         try:
+            if isinstance(cmd, list):
+                args = cmd
+                cmd = subprocess.list2cmdline(cmd)
+            else:
+                args = shlex.split(cmd)
             logger.debug("COMMAND: %s", cmd)
-            proc = Popen(shlex.split(cmd), shell=shell,
+            proc = Popen(args, shell=shell,
                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
             pout, perr = proc.communicate()
             pout = pout.decode()
@@ -68,7 +73,7 @@ class Shell(object):
             if proc.returncode == 0:
                 return OK({"code": proc.returncode, "stdout": pout, "stderr": perr})
             else:
-                return Fail(ShellCommandError(code=proc.returncode, message=pout, stdout=pout, stderr=perr))
+                return Fail(ShellCommandError(code=proc.returncode, message=pout, stdout=pout, stderr=perr, cmd=cmd))
         except KeyboardInterrupt:
             logger.info("CTRL-C Received...Exiting.")
             return Fail(UserInterruptError(message="User interrupted."))
@@ -124,7 +129,7 @@ class Shell(object):
     def makeDirectory(path, mode=0o750):
         if not os.path.exists(path):
             try:
-                os.makedirs(path, mode)
+                os.makedirs(path, mode, exist_ok=True)
                 return OK(path)
             except Exception as err:
                 return Fail(ShellCommandError(code=1, message="Failed to create %s: %s" % (path, err)))
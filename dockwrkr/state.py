@@ -0,0 +1,302 @@
+"""
+In-process store of the state of managed containers.
+"""
+import copy
+import time
+import queue
+import logging
+import threading
+from collections import (OrderedDict, Counter)
+from collections.abc import Mapping
+
+from dockwrkr.monads import *
+from dockwrkr.exceptions import DockerError
+from dockwrkr.docker import (DOCKWRKR_LABEL_DOMAIN, ContainerStatus)
+
+logger = logging.getLogger(__name__)
+
+# Event actions after which a container is inspected again. `die`, `destroy`
+# and `health_status` carry what they change and are applied without asking
+# the daemon.
+INSPECT_ACTIONS = frozenset(['create', 'start', 'restart', 'pause', 'unpause', 'rename', 'update'])
+
+
+def readEventName(event):
+    attributes = (event.get('Actor') or {}).get('Attributes') or {}
+    return attributes.get("%s.name" % DOCKWRKR_LABEL_DOMAIN) or attributes.get('name')
+
+
+def readEventAction(event):
+    return (event.get('Action') or event.get('status') or '').split(':')[0]
+
+
+def readStoppedStatus(status, exitcode=None):
+    status = copy.copy(status)
+    status.running = False
+    status.pid = None
+    status.ip = None
+    status.startedat = None
+    if exitcode is not None:
+        status.exitcode = exitcode
+    return status
+
+
+class StateStore(object):
+    '''
+    Statuses of the managed containers, keyed by container name.
+
+    Until watch() is called every read takes a snapshot of the requested
+    containers, in one daemon round trip. Once watching, the store is seeded with one snapshot and kept
+    current from the `docker events` stream of managed containers: reads are
+    dictionary lookups, and only the containers named by new events are
+    inspected again, in one call per read.
+    '''
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.states = {}
+        self.pending = queue.Queue()
+        self.lock = threading.RLock()
+        self.syncLock = threading.Lock()
+        self.stream = None
+        self.watcher = None
+        self.changed = threading.Event()
+        self.arrived = threading.Condition()
+        self.received = 0
+        self.stopped = threading.Event()
+        self.starts = Counter()
+
+    def isLive(self):
+        return self.watcher is not None and self.watcher.is_alive()
+
+    def watch(self):
+        ''' Seed the store and follow the events of managed containers from a background thread '''
+        if self.isLive():
+            return OK(self)
+        self.stopped.clear()
+        # Events are replayed from before the snapshot so none fall in between.
+        opened = self.backend.readEvents(since=time.time() - 1)
+        if opened.isFail():
+            return opened
+        self.follow(opened.getOK())
+        seeded = self.snapshot()
+        if seeded.isFail():
+            self.close()
+        return seeded.map(lambda states: self)
+
+    def follow(self, stream):
+        self.stream = stream
+        self.watcher = threading.Thread(target=self.consume, args=(stream,), name='dockwrkr-events')
+        self.watcher.daemon = True
+        self.watcher.start()
+
+    def consume(self, stream):
+        try:
+            for event in stream:
+                self.pending.put(event)
+                self.notify()
+        except Exception as err:
+            logger.debug("Docker events stream failed: %s" % err)
+        logger.debug("Docker events stream closed.")
+        self.stopped.set()
+        self.notify()
+
+    def notify(self):
+        self.changed.set()
+        with self.arrived:
+            self.received += 1
+            self.arrived.notify_all()
+
+    def close(self):
+        self.stopped.set()
+        with self.arrived:
+            self.arrived.notify_all()
+        stream = self.stream
+        self.stream = None
+        if stream:
+            stream.close()
+        if self.watcher:
+            self.watcher.join(5)
+            self.watcher = None
+
+    def snapshot(self):
+        ''' Replace the store with the state of every managed container '''
+        return self.backend.readStateSnapshot() \
+            .bind(self.setStates)
+
+    def setStates(self, states):
+        with self.lock:
+            self.states = dict(states)
+            return OK(dict(self.states))
+
+    def read(self, containers):
+        ''' Statuses of the existing containers among `containers` '''
+        if not self.isLive():
+            return self.backend.readStateSnapshot(containers) \
+                .bind(self.updateStates, containers=containers)
+        return self.sync() \
+            .map(lambda changed: self.lookup(containers))
+
+    def lookup(self, containers):
+        with self.lock:
+            return dict((c, self.states[c]) for c in containers if c in self.states)
+
+    def updateStates(self, states, containers=[]):
+        with self.lock:
+            for container in containers:
+                self.states.pop(container, None)
+            self.states.update(states)
+        return OK(states)
+
+    def get(self, container):
+        ''' Last known status of a container, or None '''
+        if self.isLive():
+            self.sync()
+        with self.lock:
+            return self.states.get(container)
+
+    def readStarts(self):
+        ''' Start events seen for each container while watching '''
+        with self.lock:
+            return dict(self.starts)
+
+    def waitForChanges(self, timeout=None):
+        ''' Block until events arrive or `timeout` seconds pass, then return the names of the changed containers '''
+        self.changed.wait(timeout)
+        self.changed.clear()
+        return self.sync()
+
+    def waitUntil(self, container, check, timeout):
+        '''
+        Call `check` with the status of a container, then again every time
+        events arrive, until it returns a Try. Returns that Try, or None when
+        `timeout` seconds pass first. Any number of threads can wait at once;
+        close() ends every wait.
+        '''
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.arrived:
+                received = self.received
+            synced = self.sync()
+            if synced.isFail():
+                return synced
+            with self.lock:
+                result = check(self.states.get(container))
+            if result is not None:
+                return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if self.stopped.is_set() or not self.isLive():
+                return Fail(DockerError(message="The docker events stream has ended."))
+            with self.arrived:
+                if self.received == received and not self.stopped.is_set():
+                    self.arrived.wait(remaining)
+
+    def sync(self):
+        '''
+        Apply the events received since the last read and return the names of
+        the changed containers. Lookups are only blocked while the statuses are
+        updated, never while containers are inspected again.
+        '''
+        with self.syncLock:
+            events = []
+            while True:
+                try:
+                    events.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            changed = OrderedDict()
+            inspect = OrderedDict()
+            with self.lock:
+                for event in events:
+                    name = readEventName(event)
+                    action = readEventAction(event)
+                    if not name:
+                        continue
+                    if action == 'start':
+                        self.starts[name] += 1
+                    if action == 'destroy':
+                        self.states.pop(name, None)
+                        inspect.pop(name, None)
+                    elif action == 'die' and name in self.states and name not in inspect:
+                        self.states[name] = self.readStopped(self.states[name], event)
+                    elif action == 'health_status' and name in self.states and name not in inspect:
+                        self.states[name] = self.readHealth(self.states[name], event)
+                    elif action in INSPECT_ACTIONS or name not in self.states:
+                        inspect[name] = True
+                    else:
+                        continue
+                    changed[name] = True
+
+            if inspect:
+                names = list(inspect)
+                refreshed = self.backend.readStateSnapshot(names) \
+                    .bind(self.updateStates, containers=names)
+                if refreshed.isFail():
+                    return refreshed
+            return OK(list(changed))
+
+    def readStopped(self, status, event):
+        attributes = (event.get('Actor') or {}).get('Attributes') or {}
+        exitcode = attributes.get('exitCode')
+        return readStoppedStatus(status, int(exitcode) if exitcode is not None else None)
+
+    def readHealth(self, status, event):
+        status = copy.copy(status)
+        status.health = (event.get('Action') or '').split(':', 1)[-1].strip() or None
+        return status
+
+
+class CommandState(Mapping):
+    '''
+    Container statuses for the span of one command. It starts from a snapshot
+    and records the effect of every create, start, stop and remove the command
+    performs, so later steps read it instead of asking the daemon again.
+    `started` and `stopped` hold the containers whose pidfiles change and
+    `networks` the existing networks once they have been reconciled.
+    '''
+
+    def __init__(self, states=None):
+        self.states = dict(states or {})
+        self.started = OrderedDict()
+        self.stopped = OrderedDict()
+        self.networks = None
+
+    def __getitem__(self, container):
+        return self.states[container]
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __len__(self):
+        return len(self.states)
+
+    def recordCreated(self, container):
+        status = ContainerStatus(container)
+        status.running = False
+        self.states[container] = status
+
+    def recordStarted(self, containers, statuses={}):
+        ''' Mark containers running, with their full status when it was read after the start '''
+        for container in containers:
+            self.started[container] = True
+            self.stopped.pop(container, None)
+            if container in statuses:
+                self.states[container] = statuses[container]
+                continue
+            status = copy.copy(self.states.get(container) or ContainerStatus(container))
+            status.running = True
+            status.pid = None
+            self.states[container] = status
+
+    def recordStopped(self, container):
+        self.stopped[container] = True
+        self.started.pop(container, None)
+        if container in self.states:
+            self.states[container] = readStoppedStatus(self.states[container])
+
+    def recordRemoved(self, container):
+        self.recordStopped(container)
+        self.states.pop(container, None)
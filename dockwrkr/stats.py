@@ -0,0 +1,266 @@
+"""
+Resource usage samples of the managed containers.
+"""
+import os
+import re
+import math
+import logging
+from time import monotonic
+from collections import (OrderedDict, deque)
+
+logger = logging.getLogger(__name__)
+
+STATS_METRICS = ['cpu', 'mem', 'memlimit', 'netrx', 'nettx', 'blockread', 'blockwrite', 'pids']
+STATS_BUFFER_SIZE = 3600
+
+SIZE_UNITS = {
+    '': 1, 'b': 1,
+    'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3, 'tb': 1000 ** 4,
+    'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3, 'tib': 1024 ** 4,
+}
+SIZE_PATTERN = re.compile(r'^\s*([0-9.]+)\s*([a-z]*)\s*$', re.I)
+
+
+def parseSize(value):
+    ''' Bytes in a size printed by `docker stats`: decimal (kB, MB) or binary (KiB, MiB) units '''
+    match = SIZE_PATTERN.match(value or '')
+    if not match or match.group(2).lower() not in SIZE_UNITS:
+        return None
+    return int(round(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()]))
+
+
+def parsePercent(value):
+    try:
+        return float((value or '').strip().rstrip('%'))
+    except ValueError:
+        return None
+
+
+def parsePair(value):
+    ''' Both sides of a `used / total` or `in / out` column, in bytes '''
+    (left, sep, right) = (value or '').partition('/')
+    return (parseSize(left), parseSize(right) if sep else None)
+
+
+def parseStatsRecord(record):
+    ''' Numeric sample from one `docker stats --format '{{json .}}'` line '''
+    (mem, memlimit) = parsePair(record.get('MemUsage'))
+    (netrx, nettx) = parsePair(record.get('NetIO'))
+    (blockread, blockwrite) = parsePair(record.get('BlockIO'))
+    try:
+        pids = int(record.get('PIDs'))
+    except (TypeError, ValueError):
+        pids = None
+    return OrderedDict([
+        ('cpu', parsePercent(record.get('CPUPerc'))),
+        ('mem', mem),
+        ('memlimit', memlimit),
+        ('netrx', netrx),
+        ('nettx', nettx),
+        ('blockread', blockread),
+        ('blockwrite', blockwrite),
+        ('pids', pids),
+    ])
+
+
+def percentile(values, rank):
+    ''' Nearest-rank percentile of sorted values '''
+    if not values:
+        return None
+    return values[max(0, int(math.ceil(rank / 100.0 * len(values))) - 1)]
+
+
+class StatsBuffer(object):
+    '''
+    Last `size` samples of each container. Older samples are dropped as new
+    ones come in, so memory stays bounded however long the sampling runs.
+    '''
+
+    def __init__(self, size=STATS_BUFFER_SIZE):
+        self.size = size
+        self.samples = OrderedDict()
+
+    def add(self, samples):
+        for (container, sample) in samples.items():
+            if container not in self.samples:
+                self.samples[container] = deque(maxlen=self.size)
+            self.samples[container].append(sample)
+
+    def count(self, container):
+        return len(self.samples.get(container, ()))
+
+    def summarize(self):
+        ''' Min, mean and p95 of every metric, as records in container order '''
+        records = []
+        for (container, samples) in self.samples.items():
+            for metric in STATS_METRICS:
+                values = sorted(s[metric] for s in samples if s.get(metric) is not None)
+                if not values:
+                    continue
+                records.append(OrderedDict([
+                    ('name', container),
+                    ('metric', metric),
+                    ('samples', len(values)),
+                    ('min', values[0]),
+                    ('mean', sum(values) / float(len(values))),
+                    ('p95', percentile(values, 95)),
+                ]))
+        return records
+
+
+class CgroupStats(object):
+    '''
+    Stats read straight from the cgroup filesystem, without going through the
+    daemon. Containers are found through the cgroup of their main process in
+    `/proc/<pid>/cgroup`; both the v1 per-controller hierarchies and the v2
+    unified hierarchy are supported. The CPU usage is a rate, computed from
+    the delta with the previous read of the same container, so the first read
+    of a container has none.
+    '''
+
+    def __init__(self, root='/sys/fs/cgroup', proc='/proc', clock=monotonic):
+        self.root = root
+        self.proc = proc
+        self.clock = clock
+        self.previous = {}
+
+    def isAvailable(self):
+        ''' Whether the daemon runs on this host and its cgroups can be read '''
+        host = os.environ.get('DOCKER_HOST')
+        if host and not host.startswith('unix://'):
+            return False
+        return os.path.isdir(self.root) and os.path.exists(os.path.join(self.proc, 'self', 'cgroup'))
+
+    def read(self, pids):
+        ''' Samples of the containers, given as name to pid; containers whose process is gone are left out '''
+        samples = OrderedDict()
+        for (container, pid) in pids.items():
+            paths = self.readPaths(pid)
+            if paths is None:
+                self.previous.pop(container, None)
+                continue
+            if 'memory' in paths:
+                sample = self.readV1(paths)
+            elif '' in paths:
+                sample = self.readV2(paths[''])
+            else:
+                continue
+            (sample['netrx'], sample['nettx']) = self.readNetwork(pid)
+            sample['cpu'] = self.readCpuRate(container, sample.pop('cpuusage'))
+            samples[container] = OrderedDict((metric, sample.get(metric)) for metric in STATS_METRICS)
+        return samples
+
+    def readPaths(self, pid):
+        ''' Directory of each controller of a process, with '' for the v2 unified hierarchy '''
+        lines = readLines(os.path.join(self.proc, str(pid), 'cgroup'))
+        if lines is None:
+            return None
+        paths = {}
+        for line in lines:
+            (hierarchy, controllers, path) = line.split(':', 2)
+            if not controllers:
+                paths[''] = os.path.join(self.root, path.lstrip('/'))
+                continue
+            for controller in controllers.split(','):
+                paths[controller.replace('name=', '')] = os.path.join(self.root, controllers, path.lstrip('/'))
+        return paths
+
+    def readV2(self, path):
+        memory = readFlatKeys(os.path.join(path, 'memory.stat'))
+        cpu = readFlatKeys(os.path.join(path, 'cpu.stat'))
+        (blockread, blockwrite) = readIoStat(os.path.join(path, 'io.stat'))
+        return {
+            'cpuusage': cpu['usage_usec'] * 1000 if 'usage_usec' in cpu else None,
+            'mem': subtract(readInt(os.path.join(path, 'memory.current')), memory.get('inactive_file')),
+            'memlimit': readInt(os.path.join(path, 'memory.max')),
+            'blockread': blockread,
+            'blockwrite': blockwrite,
+            'pids': readInt(os.path.join(path, 'pids.current')),
+        }
+
+    def readV1(self, paths):
+        def path(controller, filename):
+            return os.path.join(paths[controller], filename) if controller in paths else None
+        ops = [line.split() for line in readLines(path('blkio', 'blkio.throttle.io_service_bytes')) or []]
+        ops = [op for op in ops if len(op) == 3 and op[2].isdigit()]
+        return {
+            'cpuusage': readInt(path('cpuacct', 'cpuacct.usage')),
+            'mem': subtract(readInt(path('memory', 'memory.usage_in_bytes')),
+                            readFlatKeys(path('memory', 'memory.stat')).get('total_inactive_file')),
+            'memlimit': readInt(path('memory', 'memory.limit_in_bytes')),
+            'blockread': sum(int(op[2]) for op in ops if op[1] == 'Read') if ops else None,
+            'blockwrite': sum(int(op[2]) for op in ops if op[1] == 'Write') if ops else None,
+            'pids': readInt(path('pids', 'pids.current')),
+        }
+
+    def readNetwork(self, pid):
+        ''' Bytes received and sent on the interfaces of the network namespace of a process, loopback aside '''
+        lines = readLines(os.path.join(self.proc, str(pid), 'net', 'dev'))
+        if lines is None:
+            return (None, None)
+        (rx, tx) = (0, 0)
+        for line in lines[2:]:
+            (interface, sep, counters) = line.partition(':')
+            counters = counters.split()
+            if interface.strip() == 'lo' or len(counters) < 9:
+                continue
+            rx += int(counters[0])
+            tx += int(counters[8])
+        return (rx, tx)
+
+    def readCpuRate(self, container, usage):
+        ''' Percent of one CPU used since the previous read, like `docker stats` '''
+        now = self.clock()
+        previous = self.previous.get(container)
+        self.previous[container] = (usage, now)
+        if usage is None or previous is None or previous[0] is None or now <= previous[1]:
+            return None
+        return max(0.0, (usage - previous[0]) / ((now - previous[1]) * 1e9) * 100.0)
+
+
+def readLines(path):
+    if not path:
+        return None
+    try:
+        with open(path) as fh:
+            return [line.rstrip('\n') for line in fh if line.strip()]
+    except (IOError, OSError):
+        return None
+
+
+def readInt(path):
+    ''' Integer in a single-value cgroup file; None when it is missing or unlimited ('max') '''
+    lines = readLines(path)
+    try:
+        return int(lines[0]) if lines else None
+    except ValueError:
+        return None
+
+
+def readFlatKeys(path):
+    ''' `key value` lines of files such as cpu.stat and memory.stat '''
+    values = {}
+    for line in readLines(path) or []:
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            values[parts[0]] = int(parts[1])
+    return values
+
+
+def readIoStat(path):
+    ''' Bytes read and written over all devices of a v2 io.stat '''
+    lines = readLines(path)
+    if lines is None:
+        return (None, None)
+    (read, written) = (0, 0)
+    for line in lines:
+        fields = dict(field.split('=', 1) for field in line.split()[1:] if '=' in field)
+        read += int(fields.get('rbytes', 0))
+        written += int(fields.get('wbytes', 0))
+    return (read, written)
+
+
+def subtract(value, other):
+    if value is None:
+        return None
+    return max(0, value - (other or 0))
@@ -8,8 +8,6 @@ import hashlib
 from time import time
 from datetime import datetime
 from math import floor
-from pkg_resources import Requirement, resource_filename, require
-import yaml
 
 try:  # py3
     from shlex import quote
@@ -24,7 +22,9 @@ from dockwrkr.exceptions import (
 
 logger = logging.getLogger(__name__)
 
-_yaml_mapping_tag = yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG
+_yaml = None
+_yamlLoader = None
+_yamlDumper = None
 
 
 def _dict_representer(dumper, data):
@@ -35,12 +35,31 @@ def _dict_constructor(loader, node):
     return collections.OrderedDict(loader.construct_pairs(node))
 
 
-yaml.add_representer(collections.OrderedDict, _dict_representer)
-yaml.add_constructor(_yaml_mapping_tag, _dict_constructor)
+def importYAML():
+    '''
+    Import yaml on first use and set up the loader and dumper used by
+    readYAML and writeYAML: mappings keep their order, and the libyaml
+    parser is used when PyYAML was built with it.
+    '''
+    global _yaml, _yamlLoader, _yamlDumper
+    if _yaml is None:
+        import yaml
+
+        class OrderedLoader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
+            pass
+
+        class OrderedDumper(yaml.Dumper):
+            pass
+
+        OrderedLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, _dict_constructor)
+        OrderedDumper.add_representer(collections.OrderedDict, _dict_representer)
+        (_yaml, _yamlLoader, _yamlDumper) = (yaml, OrderedLoader, OrderedDumper)
+    return _yaml
 
 
 def getPackageVersion():
-    return require('dockwrkr')[0].version
+    from dockwrkr._version import __version__
+    return __version__
 
 
 def ensureList(v):
@@ -122,20 +141,21 @@ def writeToFile(data, filename):
 
 
 def writeYAML(filename, data):
+    yaml = importYAML()
     try:
         with open(filename, "w") as fileh:
-            fileh.write(yaml.dump(data, default_flow_style=False))
+            fileh.write(yaml.dump(data, Dumper=_yamlDumper, default_flow_style=False))
     except Exception as err:
         raise FileSystemError("Failed to write to %s : %s" % (filename, err))
 
 
 def readYAML(filename):
+    yaml = importYAML()
     try:
-        stream = open(filename, "r")
-        contents = yaml.safe_load(stream)
-        return contents
+        with open(filename, "r") as stream:
+            return yaml.load(stream, Loader=_yamlLoader)
     except yaml.YAMLError as exc:
-        msg = "Syntax error in file %s"
+        msg = "Syntax error in file %s" % filename
         if hasattr(exc, 'problem_mark'):
             #pylint: disable=E1101
             mark = exc.problem_mark
@@ -152,7 +172,7 @@ def humanReadableBytes(num):
         if num < 1024.0:
             return "%3.1f%s" % (num, x)
         num /= 1024.0
-        return "%3.1f%s" % (num, 'TB')
+    return "%3.1f%s" % (num, 'TB')
 
 
 def sha1sum(filename):
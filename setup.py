@@ -18,7 +18,7 @@ setup(name='dockwrkr',
       long_description_content_type='text/markdown',
       install_requires=install_requires,
       test_suite='tests',
-      packages=find_packages(),
+      packages=find_packages(exclude=['benchmarks']),
       python_requires='>=3',
       entry_points={
           'console_scripts': [
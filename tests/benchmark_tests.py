@@ -0,0 +1,34 @@
+import tests
+from collections import OrderedDict
+
+from benchmarks import suite
+
+
+class TestBenchmarkSuite(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        self.services = OrderedDict([
+            ('web', {'image': 'nginx', 'link': ['db']}),
+            ('db', {'image': 'postgres'}),
+        ])
+        self.ws.writeConfig(self.services)
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def testStartAndStatusAgainstFakeClient(self):
+        with self.ws.activate():
+            core = self.ws.getCore()
+            self.assertTrue(core.start(all=True, jobs=2).isOK())
+            table = core.status().getOK()
+            core.stop(['web']).getOK()
+            stopped = core.status().getOK()
+        self.assertEqual(['db', 'web'], sorted(row[0] for row in table))
+        self.assertTrue(all(row[2] != '-' for row in table))
+        self.assertEqual('-', dict((row[0], row[2]) for row in stopped)['web'])
+
+    def testCompareResults(self):
+        baseline = {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}}
+        results = OrderedDict([('a', {'seconds': 1.1}), ('b', {'seconds': 2.0}), ('c', {'seconds': 9.0})])
+        self.assertEqual(['b'], suite.compareResults(results, baseline, 0.25))
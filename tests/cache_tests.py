@@ -0,0 +1,70 @@
+import os
+import tests
+
+from dockwrkr.core import Core
+from dockwrkr.cache import ConfigCache
+from dockwrkr.monads import *
+
+CONFIG = """
+containers:
+  web:
+    image: nginx
+    link: db
+  db:
+    image: postgres
+"""
+
+
+class TestConfigCache(tests.TestBase):
+
+    def setUp(self):
+        self.basePath = self.addTemporaryDir()
+        self.configFile = os.path.join(self.basePath, 'dockwrkr.yml')
+        self.cacheDir = os.path.join(self.basePath, 'cache')
+        self.writeConfig(CONFIG)
+
+    def tearDown(self):
+        self.clearTemporaryDirs()
+
+    def writeConfig(self, contents):
+        with open(self.configFile, 'w') as fh:
+            fh.write(contents)
+
+    def getCore(self, cache=True):
+        core = Core()
+        core.configFile = self.configFile
+        core.configCache = ConfigCache(self.cacheDir) if cache else None
+        self.assertIsInstance(core.initialize(), OK)
+        return core
+
+    def readEntry(self):
+        cache = ConfigCache(self.cacheDir)
+        return cache.read(self.configFile, ConfigCache.readFingerprint(self.configFile))
+
+    def testRoundTrip(self):
+        self.assertIsNone(self.readEntry())
+        self.getCore()
+        entry = self.readEntry()
+        self.assertEqual(['db', 'web'], entry['graph'].order)
+
+        core = self.getCore()
+        self.assertEqual(['db'], core.getGraph().getDependencies('web'))
+        self.assertEqual('postgres', core.getContainerImage('db'))
+
+    def testInvalidation(self):
+        self.getCore()
+        self.writeConfig(CONFIG.replace('nginx', 'httpd'))
+        self.assertIsNone(self.readEntry())
+        core = self.getCore()
+        self.assertEqual('httpd', core.getContainerImage('web'))
+        self.assertIsNotNone(self.readEntry())
+
+    def testCorruptEntryIsIgnored(self):
+        self.getCore()
+        with open(ConfigCache(self.cacheDir).getEntryPath(self.configFile), 'wb') as fh:
+            fh.write(b'garbage')
+        self.assertEqual('nginx', self.getCore().getContainerImage('web'))
+
+    def testDisabled(self):
+        self.getCore(cache=False)
+        self.assertFalse(os.path.exists(self.cacheDir))
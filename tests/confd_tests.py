@@ -0,0 +1,73 @@
+import os
+import tests
+from collections import OrderedDict
+
+from dockwrkr.core import Core
+from dockwrkr.cache import ConfigCache
+from dockwrkr.utils import readYAML
+from dockwrkr.exceptions import InvalidConfigError
+
+
+class TestConfigDirectory(tests.TestBase):
+
+    def setUp(self):
+        self.basePath = self.addTemporaryDir()
+        self.cacheDir = os.path.join(self.basePath, 'cache')
+        self.writeFile('dockwrkr.yml', "containers:\n  db:\n    image: postgres\n")
+        self.writeFile('conf.d/containers/web.yml', "image: nginx\nlink:\n  - cache\n  - db\n")
+        self.writeFile('conf.d/containers/cache.yml', "image: redis\n")
+        self.writeFile('conf.d/containers/cron.yml', "image: cron\nautostart: false\n")
+        self.writeFile('conf.d/jobs/migrate.yml', "image: web\nlink: db\n")
+
+    def tearDown(self):
+        self.clearTemporaryDirs()
+
+    def writeFile(self, name, contents):
+        path = os.path.join(self.basePath, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fh:
+            fh.write(contents)
+
+    def getCore(self):
+        core = Core()
+        core.configFile = os.path.join(self.basePath, 'dockwrkr.yml')
+        core.configCache = ConfigCache(self.cacheDir)
+        result = core.initialize()
+        if result.isFail():
+            raise result.getError()
+        return core
+
+    def testOrderedLoader(self):
+        self.writeFile('ordered.yml', "b: 1\na: 2\nc:\n  z: 1\n  y: 2\n")
+        config = readYAML(os.path.join(self.basePath, 'ordered.yml'))
+        self.assertIsInstance(config, OrderedDict)
+        self.assertEqual(['b', 'a', 'c'], list(config.keys()))
+        self.assertEqual(['z', 'y'], list(config['c'].keys()))
+
+    def testServicesAreMerged(self):
+        core = self.getCore()
+        self.assertEqual(['db', 'cache', 'cron', 'web'], list(core.getServicesConfig()))
+        self.assertEqual(['db', 'cache', 'web'], core.getDefinedServices(core._Core__start, all=True))
+        self.assertEqual(['db', 'migrate'], core.getDefinedJobs())
+        self.assertEqual('nginx', core.getContainerImage('web'))
+
+    def testOnlyTouchedFilesAreParsed(self):
+        self.getCore()
+        core = self.getCore()
+        self.assertEqual(['cache', 'db'], core.getGraph().getDependencies('web'))
+        self.assertEqual({}, core.configIndex.loaded)
+        self.assertEqual('redis', core.getContainerImage('cache'))
+        self.assertEqual(['cache.yml'], [os.path.basename(x) for x in core.configIndex.loaded])
+
+    def testChangedFilesAreReindexed(self):
+        self.getCore()
+        self.writeFile('conf.d/containers/cache.yml', "image: redis\nlink: db\n")
+        core = self.getCore()
+        self.assertEqual(['db'], core.getGraph().getDependencies('cache'))
+        self.assertEqual(['cache.yml'], [os.path.basename(x) for x in core.configIndex.loaded])
+
+    def testDuplicateDefinition(self):
+        self.writeFile('conf.d/containers/db.yml', "image: mysql\n")
+        with self.assertRaises(InvalidConfigError):
+            self.getCore()
@@ -0,0 +1,112 @@
+import os
+import stat
+import tests
+
+import dockwrkr.docker as docker
+from dockwrkr.exceptions import (DockerError, ShellCommandError, InvalidConfigError)
+from dockwrkr.monads import *
+
+
+class TestDockerBatch(tests.TestBase):
+
+    def testChunkArguments(self):
+        names = ["container%02d" % i for i in range(10)]
+        # Each name costs 12 bytes plus the pointer: 20 bytes.
+        chunks = docker.chunkArguments(names, base=[], limit=70)
+        self.assertEqual([names[0:3], names[3:6], names[6:9], names[9:]], chunks)
+        self.assertEqual([names], docker.chunkArguments(names, base=['docker', 'start']))
+        self.assertEqual([], docker.chunkArguments([], base=['docker', 'start']))
+
+    def testChunkArgumentsOversized(self):
+        self.assertEqual([['a' * 100], ['b']], docker.chunkArguments(['a' * 100, 'b'], limit=50))
+
+    def testParseBatchSuccess(self):
+        results = docker.parseBatchResult(['web', 'db'], OK({'code': 0, 'stdout': 'web\ndb', 'stderr': ''}))
+        self.assertEqual(['web', 'db'], list(results.keys()))
+        self.assertTrue(all(r.isOK() for r in results.values()))
+
+    def testParseBatchPartialFailure(self):
+        err = ShellCommandError(
+            code=1,
+            stdout="web\nweb2\n",
+            stderr="Error response from daemon: No such container: db\nError: failed to start containers: db\n",
+            cmd="docker start web db web2")
+        results = docker.parseBatchResult(['web', 'db', 'web2'], Fail(err))
+        self.assertIsInstance(results['web'], OK)
+        self.assertIsInstance(results['web2'], OK)
+        error = results['db'].getError()
+        self.assertIsInstance(error, DockerError)
+        self.assertEqual(1, error.code)
+        self.assertIn("No such container: db", error.stderr)
+
+    def testParseBatchFailureWithoutDetails(self):
+        err = ShellCommandError(code=1, stdout="", stderr="Cannot connect to the Docker daemon", cmd="docker stop a b")
+        results = docker.parseBatchResult(['a', 'b'], Fail(err))
+        self.assertEqual("Cannot connect to the Docker daemon", results['a'].getError().stderr)
+        self.assertEqual("Cannot connect to the Docker daemon", results['b'].getError().stderr)
+
+    def testBatchCommand(self):
+        script = os.path.join(self.addTemporaryDir(), "docker")
+        with open(script, "w") as fh:
+            fh.write("#!/bin/sh\n"
+                     "shift\n"
+                     "for name in \"$@\"; do\n"
+                     "  case \"$name\" in\n"
+                     "    bad*) echo \"Error: No such container: $name\" >&2; rc=1 ;;\n"
+                     "    *) echo \"$name\" ;;\n"
+                     "  esac\n"
+                     "done\n"
+                     "exit ${rc:-0}\n")
+        os.chmod(script, stat.S_IRWXU)
+        previous = docker.DOCKER_CLIENT
+        docker.DOCKER_CLIENT = script
+        try:
+            results = docker.startMany(['one', 'bad1', 'two'])
+        finally:
+            docker.DOCKER_CLIENT = previous
+            self.clearTemporaryDirs()
+        self.assertIsInstance(results['one'], OK)
+        self.assertIsInstance(results['two'], OK)
+        self.assertIn("bad1", results['bad1'].getError().stderr)
+
+
+class TestContainerSpec(tests.TestBase):
+
+    def setUp(self):
+        docker.clearSpecCache()
+        self.config = {
+            'image': 'nginx:1.2',
+            'hostname': 'web',
+            'privileged': 'yes',
+            'publish': ['80:80', 443],
+            'env': {'A': 'x y', 'B': '1'},
+            'volume': ['logs:/var/log', '/data:/data'],
+            'memory-swap': '1g',
+            'extra-flags': ['--interactive', '--ulimit nofile=1024'],
+            'command': 'nginx -g "daemon off;"',
+            'autostart': False,
+        }
+
+    def testArgv(self):
+        spec = docker.compileSpec('web', self.config, basePath='/srv').getOK()
+        self.assertEqual((
+            '--hostname=web', '--privileged=true', '--memory-swap=1g', '--name=web',
+            '--publish=80:80', '--publish=443',
+            '--env=A=x y', '--env=B=1', '--volume=/srv/logs:/var/log', '--volume=/data:/data',
+            '--interactive', '--ulimit', 'nofile=1024',
+            '--label', 'ca.turbulent.dockwrkr.name=web', '--label', 'ca.turbulent.dockwrkr.managed=1',
+            'nginx:1.2', 'nginx', '-g', 'daemon off;'), spec.argv)
+        self.assertIn("'--env=A=x y'", spec.getCommandLine())
+        self.assertEqual(['sh', '-c', 'echo hi'], list(docker.compileSpec(
+            'job', {'image': 'busybox', 'command': ['sh', '-c', 'echo hi']}).getOK().argv[-3:]))
+
+    def testImmutableAndMemoized(self):
+        spec = docker.compileSpec('web', self.config, basePath='/srv').getOK()
+        with self.assertRaises(AttributeError):
+            spec.image = 'httpd'
+        self.assertIs(spec, docker.compileSpec('web', dict(self.config), basePath='/srv').getOK())
+        self.assertIsNot(spec, docker.compileSpec('web', self.config, basePath='/tmp').getOK())
+
+    def testInvalid(self):
+        for config in ({'hostname': 'web'}, {'image': 'nginx', 'bogus': 1}, {'image': 'nginx', 'privileged': 'maybe'}):
+            self.assertIsInstance(docker.compileSpec('web', config).getError(), InvalidConfigError)
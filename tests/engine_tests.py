@@ -0,0 +1,196 @@
+import os
+import json
+import base64
+import threading
+import tests
+import socketserver
+from http.server import BaseHTTPRequestHandler
+
+import dockwrkr.docker as docker
+import dockwrkr.engine as engine
+from dockwrkr.monads import *
+from dockwrkr.exceptions import InvalidConfigError
+
+
+class FakeDaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path, self.client_address))
+        if self.path.startswith('/v1.25/containers/web/json'):
+            self.reply(200, {
+                'Name': '/web', 'Id': 'abcdef0123456789',
+                'Config': {'Image': 'nginx', 'Labels': {'ca.turbulent.dockwrkr.managed': '1'}},
+                'State': {'Running': False, 'Pid': 0, 'ExitCode': 137, 'Error': ''},
+                'NetworkSettings': {'IPAddress': '', 'Ports': {}},
+            })
+        elif self.path.startswith('/v1.25/containers/json'):
+            self.reply(200, [{'Labels': {'ca.turbulent.dockwrkr.name': 'web'}}])
+        else:
+            self.reply(404, {'message': 'No such container'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode()) if length else None
+        self.server.requests.append(('POST', self.path, body))
+        if self.path.startswith('/v1.25/images/create'):
+            self.reply(200, {'status': 'Downloaded newer image'})
+        elif self.path.startswith('/v1.25/containers/create'):
+            self.reply(201, {'Id': 'abcdef'})
+        elif self.path.startswith('/v1.25/containers/missing'):
+            self.reply(404, {'message': 'No such container: missing'})
+        else:
+            self.reply(204)
+
+
+class FakeDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        socketserver.UnixStreamServer.__init__(self, path, FakeDaemonHandler)
+        self.requests = []
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        socketserver.ThreadingMixIn.process_request(self, request, client_address)
+
+
+class TestEngineBackend(tests.TestBase):
+
+    def setUp(self):
+        self.basePath = self.addTemporaryDir()
+        self.socketPath = os.path.join(self.basePath, 'docker.sock')
+        self.daemon = FakeDaemon(self.socketPath)
+        threading.Thread(target=self.daemon.serve_forever, daemon=True).start()
+        self.previousHost = os.environ.get('DOCKER_HOST')
+        os.environ['DOCKER_HOST'] = 'unix://%s' % self.socketPath
+        engine._pool = None
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        engine._pool = None
+        if self.previousHost is None:
+            del os.environ['DOCKER_HOST']
+        else:
+            os.environ['DOCKER_HOST'] = self.previousHost
+        self.clearTemporaryDirs()
+
+    def testBackendSelection(self):
+        self.assertIs(engine, docker.loadBackend('api'))
+        self.assertIs(docker, docker.loadBackend('cli'))
+        os.environ['DOCKER_HOST'] = 'tcp://127.0.0.1:2375'
+        self.assertIs(docker, docker.loadBackend('api'))
+        with self.assertRaises(InvalidConfigError):
+            docker.loadBackend('nope')
+
+    def testKeepAlive(self):
+        for _ in range(5):
+            self.assertIsInstance(engine.start('web'), OK)
+        self.assertEqual(1, self.daemon.connections)
+
+    def testReadStatus(self):
+        self.assertEqual(OK(['web']), engine.readManagedContainers())
+        status = engine.readContainersStatus(['web']).getOK()['web']
+        self.assertEqual('abcdef012345', status.cid)
+        self.assertFalse(status.running)
+        self.assertEqual(137, status.exitcode)
+        self.assertEqual(['web'], list(engine.readStateSnapshot(['web', 'missing']).getOK()))
+
+    def testErrors(self):
+        result = engine.stop('missing', time=0)
+        self.assertIsInstance(result, Fail)
+        self.assertEqual(404, result.getError().code)
+        results = engine.startMany(['web', 'missing'])
+        self.assertIsInstance(results['web'], OK)
+        self.assertIsInstance(results['missing'], Fail)
+
+    def testCreate(self):
+        config = {'image': 'nginx:1.2', 'env': {'A': 'x y'}, 'publish': ['127.0.0.1:8080:80'], 'command': 'nginx -g "daemon off;"'}
+        self.assertIsInstance(engine.create('web', config, basePath=self.basePath), OK)
+        (method, path, body) = self.daemon.requests[-1]
+        self.assertEqual('/v1.25/containers/create?name=web', path)
+        self.assertEqual('nginx:1.2', body['Image'])
+        self.assertEqual(['nginx', '-g', 'daemon off;'], body['Cmd'])
+        self.assertEqual(['A=x y'], body['Env'])
+        self.assertEqual([{'HostIp': '127.0.0.1', 'HostPort': '8080'}], body['HostConfig']['PortBindings']['80/tcp'])
+        self.assertEqual('1', body['Labels']['ca.turbulent.dockwrkr.managed'])
+
+    def testCreateStopsOnNetworkFailure(self):
+        # The fake daemon answers network creation with 204 instead of 201.
+        config = {'image': 'nginx', 'net': 'backend'}
+        result = engine.create('web', config, basePath=self.basePath, networks={'backend': {'driver': 'bridge'}},
+                               existingNetworks=set())
+        self.assertIsInstance(result, Fail)
+        self.assertEqual(['/v1.25/networks/create'], [r[1] for r in self.daemon.requests])
+
+    def testPull(self):
+        digest = 'sha256:' + 'a' * 64
+        self.assertIsInstance(engine.pull('nginx:1.2'), OK)
+        self.assertIsInstance(engine.pull('nginx@%s' % digest), OK)
+        paths = [r[1] for r in self.daemon.requests]
+        self.assertEqual(['/v1.25/images/create?fromImage=nginx&tag=1.2',
+                          '/v1.25/images/create?fromImage=nginx%%40sha256%%3A%s' % ('a' * 64)], paths)
+
+    def testRegistryAuth(self):
+        os.environ['DOCKER_CONFIG'] = self.basePath
+        try:
+            with open(os.path.join(self.basePath, 'config.json'), 'w') as fh:
+                json.dump({'auths': {docker.DOCKER_DEFAULT_REGISTRY: {'auth': 'dXNlcjpzZWNyZXQ='}}}, fh)
+            credentials = json.loads(base64.urlsafe_b64decode(engine.readRegistryAuth(None)).decode())
+        finally:
+            del os.environ['DOCKER_CONFIG']
+        self.assertEqual({'username': 'user', 'password': 'secret', 'serveraddress': docker.DOCKER_DEFAULT_REGISTRY},
+                         credentials)
+
+
+class TestEnginePayload(tests.TestBase):
+
+    def readPayload(self, config):
+        params = docker.readCreateParameters('web', config, basePath='/tmp', asList=True).getOK()
+        return engine.readCreatePayload('web', params)
+
+    def testOptions(self):
+        (name, body) = self.readPayload({
+            'image': 'nginx',
+            'restart': 'on-failure:3',
+            'memory': '512m',
+            'privileged': True,
+            'net': 'backend',
+            'ip': '10.0.0.2',
+            'volume': ['/data:/data'],
+            'link': ['db:db'],
+            'extra-flags': ['--interactive', '--ulimit=nofile=1024:2048'],
+        }).getOK()
+        host = body['HostConfig']
+        self.assertEqual('web', name)
+        self.assertEqual({'Name': 'on-failure', 'MaximumRetryCount': 3}, host['RestartPolicy'])
+        self.assertEqual(512 * 1024 * 1024, host['Memory'])
+        self.assertTrue(host['Privileged'])
+        self.assertEqual(['/data:/data'], host['Binds'])
+        self.assertEqual(['db:db'], host['Links'])
+        self.assertEqual([{'Name': 'nofile', 'Soft': 1024, 'Hard': 2048}], host['Ulimits'])
+        self.assertTrue(body['OpenStdin'])
+        self.assertEqual('10.0.0.2', body['NetworkingConfig']['EndpointsConfig']['backend']['IPAMConfig']['IPv4Address'])
+
+    def testUnsupportedOption(self):
+        result = self.readPayload({'image': 'nginx', 'extra-flags': ['--runtime=runsc']})
+        self.assertIsInstance(result.getError(), InvalidConfigError)
+
+    def testParsers(self):
+        self.assertEqual(('80/udp', {'HostIp': '', 'HostPort': '53'}), engine.parsePublish('53:80/udp'))
+        self.assertEqual(1024 ** 3, engine.parseBytes('1g'))
+        self.assertEqual(('registry.local:5000/app', 'v1'), engine.splitImageTag('registry.local:5000/app:v1'))
+        self.assertEqual(('registry.local:5000/app', 'latest'), engine.splitImageTag('registry.local:5000/app'))
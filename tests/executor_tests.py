@@ -0,0 +1,108 @@
+import threading
+import time
+import tests
+from collections import OrderedDict
+
+from dockwrkr.executor import DependencyExecutor
+from dockwrkr.exceptions import DependencyError
+from dockwrkr.monads import *
+
+
+class TestDependencyExecutor(tests.TestBase):
+
+    def setUp(self):
+        self.deps = OrderedDict([
+            ('web', ['db', 'cache']),
+            ('db', []),
+            ('cache', []),
+            ('worker', ['db']),
+        ])
+
+    def testSequentialOrder(self):
+        calls = []
+
+        def task(node):
+            calls.append(node)
+            return OK(node)
+
+        results = DependencyExecutor(self.deps, jobs=1).run(task)
+        self.assertEqual(['db', 'cache', 'web', 'worker'], calls)
+        self.assertEqual(OK(['db', 'cache', 'web', 'worker']), Try.sequence(results))
+
+    def testParallelRespectsDependencies(self):
+        done = set()
+        lock = threading.Lock()
+        violations = []
+
+        def task(node):
+            with lock:
+                if not all(d in done for d in self.deps[node]):
+                    violations.append(node)
+            time.sleep(0.01)
+            with lock:
+                done.add(node)
+            return OK(node)
+
+        results = DependencyExecutor(self.deps, jobs=4).run(task)
+        self.assertEqual([], violations)
+        self.assertEqual(OK(['db', 'cache', 'web', 'worker']), Try.sequence(results))
+
+    def testParallelLaunchesIndependentNodesTogether(self):
+        barrier = threading.Barrier(2, timeout=2)
+
+        def task(node):
+            if node in ('db', 'cache'):
+                barrier.wait()
+            return OK(node)
+
+        results = DependencyExecutor(self.deps, jobs=4).run(task)
+        self.assertIsInstance(Try.sequence(results), OK)
+
+    def testFailureSkipsDependents(self):
+        def task(node):
+            if node == 'db':
+                return Fail(Exception("db failed"))
+            return OK(node)
+
+        for jobs in (1, 4):
+            results = dict(zip(['db', 'cache', 'web', 'worker'], DependencyExecutor(self.deps, jobs=jobs).run(task)))
+            self.assertIsInstance(results['db'], Fail)
+            self.assertEqual(OK('cache'), results['cache'])
+            self.assertIsInstance(results['web'].getError(), DependencyError)
+            self.assertIsInstance(results['worker'].getError(), DependencyError)
+
+    def testSkippedNodesAreOmitted(self):
+        def task(node):
+            return None if node == 'cache' else OK(node)
+
+        results = DependencyExecutor(self.deps, jobs=2).run(task)
+        self.assertEqual(OK(['db', 'web', 'worker']), Try.sequence(results))
+
+    def testExceptionsBecomeFailures(self):
+        def task(node):
+            raise ValueError(node)
+
+        results = DependencyExecutor(OrderedDict([('a', [])]), jobs=1).run(task)
+        self.assertIsInstance(results[0].getError(), ValueError)
+
+    def testBatchedWaves(self):
+        batches = []
+
+        def task(nodes):
+            batches.append(nodes)
+            return dict((node, OK(node)) for node in nodes)
+
+        results = DependencyExecutor(self.deps, jobs=1).runBatched(task)
+        self.assertEqual([['db', 'cache'], ['web', 'worker']], batches)
+        self.assertEqual(OK(['db', 'cache', 'web', 'worker']), Try.sequence(results))
+
+    def testBatchedParallel(self):
+        def task(nodes):
+            if 'db' in nodes:
+                return {'db': Fail(Exception("db failed")), 'cache': OK('cache')}
+            return dict((node, OK(node)) for node in nodes)
+
+        results = DependencyExecutor(self.deps, jobs=4).runBatched(task)
+        self.assertIsInstance(results[0], Fail)
+        self.assertEqual(OK('cache'), results[1])
+        self.assertIsInstance(results[2].getError(), DependencyError)
@@ -0,0 +1,79 @@
+import tests
+from collections import OrderedDict
+
+from dockwrkr.core import Core
+from dockwrkr.graph import DependencyGraph
+from dockwrkr.exceptions import (DependencyCycleError, InvalidContainerError)
+from dockwrkr.monads import *
+
+
+class TestDependencyGraph(tests.TestBase):
+
+    def setUp(self):
+        self.services = OrderedDict([
+            ('web', {'image': 'web', 'link': ['db:database', 'cache']}),
+            ('worker', {'image': 'worker', 'link': 'db'}),
+            ('db', {'image': 'db'}),
+            ('cache', {'image': 'cache', 'link': 'db'}),
+            ('monit', {'image': 'monit', 'autostart': False}),
+        ])
+        self.jobs = OrderedDict([
+            ('migrate', {'image': 'web', 'link': 'db'}),
+        ])
+        self.graph = DependencyGraph.fromConfig(self.services, self.jobs)
+
+    def testOrder(self):
+        self.assertEqual(['db', 'cache', 'web', 'worker', 'monit', 'migrate'], self.graph.order)
+
+    def testAdjacency(self):
+        self.assertEqual(['db', 'cache'], self.graph.getDependencies('web'))
+        self.assertEqual(['web', 'worker', 'cache', 'migrate'], self.graph.getDependents('db'))
+
+    def testTransitiveQueries(self):
+        self.assertEqual(['db', 'cache'], self.graph.getTransitiveDependencies('web'))
+        self.assertEqual(['cache', 'web', 'worker', 'migrate'], self.graph.getTransitiveDependents('db'))
+        self.assertEqual([], self.graph.getTransitiveDependents('web'))
+
+    def testResolve(self):
+        self.assertEqual(['db', 'cache', 'web'], self.graph.resolve(['web']))
+        self.assertEqual(['db', 'worker'], self.graph.resolve(['worker', 'db']))
+
+    def testSubgraph(self):
+        sub = self.graph.subgraph(['web', 'db', 'worker'])
+        self.assertEqual(['db', 'web', 'worker'], list(sub.keys()))
+        self.assertEqual(['db'], sub['web'])
+
+    def testReverseSubgraph(self):
+        sub = self.graph.subgraph(['web', 'db', 'cache', 'worker'], reverse=True)
+        self.assertEqual(['worker', 'web', 'cache', 'db'], list(sub.keys()))
+        self.assertEqual(['web', 'worker', 'cache'], sub['db'])
+        self.assertEqual([], sub['web'])
+
+    def testCycle(self):
+        services = OrderedDict([
+            ('a', {'link': 'b'}),
+            ('b', {'link': 'c'}),
+            ('c', {'link': 'a'}),
+        ])
+        with self.assertRaises(DependencyCycleError) as ctx:
+            DependencyGraph.fromConfig(services)
+        self.assertIn('a -> b -> c -> a', str(ctx.exception))
+
+    def testUndefinedLink(self):
+        with self.assertRaises(InvalidContainerError):
+            DependencyGraph.fromConfig({'a': {'link': 'missing'}})
+        with self.assertRaises(InvalidContainerError):
+            self.graph.resolve(['missing'])
+
+    def testCoreUsesGraph(self):
+        core = Core()
+        core.setConfig({'services': self.services, 'jobs': self.jobs})
+        self.assertIsInstance(core.compileGraph(), OK)
+        self.assertEqual(['db', 'cache', 'web', 'worker', 'monit'], core.getDefinedServices())
+        self.assertEqual(OK(['db', 'web']), core.readOrderedContainers(['web', 'db']))
+        self.assertIsInstance(core.readOrderedContainers(['nope']), Fail)
+
+    def testCoreCycleFailsInitialization(self):
+        core = Core()
+        core.setConfig({'services': {'a': {'link': 'a:self'}}})
+        self.assertIsInstance(core.compileGraph().getError(), DependencyCycleError)
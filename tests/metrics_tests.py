@@ -0,0 +1,88 @@
+import time
+import tests
+import urllib.request
+from collections import OrderedDict
+
+import dockwrkr.docker as docker
+from dockwrkr.state import StateStore
+from dockwrkr.metrics import (MetricsExporter, parseListenAddress)
+from dockwrkr.exceptions import InvalidOptionError
+from benchmarks import suite
+from tests.state_tests import CountingBackend
+
+
+class StopServing(Exception):
+    pass
+
+
+class TestMetricsExporter(tests.TestBase):
+
+    def testRender(self):
+        web = docker.ContainerStatus('web')
+        (web.running, web.startedat, web.exitcode, web.health) = (True, 1000, 0, 'healthy')
+        db = docker.ContainerStatus('db')
+        (db.running, db.exitcode) = (False, 137)
+        store = StateStore(None)
+        store.setStates({'web': web, 'db': db})
+        store.starts['web'] = 2
+        exporter = MetricsExporter(store, ['web', 'db', 'api'])
+        exporter.setSamples({'web': {'cpu': 1.5, 'mem': 2048, 'pids': 3}})
+
+        lines = exporter.render(now=1060).splitlines()
+        self.assertIn('dockwrkr_container_up{name="web"} 1', lines)
+        self.assertIn('dockwrkr_container_up{name="db"} 0', lines)
+        self.assertIn('dockwrkr_container_up{name="api"} 0', lines)
+        self.assertIn('dockwrkr_container_restarts_total{name="web"} 2', lines)
+        self.assertIn('dockwrkr_container_exit_code{name="db"} 137', lines)
+        self.assertIn('dockwrkr_container_uptime_seconds{name="web"} 60', lines)
+        self.assertIn('dockwrkr_container_healthy{name="web"} 1', lines)
+        self.assertIn('dockwrkr_container_cpu_percent{name="web"} 1.5', lines)
+        self.assertIn('# TYPE dockwrkr_container_memory_bytes gauge', lines)
+        self.assertNotIn('dockwrkr_container_uptime_seconds{name="db"}', '\n'.join(lines))
+
+    def testListenAddress(self):
+        self.assertEqual(('', 9273), parseListenAddress(':9273'))
+        self.assertEqual(('127.0.0.1', 80), parseListenAddress('127.0.0.1:80'))
+        self.assertEqual(('', 9100), parseListenAddress('9100'))
+        with self.assertRaises(InvalidOptionError):
+            parseListenAddress('localhost')
+
+
+class TestServeMetrics(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        self.ws.writeConfig(OrderedDict([('web', {'image': 'nginx'}), ('db', {'image': 'postgres'})]))
+        self.ws.seedRunning(['web', 'db'])
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def testScrapesReadMemory(self):
+        scrapes = []
+
+        def callback(server):
+            url = "http://127.0.0.1:%d/metrics" % server.server_address[1]
+            calls = len(backend.calls)
+            for _ in range(5):
+                with urllib.request.urlopen(url) as response:
+                    scrapes.append(response.read().decode())
+            self.assertEqual(calls, len(backend.calls))
+            if len(scrapes) == 5:
+                docker.stop('web')
+            elif 'dockwrkr_container_up{name="web"} 0' in scrapes[-1] and 'cpu_percent{name="db"}' in scrapes[-1]:
+                raise StopServing()
+            elif len(scrapes) > 250:
+                self.fail("The stopped container never showed up.")
+            time.sleep(0.02)
+
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+            core.state = StateStore(backend)
+            with self.assertRaises(StopServing):
+                core.serveMetrics(listen='127.0.0.1:0', interval=0.05, callback=callback)
+            self.assertFalse(core.state.isLive())
+        self.assertIn('dockwrkr_container_up{name="web"} 1', scrapes[0])
+        self.assertNotIn('cpu_percent{name="web"}', scrapes[-1])
@@ -0,0 +1,46 @@
+import json
+import tests
+
+from dockwrkr.monads import *
+from benchmarks import (suite, fakedocker)
+from tests.state_tests import CountingBackend
+
+
+class TestNetworkReconciliation(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        with open(self.ws.configPath, 'w') as fh:
+            fh.write("networks:\n  backend:\n    driver: bridge\n  front:\n    driver: bridge\n"
+                     "containers:\n  web:\n    image: nginx\n    net: backend\n  api:\n    image: nginx\n    net: backend\n"
+                     "  db:\n    image: postgres\n    net: front\n")
+        fakedocker.writeState(self.ws.statePath, {'networks': {'front': {'Name': 'front', 'Config': {'Labels': {}}}}})
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def readNetworks(self):
+        with open(self.ws.statePath) as fh:
+            return json.load(fh)['networks']
+
+    def testNetworksAreListedOncePerCommand(self):
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+
+            self.assertIsInstance(core.start(all=True, jobs=4), OK)
+            self.assertEqual(1, backend.calls.count('readNetworks'))
+            self.assertEqual(1, backend.calls.count('createNetwork'))
+            self.assertNotIn('readNetworkExists', backend.calls)
+            self.assertEqual(backend.calls.index('createNetwork') + 1, backend.calls.index('create'))
+            self.assertEqual(['backend', 'front'], sorted(self.readNetworks()))
+
+            backend.calls = []
+            self.assertIsInstance(core.recreate(['web', 'db']), OK)
+            self.assertEqual(1, backend.calls.count('readNetworks'))
+            self.assertNotIn('createNetwork', backend.calls)
+
+            backend.calls = []
+            self.assertIsInstance(core.start(all=True), OK)
+            self.assertNotIn('readNetworks', backend.calls)
@@ -0,0 +1,46 @@
+import os
+import tests
+
+from dockwrkr.pids import PidFiles
+from dockwrkr.docker import ContainerStatus
+
+
+def makeStatus(name, pid=None):
+    status = ContainerStatus(name)
+    status.running = pid is not None
+    status.pid = pid
+    return status
+
+
+class TestPidFiles(tests.TestBase):
+
+    def setUp(self):
+        self.directory = os.path.join(self.addTemporaryDir(), 'pids')
+        self.pids = PidFiles(self.directory)
+
+    def tearDown(self):
+        self.clearTemporaryDirs()
+
+    def testWriteIsAtomic(self):
+        self.pids.write('web', 1234)
+        self.pids.write('web', 4321)
+        self.assertEqual(['web.pid'], os.listdir(self.directory))
+        self.assertEqual(4321, self.pids.read('web'))
+        self.pids.remove('web')
+        self.pids.remove('web')
+        self.assertEqual({}, self.pids.readAll())
+
+    def testSync(self):
+        self.pids.writeMany({'web': 10, 'db': 11, 'old': 12})
+        with open(os.path.join(self.directory, 'notes.txt'), 'w') as fh:
+            fh.write('keep')
+        states = {'web': makeStatus('web', 10), 'db': makeStatus('db', 21),
+                  'cache': makeStatus('cache', 30), 'cron': makeStatus('cron')}
+
+        expected = [('cache', 'written', 30), ('db', 'fixed', 21), ('old', 'removed', 12)]
+        self.assertEqual(expected, self.pids.sync(states, dryRun=True))
+        self.assertEqual(11, self.pids.read('db'))
+        self.assertEqual(expected, self.pids.sync(states))
+        self.assertEqual({'web': 10, 'db': 21, 'cache': 30}, self.pids.readAll())
+        self.assertEqual([], self.pids.sync(states))
+        self.assertIn('notes.txt', os.listdir(self.directory))
@@ -0,0 +1,115 @@
+import os
+import json
+import base64
+import tests
+
+import dockwrkr.docker as docker
+from dockwrkr.monads import *
+from dockwrkr.cache import DaemonCache
+from benchmarks import (suite, fakedocker)
+from tests.state_tests import CountingBackend
+
+
+class TestPull(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        with open(self.ws.configPath, 'w') as fh:
+            fh.write("registries:\n  registry.local:\n    username: foo\n    password: bar\n"
+                     "containers:\n  web:\n    image: registry.local/app:1.0\n  api:\n    image: registry.local/app:1.0\n"
+                     "  worker:\n    image: registry.local/worker:2.0\n  db:\n    image: postgres:9.6\n")
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def testImagesArePulledOnce(self):
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+            pulled = core.pull(all=True, jobs=3).getOK()
+
+        self.assertEqual(['postgres:9.6', 'registry.local/app:1.0', 'registry.local/worker:2.0'],
+                         sorted(image for (image, size, elapsed) in pulled))
+        self.assertTrue(all(size == 1024 for (image, size, elapsed) in pulled))
+        self.assertEqual(1, backend.calls.count('login'))
+        self.assertEqual(3, backend.calls.count('pull'))
+        self.assertEqual(1, backend.calls.count('readImageSizes'))
+        self.assertLess(backend.calls.index('login'), backend.calls.index('pull'))
+
+    def testUndefinedContainer(self):
+        with self.ws.activate():
+            self.assertIsInstance(self.ws.getCore().pull(['nope']), Fail)
+
+    def testMissingOnly(self):
+        with open(self.ws.configPath, 'a') as fh:
+            fh.write("  cache:\n    image: redis\n  proxy:\n    image: nginx@sha256:abc\n")
+        state = {'images': dict((image, {'Id': image, 'Size': 2048}) for image in
+                                ['registry.local/app:1.0', 'redis', 'nginx@sha256:abc'])}
+        fakedocker.writeState(self.ws.statePath, state)
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+            pulled = core.pull(all=True, missingOnly=True).getOK()
+
+        fetched = sorted(image for (image, size, elapsed) in pulled if elapsed is not None)
+        skipped = sorted(image for (image, size, elapsed) in pulled if elapsed is None)
+        self.assertEqual(['postgres:9.6', 'redis', 'registry.local/worker:2.0'], fetched)
+        self.assertEqual(['nginx@sha256:abc', 'registry.local/app:1.0'], skipped)
+        self.assertEqual(1, backend.calls.count('readLocalImages'))
+        self.assertEqual(1, backend.calls.count('login'))
+
+    def storeCredentials(self, registry):
+        os.makedirs(os.path.join(self.ws.path, 'docker-config'))
+        with open(os.path.join(self.ws.path, 'docker-config', 'config.json'), 'w') as fh:
+            json.dump({'auths': {registry: {'auth': base64.b64encode(b'foo:old').decode()}}}, fh)
+
+    def testStoredCredentialsSkipLogin(self):
+        self.storeCredentials('registry.local')
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+            self.assertIsInstance(core.pull(['web']), OK)
+        self.assertNotIn('login', backend.calls)
+
+    def testLoginRetriedOnAuthError(self):
+        self.storeCredentials('registry.local')
+        fakedocker.writeState(self.ws.statePath, {'private': ['registry.local']})
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+            self.assertIsInstance(core.pull(all=True, jobs=3), OK)
+        self.assertEqual(1, backend.calls.count('login'))
+        self.assertEqual(5, backend.calls.count('pull'))
+
+        with self.ws.activate():
+            self.assertIsInstance(self.ws.getCore().pull(['db']), OK)
+            self.assertIsInstance(self.ws.getCore().pull(['web']), OK)
+
+
+class TestCapabilities(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def testProbeIsCachedPerHost(self):
+        with self.ws.activate():
+            self.assertEqual('20.10.0', docker.readServerVersion().getOK())
+            self.assertFalse(docker.readCapabilities().getOK()['loginEmail'])
+            docker.DOCKER_CLIENT = 'false'
+            self.assertEqual('20.10.0', docker.readServerVersion().getOK())
+            os.environ['DOCKER_HOST'] = 'tcp://10.0.0.1:2375'
+            self.assertIsInstance(docker.readServerVersion(), Fail)
+
+    def testExpiredProbe(self):
+        cache = DaemonCache(os.path.join(self.ws.path, 'cache'), ttl=0)
+        cache.write('unix:///var/run/docker.sock', {'version': '1.13.0', 'loginEmail': True})
+        self.assertIsNone(cache.read('unix:///var/run/docker.sock'))
+        cache.ttl = 60
+        self.assertEqual('1.13.0', cache.read('unix:///var/run/docker.sock')['version'])
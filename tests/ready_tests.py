@@ -0,0 +1,79 @@
+import json
+import tests
+
+import dockwrkr.docker as docker
+from dockwrkr.monads import *
+from dockwrkr.engine import readCreatePayload
+from dockwrkr.exceptions import (NotReadyError, DependencyError, InvalidConfigError)
+from benchmarks import (suite, fakedocker)
+
+
+class TestReadyConfig(tests.TestBase):
+
+    def testProbeCompilesToHealthCheck(self):
+        config = {'image': 'postgres', 'ready': {'probe': 'pg_isready -U postgres', 'interval': 0.5, 'timeout': 30}}
+        argv = docker.readCreateParameters('db', config, asList=True).getOK()
+        self.assertIn('--health-cmd=pg_isready -U postgres', argv)
+        self.assertIn('--health-interval=0.5s', argv)
+        self.assertEqual(30, docker.readReadyConfig('db', config).getOK()['timeout'])
+
+        (name, body) = readCreatePayload('db', argv).getOK()
+        self.assertEqual({'Test': ['CMD-SHELL', 'pg_isready -U postgres'], 'Interval': 500000000}, body['Healthcheck'])
+
+    def testImageHealthCheck(self):
+        self.assertEqual({'probe': None, 'interval': None, 'timeout': docker.DOCKWRKR_READY_TIMEOUT},
+                         docker.readReadyConfig('db', {'ready': True}).getOK())
+        self.assertIsNone(docker.readReadyConfig('db', {'ready': False}).getOK())
+        argv = docker.readCreateParameters('db', {'image': 'postgres', 'ready': True}, asList=True).getOK()
+        self.assertFalse([x for x in argv if x.startswith('--health') or x.startswith('--ready')])
+        self.assertIsInstance(docker.readReadyConfig('db', {'ready': {'retries': 3}}).getError(), InvalidConfigError)
+        self.assertIsInstance(docker.readReadyConfig('db', {'ready': {'timeout': 0}}).getError(), InvalidConfigError)
+
+
+class TestReadyGate(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        with open(self.ws.configPath, 'w') as fh:
+            fh.write("containers:\n"
+                     "  cache:\n    image: redis\n    ready:\n      probe: redis-cli ping\n      timeout: 5\n"
+                     "  db:\n    image: postgres\n    ready:\n      probe: pg_isready\n      timeout: 5\n"
+                     "  web:\n    image: nginx\n    link:\n      - cache:cache\n"
+                     "  api:\n    image: nginx\n    link:\n      - db:db\n")
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def readEvents(self, action):
+        with open(self.ws.statePath) as fh:
+            events = json.load(fh)['events']
+        return dict((e['Actor']['Attributes']['name'], e['timeNano']) for e in events if e['Action'] == action)
+
+    def testDependentsAreReleasedOnHealthy(self):
+        fakedocker.writeState(self.ws.statePath, {'healthDelays': {'cache': 0.1, 'db': 1.0}})
+        with self.ws.activate():
+            self.assertIsInstance(self.ws.getCore().start(all=True), OK)
+        started = self.readEvents('start')
+        healthy = self.readEvents('health_status: healthy')
+        self.assertEqual(['cache', 'db'], sorted(healthy))
+        self.assertGreater(started['web'], healthy['cache'])
+        self.assertGreater(started['api'], healthy['db'])
+        # web only waits for cache, not for the slower db.
+        self.assertLess(started['web'], healthy['db'])
+
+    def testUnhealthyDependency(self):
+        fakedocker.writeState(self.ws.statePath, {'unhealthy': ['db'], 'healthDelays': {'db': 0.1}})
+        with self.ws.activate():
+            self.assertIsInstance(self.ws.getCore().start(['db', 'api']).getError(), DependencyError)
+            self.assertNotIn('api', self.readEvents('start'))
+            # Already running, the container is still checked before its dependents go.
+            self.assertIsInstance(self.ws.getCore().start(['db']).getError(), NotReadyError)
+
+    def testTimeout(self):
+        with open(self.ws.configPath, 'a') as fh:
+            fh.write("  worker:\n    image: busybox\n    ready:\n      probe: 'true'\n      timeout: 0.2\n")
+        fakedocker.writeState(self.ws.statePath, {'healthDelays': {'worker': 5}})
+        with self.ws.activate():
+            result = self.ws.getCore().start(['worker'])
+        self.assertIsInstance(result.getError(), NotReadyError)
+        self.assertIn('0.2s', str(result.getError()))
@@ -0,0 +1,91 @@
+import os
+import json
+import tests
+
+import dockwrkr.docker as docker
+from dockwrkr.monads import *
+from dockwrkr.exceptions import (DockerError, NotReadyError, InvalidOptionError)
+from benchmarks import (suite, fakedocker)
+from tests.state_tests import CountingBackend
+
+WORKERS = ['worker1', 'worker2', 'worker3', 'worker4', 'worker5']
+
+
+class TestRollingRestart(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        with open(self.ws.configPath, 'w') as fh:
+            fh.write("containers:\n")
+            for worker in WORKERS:
+                fh.write("  %s:\n    image: busybox\n    ready:\n      probe: 'true'\n      timeout: 5\n" % worker)
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def readEvents(self):
+        with open(self.ws.statePath) as fh:
+            return [(e['Action'], e['Actor']['Attributes']['name']) for e in json.load(fh)['events']]
+
+    def testBatches(self):
+        self.ws.seedRunning(WORKERS)
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+            self.assertEqual(WORKERS, core.restart(all=True, rolling=True, batchSize=2).getOK())
+        self.assertEqual(3, backend.calls.count('stopMany'))
+        self.assertEqual(3, backend.calls.count('startMany'))
+
+        events = self.readEvents()
+        # A batch is only stopped once the previous one has started again.
+        self.assertLess(events.index(('start', 'worker2')), events.index(('die', 'worker3')))
+        self.assertLess(events.index(('start', 'worker4')), events.index(('die', 'worker5')))
+
+    def testWaitHealthy(self):
+        fakedocker.writeState(self.ws.statePath, {'healthDelays': dict((w, 0.2) for w in WORKERS)})
+        with self.ws.activate():
+            self.assertIsInstance(self.ws.getCore().start(all=True, jobs=5), OK)
+            self.assertIsInstance(self.ws.getCore().restart(all=True, rolling=True, batchSize=3, waitHealthy=True), OK)
+        events = self.readEvents()
+        restarted = events[events.index(('die', 'worker1')):]
+        self.assertLess(restarted.index(('health_status: healthy', 'worker3')), restarted.index(('die', 'worker4')))
+
+    def testUnhealthyBatchStopsTheRollout(self):
+        fakedocker.writeState(self.ws.statePath, {'healthDelays': dict((w, 0.1) for w in WORKERS)})
+        with self.ws.activate():
+            self.assertIsInstance(self.ws.getCore().start(all=True, jobs=5), OK)
+            with open(self.ws.statePath) as fh:
+                state = json.load(fh)
+            state['unhealthy'] = ['worker2']
+            fakedocker.writeState(self.ws.statePath, state)
+            result = self.ws.getCore().restart(all=True, rolling=True, batchSize=2, waitHealthy=True)
+        self.assertIsInstance(result.getError(), NotReadyError)
+        self.assertNotIn(('die', 'worker3'), self.readEvents())
+
+    def testPartialBatchFailure(self):
+        class FailingBackend(CountingBackend):
+            def startMany(self, containers):
+                results = docker.startMany([x for x in containers if x != 'worker1'])
+                if 'worker1' in containers:
+                    results = dict([('worker1', Fail(DockerError(message="Cannot start worker1")))] + list(results.items()))
+                return results
+
+        pidsDir = os.path.join(self.ws.path, 'pids')
+        with open(self.ws.configPath) as fh:
+            config = fh.read()
+        with open(self.ws.configPath, 'w') as fh:
+            fh.write("pids:\n  enabled: true\n  dir: %s\n%s" % (pidsDir, config))
+        self.ws.seedRunning(WORKERS)
+        with self.ws.activate():
+            core = self.ws.getCore()
+            core.docker = FailingBackend()
+            result = core.restart(all=True, rolling=True, batchSize=2)
+        self.assertIsInstance(result.getError(), DockerError)
+        # The container of the batch that did come back still gets its pidfile.
+        self.assertEqual(['worker2.pid'], os.listdir(pidsDir))
+
+    def testInvalidBatchSize(self):
+        with self.ws.activate():
+            result = self.ws.getCore().restart(all=True, rolling=True, batchSize=0)
+        self.assertIsInstance(result.getError(), InvalidOptionError)
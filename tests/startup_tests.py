@@ -0,0 +1,55 @@
+import os
+import sys
+import subprocess
+import tests
+
+from benchmarks import fakedocker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Total import time allowed for `dockwrkr status`, in milliseconds. It
+# depends on the machine, so it is only checked when set.
+IMPORT_BUDGET_MS = os.environ.get('DOCKWRKR_IMPORT_BUDGET_MS')
+
+# Modules `status` must not import.
+DEFERRED_MODULES = ['pkg_resources', 'arrow', 'semver', 'dockwrkr.command.start', 'dockwrkr.engine']
+
+
+class TestStartup(tests.TestBase):
+
+    def readImportTimes(self):
+        path = self.addTemporaryDir()
+        client = fakedocker.install(path, ROOT)
+        with open(os.path.join(path, 'dockwrkr.yml'), 'w') as fh:
+            fh.write("containers:\n  web:\n    image: nginx\n")
+        env = dict(os.environ)
+        env.update({
+            'FAKEDOCKER_STATE': os.path.join(path, 'state.json'),
+            'DOCKWRKR_DOCKER_CLIENT': client,
+            'PYTHONPATH': ROOT,
+            'DOCKWRKR_CACHE_DIR': os.path.join(path, 'cache'),
+        })
+        env.pop('DOCKWRKR_BACKEND', None)
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from dockwrkr.cli import cli; cli()', 'status'],
+                              cwd=path, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        self.clearTemporaryDirs()
+        self.assertEqual(0, proc.returncode, proc.stderr)
+        self.assertIn('web', proc.stdout)
+
+        times = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            (own, cumulative, name) = line[len('import time:'):].split('|')
+            times[name.strip()] = int(own)
+        return times
+
+    def testStatusImports(self):
+        times = self.readImportTimes()
+        imported = [x for x in DEFERRED_MODULES if x in times]
+        self.assertEqual([], imported)
+        if IMPORT_BUDGET_MS:
+            total = sum(times.values()) / 1000.0
+            slowest = sorted(times.items(), key=lambda x: -x[1])[:5]
+            self.assertLessEqual(total, int(IMPORT_BUDGET_MS),
+                                 "status spent %.1fms importing modules, slowest: %s" % (total, slowest))
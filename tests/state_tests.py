@@ -0,0 +1,147 @@
+import os
+import time
+import tests
+import threading
+
+import dockwrkr.docker as docker
+from dockwrkr.state import StateStore
+from dockwrkr.monads import *
+from benchmarks import (suite, fakedocker)
+
+
+class CountingBackend(object):
+    ''' Docker backend counting the calls that reach the client '''
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            return getattr(docker, name)(*args, **kwargs)
+        return call
+
+
+class TestStateStore(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        self.ws.seedRunning(['web', 'db'])
+        self.backend = CountingBackend()
+        self.store = StateStore(self.backend)
+
+    def tearDown(self):
+        self.store.close()
+        self.ws.cleanup()
+
+    def waitFor(self, predicate, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if predicate():
+                return
+            time.sleep(0.02)
+        self.fail("Timed out waiting for the store to catch up.")
+
+    def testReadWithoutWatcher(self):
+        other = fakedocker.makeContainer('other')
+        del other['Config']['Labels']['ca.turbulent.dockwrkr.managed']
+        containers = {'web': fakedocker.makeContainer('web'), 'other': other}
+        fakedocker.writeState(self.ws.statePath, {'containers': containers})
+        with self.ws.activate():
+            states = self.store.read(['web', 'api', 'other']).getOK()
+        self.assertEqual(['web'], list(states))
+        self.assertTrue(states['web'].running)
+        self.assertEqual(['readStateSnapshot'], self.backend.calls)
+        self.assertFalse(self.store.isLive())
+
+    def testCloseEndsWaits(self):
+        results = []
+        released = threading.Event()
+
+        class StuckStream(object):
+            ''' Stream whose read is still blocked after it was closed '''
+
+            def __iter__(self):
+                released.wait(10)
+                return iter([])
+
+            def close(self):
+                for _ in range(100):
+                    if results:
+                        break
+                    time.sleep(0.02)
+                released.set()
+
+        self.store.follow(StuckStream())
+        waiter = threading.Thread(target=lambda: results.append(self.store.waitUntil('web', lambda s: None, 60)))
+        waiter.start()
+        time.sleep(0.1)
+        self.store.close()
+        self.assertIsInstance(results[0], Fail)
+
+    def testEventsKeepStoreCurrent(self):
+        with self.ws.activate():
+            self.assertIsInstance(self.store.watch(), OK)
+            self.assertTrue(self.store.isLive())
+            self.assertEqual(['db', 'web'], sorted(self.store.read(['web', 'db', 'api']).getOK()))
+
+            calls = len(self.backend.calls)
+            for _ in range(3):
+                self.store.read(['web', 'db'])
+            self.assertEqual(calls, len(self.backend.calls))
+
+            docker.stop('web')
+            self.waitFor(lambda: not self.store.get('web').running)
+            self.assertIsNone(self.store.get('web').pid)
+            self.assertEqual(calls, len(self.backend.calls))
+
+            docker.start('web')
+            self.waitFor(lambda: self.store.get('web').running)
+            self.assertIsNotNone(self.store.get('web').pid)
+
+            docker.remove('db', force=True)
+            self.waitFor(lambda: self.store.get('db') is None)
+            self.assertEqual(['web'], list(self.store.read(['web', 'db']).getOK()))
+
+
+class TestCommandState(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        self.pidsDir = os.path.join(self.ws.path, 'pids')
+        with open(self.ws.configPath, 'w') as fh:
+            fh.write("pids:\n  enabled: true\n  dir: %s\ncontainers:\n  web:\n    image: nginx\n    link: db\n  db:\n    image: postgres\n" % self.pidsDir)
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def readPid(self, container):
+        with open(os.path.join(self.pidsDir, "%s.pid" % container)) as fh:
+            return fh.read()
+
+    def testMutationsAreTracked(self):
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+            core.state = StateStore(backend)
+
+            self.assertIsInstance(core.start(all=True), OK)
+            self.assertTrue(self.readPid('web').isdigit())
+            self.assertNotIn('readContainerPid', backend.calls)
+
+            backend.calls = []
+            self.assertIsInstance(core.recreate(['web']), OK)
+            self.assertEqual(['readStateSnapshot', 'stopMany', 'removeMany', 'create', 'startMany', 'readStateSnapshot'],
+                             backend.calls)
+            self.assertTrue(self.readPid('web').isdigit())
+
+            self.assertIsInstance(core.stop(['web']), OK)
+            self.assertFalse(os.path.exists(os.path.join(self.pidsDir, 'web.pid')))
+            self.assertIsInstance(core.restart(['web']), OK)
+            self.assertTrue(core.state.read(['web']).getOK()['web'].running)
+            self.assertTrue(self.readPid('web').isdigit())
+
+            os.remove(os.path.join(self.pidsDir, 'db.pid'))
+            self.assertEqual([('db', 'written', core.state.read(['db']).getOK()['db'].pid)], core.syncPids().getOK())
+            self.assertEqual([], core.syncPids(dryRun=True).getOK())
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import tests
+from collections import OrderedDict
+
+from dockwrkr.stats import (StatsBuffer, CgroupStats, parseStatsRecord, parseSize)
+from dockwrkr.engine import parseStatsPayload
+from benchmarks import suite
+from tests.state_tests import CountingBackend
+
+
+class TestStatsParsing(tests.TestBase):
+
+    def testRecord(self):
+        sample = parseStatsRecord({'Name': 'web', 'CPUPerc': '12.50%', 'MemUsage': '1.5MiB / 1GiB',
+                                   'NetIO': '1.2kB / 648B', 'BlockIO': '4.1MB / 0B', 'PIDs': '3'})
+        self.assertEqual(12.5, sample['cpu'])
+        self.assertEqual(1572864, sample['mem'])
+        self.assertEqual(1024 ** 3, sample['memlimit'])
+        self.assertEqual((1200, 648), (sample['netrx'], sample['nettx']))
+        self.assertEqual((4100000, 0), (sample['blockread'], sample['blockwrite']))
+        self.assertEqual(3, sample['pids'])
+        self.assertIsNone(parseStatsRecord({'CPUPerc': '--', 'MemUsage': '-- / --'})['cpu'])
+        self.assertIsNone(parseSize('12 parsecs'))
+
+    def testPayload(self):
+        sample = parseStatsPayload({
+            'cpu_stats': {'cpu_usage': {'total_usage': 300}, 'system_cpu_usage': 2000, 'online_cpus': 2},
+            'precpu_stats': {'cpu_usage': {'total_usage': 100}, 'system_cpu_usage': 1000},
+            'memory_stats': {'usage': 5000, 'limit': 10000, 'stats': {'inactive_file': 1000}},
+            'networks': {'eth0': {'rx_bytes': 10, 'tx_bytes': 20}, 'eth1': {'rx_bytes': 1, 'tx_bytes': 2}},
+            'blkio_stats': {'io_service_bytes_recursive': [{'op': 'Read', 'value': 7}, {'op': 'write', 'value': 9}]},
+            'pids_stats': {'current': 4},
+        })
+        self.assertEqual(40.0, sample['cpu'])
+        self.assertEqual((4000, 10000), (sample['mem'], sample['memlimit']))
+        self.assertEqual((11, 22, 7, 9, 4),
+                         (sample['netrx'], sample['nettx'], sample['blockread'], sample['blockwrite'], sample['pids']))
+
+
+class TestStatsBuffer(tests.TestBase):
+
+    def testSummaryOverRing(self):
+        buffer = StatsBuffer(size=20)
+        for value in range(30):
+            buffer.add({'web': {'cpu': float(value), 'mem': None}})
+        self.assertEqual(20, buffer.count('web'))
+        summary = buffer.summarize()
+        self.assertEqual(1, len(summary))
+        self.assertEqual(OrderedDict([('name', 'web'), ('metric', 'cpu'), ('samples', 20),
+                                      ('min', 10.0), ('mean', 19.5), ('p95', 28.0)]), summary[0])
+
+
+class TestCgroupStats(tests.TestBase):
+
+    NET_DEV = ("Inter-|   Receive                                                |  Transmit\n"
+               " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets\n"
+               "    lo:     100       1    0    0    0     0          0         0      100       1    0    0    0     0       0          0\n"
+               "  eth0:    5000      10    0    0    0     0          0         0      700       7    0    0    0     0       0          0\n")
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.now = 100.0
+        self.reader = CgroupStats(root=os.path.join(self.path, 'cgroup'), proc=os.path.join(self.path, 'proc'),
+                                  clock=lambda: self.now)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, path, content):
+        path = os.path.join(self.path, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fh:
+            fh.write(content)
+
+    def writeProcess(self, pid, cgroup):
+        self.write('proc/%d/cgroup' % pid, cgroup)
+        self.write('proc/%d/net/dev' % pid, self.NET_DEV)
+
+    def testUnifiedHierarchy(self):
+        self.writeProcess(10, "0::/system.slice/docker-abc.scope\n")
+        scope = 'cgroup/system.slice/docker-abc.scope/'
+        self.write(scope + 'memory.current', "3000\n")
+        self.write(scope + 'memory.max', "max\n")
+        self.write(scope + 'memory.stat', "anon 2000\ninactive_file 1000\n")
+        self.write(scope + 'cpu.stat', "usage_usec 1000000\nuser_usec 800000\n")
+        self.write(scope + 'io.stat', "8:0 rbytes=4096 wbytes=512 rios=1 wios=1\n8:16 rbytes=4 wbytes=0\n")
+        self.write(scope + 'pids.current', "3\n")
+
+        samples = self.reader.read({'web': 10, 'gone': 11})
+        self.assertEqual(['web'], list(samples))
+        sample = samples['web']
+        self.assertIsNone(sample['cpu'])
+        self.assertEqual((2000, None, 3), (sample['mem'], sample['memlimit'], sample['pids']))
+        self.assertEqual((5000, 700, 4100, 512),
+                         (sample['netrx'], sample['nettx'], sample['blockread'], sample['blockwrite']))
+
+        self.now += 2
+        self.write(scope + 'cpu.stat', "usage_usec 2000000\n")
+        self.assertAlmostEqual(50.0, self.reader.read({'web': 10})['web']['cpu'])
+
+    def testControllerHierarchies(self):
+        self.writeProcess(20, "12:pids:/docker/abc\n4:cpu,cpuacct:/docker/abc\n3:blkio:/docker/abc\n"
+                              "2:memory:/docker/abc\n1:name=systemd:/docker/abc\n0::/docker/abc\n")
+        self.write('cgroup/memory/docker/abc/memory.usage_in_bytes', "8000\n")
+        self.write('cgroup/memory/docker/abc/memory.limit_in_bytes', "16000\n")
+        self.write('cgroup/memory/docker/abc/memory.stat', "cache 100\ntotal_inactive_file 500\n")
+        self.write('cgroup/cpu,cpuacct/docker/abc/cpuacct.usage', "1000000000\n")
+        self.write('cgroup/blkio/docker/abc/blkio.throttle.io_service_bytes',
+                   "8:0 Read 300\n8:0 Write 200\n8:0 Total 500\nTotal 500\n")
+        self.write('cgroup/pids/docker/abc/pids.current', "2\n")
+
+        self.reader.read({'db': 20})
+        self.now += 1
+        self.write('cgroup/cpu,cpuacct/docker/abc/cpuacct.usage', "1250000000\n")
+        sample = self.reader.read({'db': 20})['db']
+        self.assertAlmostEqual(25.0, sample['cpu'])
+        self.assertEqual((7500, 16000, 300, 200, 2),
+                         (sample['mem'], sample['memlimit'], sample['blockread'], sample['blockwrite'], sample['pids']))
+
+
+class TestStatsSampling(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        self.ws.writeConfig(OrderedDict([('web', {'image': 'nginx'}), ('db', {'image': 'postgres'}),
+                                         ('api', {'image': 'nginx'})]))
+        self.ws.seedRunning(['web', 'db'])
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def testOneCallPerTick(self):
+        with self.ws.activate():
+            core = self.ws.getCore()
+            backend = CountingBackend()
+            core.docker = backend
+            buffer = core.sampleStats(interval=0, count=3).getOK()
+        self.assertEqual(3, backend.calls.count('readStats'))
+        self.assertEqual(['db', 'web'], sorted(buffer.samples))
+        self.assertEqual(3, buffer.count('db'))
+        mem = [r for r in buffer.summarize() if r['name'] == 'web' and r['metric'] == 'mem'][0]
+        self.assertTrue(mem['min'] <= mem['mean'] <= mem['p95'])
@@ -0,0 +1,148 @@
+import io
+import json
+import tests
+import contextlib
+from collections import OrderedDict
+
+import dockwrkr.docker as docker
+from dockwrkr.exceptions import (DockerError, InvalidContainerError)
+from dockwrkr.command.status import (Status, StatusView, STATUS_WRITERS, readStatusRecord)
+from benchmarks import suite
+
+
+class StopWatching(Exception):
+    pass
+
+
+class TerminalStream(io.StringIO):
+
+    def isatty(self):
+        return True
+
+
+class TestStatusWatch(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        self.ws.writeConfig(OrderedDict([('web', {'image': 'nginx'}), ('db', {'image': 'postgres'})]))
+        self.ws.seedRunning(['web', 'db'])
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def testTableFollowsEvents(self):
+        tables = []
+
+        def callback(table):
+            tables.append(dict((row[0], row) for row in table))
+            if len(tables) == 1:
+                docker.stop('web')
+            elif tables[-1]['web'][2] == '-':
+                raise StopWatching()
+            elif len(tables) > 50:
+                self.fail("The stopped container never showed up.")
+
+        with self.ws.activate():
+            core = self.ws.getCore()
+            with self.assertRaises(StopWatching):
+                core.watchStatus(callback=callback, interval=0.1)
+            self.assertFalse(core.state.isLive())
+        self.assertNotEqual('-', tables[0]['web'][2])
+        self.assertEqual(tables[0]['db'], tables[-1]['db'])
+
+    def testViewRewritesChangedLines(self):
+        stream = TerminalStream()
+        view = StatusView(stream)
+        view.draw("NAME  PID\nweb   10\ndb    11")
+        stream.seek(0)
+        stream.truncate()
+        view.draw("NAME  PID\nweb   -\ndb    11")
+        self.assertEqual("\x1b[2A\r\x1b[2Kweb   -\x1b[2B\r", stream.getvalue())
+
+        stream = io.StringIO()
+        view = StatusView(stream)
+        view.draw("NAME  PID\nweb   10")
+        view.draw("NAME  PID\nweb   -")
+        self.assertEqual("NAME  PID\nweb   10\nweb   -\n", stream.getvalue())
+
+
+class TestStatusFormats(tests.TestBase):
+
+    def setUp(self):
+        self.ws = suite.Workspace()
+        self.ws.writeConfig(OrderedDict([('web', {'image': 'nginx'}), ('db', {'image': 'postgres'})]))
+        self.ws.seedRunning(['web'])
+
+    def tearDown(self):
+        self.ws.cleanup()
+
+    def readRecords(self):
+        with self.ws.activate():
+            statuses = self.ws.getCore().iterStatus(['db', 'web']).getOK()
+            return [readStatusRecord(status) for status in statuses]
+
+    def testRecordsFollowRequestedOrder(self):
+        records = self.readRecords()
+        self.assertEqual(['db', 'web'], [r['name'] for r in records])
+        self.assertIsNone(records[0]['cid'])
+        self.assertEqual('busybox', records[1]['image'])
+        self.assertIsInstance(records[1]['pid'], int)
+        self.assertIsInstance(records[1]['startedat'], int)
+
+    def testRecordFromStatusLine(self):
+        line = "/web|%s|nginx|172.17.0.2|80/tcp->8080 443/tcp->8443 |123|2020-01-01T00:00:00Z|true|0|healthy|" % ('a' * 64)
+        record = readStatusRecord(docker.ContainerStatus.fromStatusLine(line))
+        self.assertEqual('80/tcp->8080 443/tcp->8443', record['ports'])
+        self.assertEqual(('web', 'aaaaaaaaaaaa', 'nginx', '172.17.0.2', 123),
+                         (record['name'], record['cid'], record['image'], record['ip'], record['pid']))
+        self.assertEqual(1577836800, record['startedat'])
+        self.assertIsNone(readStatusRecord(docker.ContainerStatus.fromStatusLine("/db||postgres|| |0||false|1||"))['ports'])
+
+    def testUnrequestedStatuses(self):
+        def status(name, pid):
+            status = docker.ContainerStatus(name)
+            status.pid = pid
+            return status
+
+        class Backend(object):
+            def iterContainersStatus(self, containers):
+                # `db` is missing and its name prefixes the id of `cache`.
+                return iter([status('cache', 9), status('web', 10), status('web', 10), status('worker', 11)])
+
+        self.ws.writeConfig(OrderedDict([(name, {'image': 'nginx'}) for name in ['cache', 'db', 'web', 'worker']]))
+        with self.ws.activate():
+            core = self.ws.getCore()
+            core.docker = Backend()
+            statuses = list(core.iterStatus(['db', 'web', 'worker']).getOK())
+        self.assertEqual([('db', None), ('web', 10), ('worker', 11)], [(s.name, s.pid) for s in statuses])
+
+    def testUndefinedContainer(self):
+        with self.ws.activate():
+            self.assertIsInstance(self.ws.getCore().iterStatus(['web', 'nope']).getError(), InvalidContainerError)
+
+    def testFailureWhileStreaming(self):
+        def statuses():
+            yield docker.ContainerStatus('web')
+            raise DockerError(message="Cannot connect to the Docker daemon")
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream):
+            result = Status().writeStatus(statuses(), fmt='json')
+        self.assertIsInstance(result.getError(), DockerError)
+        self.assertEqual(['web'], [r['name'] for r in json.loads(stream.getvalue())])
+
+    def testWriters(self):
+        records = self.readRecords()
+        outputs = {}
+        for (fmt, writer) in STATUS_WRITERS.items():
+            stream = io.StringIO()
+            writer(stream, iter(records))
+            outputs[fmt] = stream.getvalue()
+        self.assertEqual(records, json.loads(outputs['json']))
+        self.assertEqual(records, [json.loads(x) for x in outputs['ndjson'].splitlines()])
+        lines = outputs['csv'].splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[1].startswith('db,,,'))
+
+        stream = io.StringIO()
+        STATUS_WRITERS['json'](stream, iter([]))
+        self.assertEqual([], json.loads(stream.getvalue()))